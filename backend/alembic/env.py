@@ -13,6 +13,7 @@ from app.app_cart.models import *
 from app.app_product.models import *
 from app.app_users.models import *
 from app.app_order.models import *
+from app.common.models import *
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,30 @@
+"""product image content hash
+
+Revision ID: 0b8d4f6a2e19
+Revises: 7c3e9b5d1f42
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b8d4f6a2e19'
+down_revision: Union[str, Sequence[str], None] = '7c3e9b5d1f42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # images uploaded before this keep a NULL hash and their own file
+    op.execute("ALTER TABLE product_images ADD COLUMN IF NOT EXISTS content_hash varchar(64)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_product_images_content_hash ON product_images (content_hash)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_product_images_content_hash", table_name="product_images")
+    op.drop_column("product_images", "content_hash")
@@ -0,0 +1,55 @@
+"""product rating stats
+
+Revision ID: 1d5c8f0b7e36
+Revises: e91b6a4c3d28
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1d5c8f0b7e36'
+down_revision: Union[str, Sequence[str], None] = 'e91b6a4c3d28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "product_rating_stats",
+        sa.Column("product_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("rating_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("rating_sum", sa.Integer(), nullable=False, server_default="0"),
+        *[
+            sa.Column(f"star_{star}", sa.Integer(), nullable=False, server_default="0")
+            for star in range(1, 6)
+        ],
+        if_not_exists=True,
+    )
+    op.execute(
+        """
+        INSERT INTO product_rating_stats
+            (product_id, rating_count, rating_sum, star_1, star_2, star_3, star_4, star_5)
+        SELECT product_id, count(*), sum(rating),
+               count(*) FILTER (WHERE rating = 1),
+               count(*) FILTER (WHERE rating = 2),
+               count(*) FILTER (WHERE rating = 3),
+               count(*) FILTER (WHERE rating = 4),
+               count(*) FILTER (WHERE rating = 5)
+        FROM order_items
+        WHERE rating IS NOT NULL AND product_id IS NOT NULL
+        GROUP BY product_id
+        ON CONFLICT (product_id) DO NOTHING
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("product_rating_stats")
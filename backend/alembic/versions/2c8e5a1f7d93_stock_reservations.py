@@ -0,0 +1,47 @@
+"""stock reservations
+
+Revision ID: 2c8e5a1f7d93
+Revises: b3c7e1d9f285
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c8e5a1f7d93'
+down_revision: Union[str, Sequence[str], None] = 'b3c7e1d9f285'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS stock_reservations (
+            id uuid PRIMARY KEY,
+            order_id uuid NOT NULL REFERENCES orders (id) ON DELETE CASCADE,
+            product_id uuid NOT NULL REFERENCES products (id) ON DELETE CASCADE,
+            qty integer NOT NULL,
+            status varchar(20) NOT NULL DEFAULT 'held',
+            expires_at timestamp NOT NULL,
+            created_at timestamp NOT NULL,
+            updated_at timestamp NOT NULL,
+            CONSTRAINT uq_stock_reservations_order_product UNIQUE (order_id, product_id)
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_stock_reservations_product_id ON stock_reservations (product_id)")
+    # the sweeper only ever looks at live holds
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_stock_reservations_held_expiry "
+        "ON stock_reservations (expires_at) WHERE status = 'held'"
+    )
+    op.execute("ALTER TABLE orders ADD COLUMN IF NOT EXISTS coupon_id uuid REFERENCES coupons (id) ON DELETE SET NULL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE orders DROP COLUMN IF EXISTS coupon_id")
+    op.execute("DROP TABLE IF EXISTS stock_reservations")
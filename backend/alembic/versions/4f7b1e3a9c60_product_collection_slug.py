@@ -0,0 +1,43 @@
+"""product collection slug
+
+Revision ID: 4f7b1e3a9c60
+Revises: 9e2a6c4b8d51
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f7b1e3a9c60'
+down_revision: Union[str, Sequence[str], None] = '9e2a6c4b8d51'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # generated column, so existing "Everyday Elegance" / "everyday_elegance " rows are
+    # normalised by the table rewrite and new writes can never drift
+    op.execute(
+        """
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS collection_slug text
+        GENERATED ALWAYS AS (
+            btrim(regexp_replace(lower(coalesce(collection, '')), '[^a-z0-9]+', '_', 'g'), '_')
+        ) STORED
+        """
+    )
+    op.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_products_collection_listing
+        ON products (collection_slug, active, updated_at DESC, id DESC)
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_products_collection_listing", table_name="products")
+    op.drop_column("products", "collection_slug")
@@ -0,0 +1,52 @@
+"""product sales stats
+
+Revision ID: 5a7f3c2e9d84
+Revises: c4d8e2a91f57
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a7f3c2e9d84'
+down_revision: Union[str, Sequence[str], None] = 'c4d8e2a91f57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "product_sales_stats",
+        sa.Column("product_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("units_sold", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("revenue", sa.Numeric(14, 2), nullable=False, server_default="0"),
+        sa.Column("last_sold_at", sa.DateTime(), nullable=True),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_product_sales_stats_units_sold", "product_sales_stats", ["units_sold"],
+        if_not_exists=True,
+    )
+    op.execute(
+        """
+        INSERT INTO product_sales_stats (product_id, units_sold, revenue, last_sold_at)
+        SELECT oi.product_id, sum(oi.qty), sum(oi.total_price), max(o.created_at)
+        FROM order_items oi
+        JOIN orders o ON o.id = oi.order_id
+        WHERE o.status IN ('payment_paid', 'shipped') AND oi.product_id IS NOT NULL
+        GROUP BY oi.product_id
+        ON CONFLICT (product_id) DO NOTHING
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_product_sales_stats_units_sold", table_name="product_sales_stats")
+    op.drop_table("product_sales_stats")
@@ -0,0 +1,39 @@
+"""order number sequence
+
+Revision ID: 6e1a9d3c5b72
+Revises: 2c8e5a1f7d93
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e1a9d3c5b72'
+down_revision: Union[str, Sequence[str], None] = '2c8e5a1f7d93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE SEQUENCE IF NOT EXISTS order_number_seq START WITH 1250")
+    # continue after the highest number handed out so far (they were max + 1, starting at 1250);
+    # the lock keeps a checkout still on the old code from slipping one in meanwhile
+    op.execute("LOCK TABLE orders IN SHARE ROW EXCLUSIVE MODE")
+    op.execute("""
+        SELECT setval(
+            'order_number_seq',
+            GREATEST(
+                (SELECT max(order_number::bigint) FROM orders WHERE order_number ~ '^[0-9]{1,18}$'),
+                1249
+            )
+        )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP SEQUENCE IF EXISTS order_number_seq")
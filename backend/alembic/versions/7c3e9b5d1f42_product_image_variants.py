@@ -0,0 +1,38 @@
+"""product image variants
+
+Revision ID: 7c3e9b5d1f42
+Revises: 1d5c8f0b7e36
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3e9b5d1f42'
+down_revision: Union[str, Sequence[str], None] = '1d5c8f0b7e36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # existing images are processed with `python -m app.commands build-image-variants`
+    op.execute("ALTER TABLE product_images ADD COLUMN IF NOT EXISTS width integer")
+    op.execute("ALTER TABLE product_images ADD COLUMN IF NOT EXISTS height integer")
+    op.execute("ALTER TABLE product_images ADD COLUMN IF NOT EXISTS variants jsonb")
+    op.execute("ALTER TABLE product_images ADD COLUMN IF NOT EXISTS placeholder text")
+    op.execute("ALTER TABLE products ADD COLUMN IF NOT EXISTS primary_image_variants jsonb")
+    op.execute("ALTER TABLE products ADD COLUMN IF NOT EXISTS primary_image_placeholder text")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("products", "primary_image_placeholder")
+    op.drop_column("products", "primary_image_variants")
+    op.drop_column("product_images", "placeholder")
+    op.drop_column("product_images", "variants")
+    op.drop_column("product_images", "height")
+    op.drop_column("product_images", "width")
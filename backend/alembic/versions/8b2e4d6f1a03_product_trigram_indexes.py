@@ -0,0 +1,36 @@
+"""product trigram indexes
+
+Revision ID: 8b2e4d6f1a03
+Revises: 3f1c9a7d2b10
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4d6f1a03'
+down_revision: Union[str, Sequence[str], None] = '3f1c9a7d2b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_products_title_trgm "
+        "ON products USING gin (title gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_products_code_trgm "
+        "ON products USING gin (code gin_trgm_ops)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS ix_products_code_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_products_title_trgm")
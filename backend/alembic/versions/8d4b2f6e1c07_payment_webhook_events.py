@@ -0,0 +1,51 @@
+"""payment webhook events
+
+Revision ID: 8d4b2f6e1c07
+Revises: 6e1a9d3c5b72
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d4b2f6e1c07'
+down_revision: Union[str, Sequence[str], None] = '6e1a9d3c5b72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS payment_webhook_events (
+            id uuid PRIMARY KEY,
+            event_id varchar(128) NOT NULL UNIQUE,
+            event varchar(64) NOT NULL,
+            razorpay_order_id varchar(128),
+            payload json NOT NULL,
+            occurred_at timestamp NOT NULL,
+            status varchar(20) NOT NULL DEFAULT 'pending',
+            attempts integer NOT NULL DEFAULT 0,
+            available_at timestamp NOT NULL,
+            last_error varchar,
+            processed_at timestamp,
+            created_at timestamp NOT NULL,
+            updated_at timestamp NOT NULL
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_payment_webhook_events_pending "
+        "ON payment_webhook_events (available_at) WHERE status = 'pending'"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_payment_webhook_events_order_pending "
+        "ON payment_webhook_events (razorpay_order_id, occurred_at) WHERE status = 'pending'"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS payment_webhook_events")
@@ -0,0 +1,29 @@
+"""products code unique
+
+Revision ID: 9e2a6c4b8d51
+Revises: 0b8d4f6a2e19
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e2a6c4b8d51'
+down_revision: Union[str, Sequence[str], None] = '0b8d4f6a2e19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # create_product already refuses duplicate codes; this fails if old data has some,
+    # find them with: SELECT code FROM products GROUP BY code HAVING count(*) > 1
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_products_code ON products (code)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ux_products_code", table_name="products")
@@ -0,0 +1,27 @@
+"""email outbox send key
+
+Revision ID: a4d8c2e6f193
+Revises: f5a3c9e7b214
+Create Date: 2026-10-19 02:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d8c2e6f193'
+down_revision: Union[str, Sequence[str], None] = 'f5a3c9e7b214'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE email_outbox ADD COLUMN IF NOT EXISTS send_key varchar(64)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE email_outbox DROP COLUMN IF EXISTS send_key")
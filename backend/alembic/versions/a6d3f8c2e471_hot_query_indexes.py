@@ -0,0 +1,56 @@
+"""hot query indexes
+
+Revision ID: a6d3f8c2e471
+Revises: 4f7b1e3a9c60
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d3f8c2e471'
+down_revision: Union[str, Sequence[str], None] = '4f7b1e3a9c60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# name -> definition; keep in step with the Index() objects on the models
+INDEXES = {
+    # storefront listing: active only, default keyset order
+    "ix_products_active_updated": "products (updated_at DESC, id DESC) WHERE active",
+    # storefront price sorts (both directions)
+    "ix_products_active_price": "products (price, id) WHERE active",
+    # category pages: lower(category) = :category
+    "ix_products_category_lower": "products (lower(category), updated_at DESC, id DESC) WHERE active",
+    # admin listing and the feed's max(updated_at)
+    "ix_products_updated": "products (updated_at DESC, id DESC)",
+    # shared image files are looked up by path
+    "ix_product_images_path": "product_images (path)",
+    # "my orders", newest first
+    "ix_orders_user_created": "orders (user_id, created_at DESC, id DESC)",
+    # admin order list
+    "ix_orders_created": "orders (created_at DESC, id DESC)",
+    # order_number ILIKE '%...%' search
+    "ix_orders_order_number_trgm": "orders USING gin (order_number gin_trgm_ops)",
+    "ix_coupons_created": "coupons (created_at DESC, id DESC)",
+    # get_cart_item(cart_id, product_id)
+    "ix_cart_items_cart_product": "cart_items (cart_id, product_id)",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CONCURRENTLY can't run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
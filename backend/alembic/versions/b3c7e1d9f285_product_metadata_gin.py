@@ -0,0 +1,33 @@
+"""product metadata gin
+
+Revision ID: b3c7e1d9f285
+Revises: a6d3f8c2e471
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3c7e1d9f285'
+down_revision: Union[str, Sequence[str], None] = 'a6d3f8c2e471'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # jsonb_path_ops: smaller than the default opclass, only supports @> (all the filters use)
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_metadata "
+            "ON products USING gin (product_metadata jsonb_path_ops)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_products_metadata")
@@ -0,0 +1,34 @@
+"""products price desc index
+
+Revision ID: b8e4f2a6c031
+Revises: a4d8c2e6f193
+Create Date: 2026-10-19 02:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4f2a6c031'
+down_revision: Union[str, Sequence[str], None] = 'a4d8c2e6f193'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # price sorts put NULL prices last in both directions; a backward scan of
+    # ix_products_active_price would put them first for highest_first
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_active_price_desc "
+            "ON products (price DESC NULLS LAST, id DESC) WHERE active"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_products_active_price_desc")
@@ -0,0 +1,33 @@
+"""webhook events processed index
+
+Revision ID: c2f7a9d4e815
+Revises: b8e4f2a6c031
+Create Date: 2026-10-19 03:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2f7a9d4e815'
+down_revision: Union[str, Sequence[str], None] = 'b8e4f2a6c031'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # prune_processed_events: processed events past the retention period
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_payment_webhook_events_processed "
+            "ON payment_webhook_events (processed_at) WHERE status = 'processed'"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_payment_webhook_events_processed")
@@ -0,0 +1,42 @@
+"""product primary image
+
+Revision ID: c4d8e2a91f57
+Revises: 8b2e4d6f1a03
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d8e2a91f57'
+down_revision: Union[str, Sequence[str], None] = '8b2e4d6f1a03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE products ADD COLUMN IF NOT EXISTS primary_image_id uuid")
+    op.execute("ALTER TABLE products ADD COLUMN IF NOT EXISTS primary_image_path varchar(500)")
+    # any existing image of each product becomes its listing image
+    op.execute(
+        """
+        UPDATE products p
+        SET primary_image_id = i.id, primary_image_path = i.path
+        FROM (
+            SELECT DISTINCT ON (product_id) id, product_id, path
+            FROM product_images
+            ORDER BY product_id, id
+        ) i
+        WHERE i.product_id = p.id AND p.primary_image_id IS NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("products", "primary_image_path")
+    op.drop_column("products", "primary_image_id")
@@ -0,0 +1,41 @@
+"""product related
+
+Revision ID: e91b6a4c3d28
+Revises: 5a7f3c2e9d84
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e91b6a4c3d28'
+down_revision: Union[str, Sequence[str], None] = '5a7f3c2e9d84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # filled by `python -m app.commands rebuild-related --full`; until then
+    # the endpoint falls back to live scoring
+    op.create_table(
+        "product_related",
+        sa.Column("product_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("rank", sa.Integer(), primary_key=True),
+        sa.Column("related_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("products.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("score", sa.Float(), nullable=False),
+        sa.Column("computed_at", sa.DateTime(), nullable=False),
+        if_not_exists=True,
+    )
+    op.create_index("ix_product_related_related_id", "product_related", ["related_id"], if_not_exists=True)
+    op.create_index("ix_product_related_computed_at", "product_related", ["computed_at"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("product_related")
@@ -0,0 +1,44 @@
+"""email outbox
+
+Revision ID: f5a3c9e7b214
+Revises: 8d4b2f6e1c07
+Create Date: 2026-10-19 01:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5a3c9e7b214'
+down_revision: Union[str, Sequence[str], None] = '8d4b2f6e1c07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id uuid PRIMARY KEY,
+            message json NOT NULL,
+            status varchar(20) NOT NULL DEFAULT 'pending',
+            attempts integer NOT NULL DEFAULT 0,
+            available_at timestamp NOT NULL,
+            last_error varchar,
+            provider_id varchar(128),
+            sent_at timestamp,
+            created_at timestamp NOT NULL,
+            updated_at timestamp NOT NULL
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_email_outbox_pending "
+        "ON email_outbox (available_at) WHERE status = 'pending'"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS email_outbox")
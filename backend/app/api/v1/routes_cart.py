@@ -26,9 +26,10 @@ def list_coupons(
     page:int = Query(1,ge=1),
     size:int = Query(10,ge=1),
     search: Optional[str] = Query(None, description="Search in title or description"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (empty for the first page); switches to keyset pagination"),
     db:Session=Depends(get_db)
     ):
-    return crud_cart.get_list_of_coupons(db,page,size,search)
+    return crud_cart.get_list_of_coupons(db,page,size,search,cursor)
 
 @router_coupon.put("/{coupon_id}", response_model=CouponResponse, dependencies=[Depends(is_admin)])
 def update_coupon(coupon_id: str, data: CouponUpdate, db: Session = Depends(get_db)):
@@ -56,7 +57,7 @@ def add_product_to_cart(
     db_cart  = crud_cart.get_or_create_cart(db,user)
 
     # next check the product and qnt 
-    db_product = get_product_by_id(db,data.product_id,False)
+    db_product = get_product_by_id(db,data.product_id,False,with_reviews=False)
 
     if not db_product:
         raise HTTPException(
@@ -6,18 +6,20 @@ from app.core.deps import get_db, is_admin,get_current_user
 from app.app_users.models import User
 from app.app_cart.crud import get_cart_by_user_id
 import app.app_order.crud as crud_order
-import razorpay
+import app.app_order.webhooks as webhooks
 from app.core.config import settings
 from typing import List,Optional
-from app.app_order.schemas import OrderResponse,TransactionUpdate,OrderUserResponse,OrderStatusUpdate
+from app.app_order.schemas import OrderResponse,TransactionUpdate,OrderUserResponse,OrderStatusUpdate,OrderItemRating
 from app.common.schemas import PaginationResponse
 from fastapi_limiter.depends import RateLimiter
 import hmac
+import json
 import hashlib
 from fastapi import BackgroundTasks
 
-from app.lib.resend import send_order_confirmation_email
-razorpay_client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_SECRET))
+from app.lib.payment_gateway import get_gateway
+from app.lib.email_outbox import drain_outbox
+from fastapi.concurrency import run_in_threadpool
 
 app = APIRouter()
 
@@ -31,17 +33,10 @@ def verify_cart_before_checkout(db: Session = Depends(get_db), user: User = Depe
         )
     return {'detail':"Verified your cart proceed to checkout page"}
 
-@app.post('/place-order/payment-request',dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-def create_razorpay_transaction(db:Session=Depends(get_db),user:User=Depends(get_current_user)):
-  
-  db_cart = get_cart_by_user_id(db, user.id)
+def _checkout_data(db:Session,user_id):
+  db_cart = get_cart_by_user_id(db, user_id)
   if not db_cart or not db_cart.items:
     raise HTTPException(status_code=400, detail="Cart is empty")
-  if not crud_order.verify_cart_stock(db, db_cart):
-    raise HTTPException(
-      status_code=status.HTTP_400_BAD_REQUEST,
-      detail="One or more products in your cart are out of stock or unavailable. Please review your cart and try again."
-    )
   
   # verify applied coupon too 
   subtotal = crud_order.calculate_cart_subtotal(db,db_cart)
@@ -60,31 +55,44 @@ def create_razorpay_transaction(db:Session=Depends(get_db),user:User=Depends(get
     "tax":tax,
     "total":total,
     "discount":discount,
-    "user_id":user.id
+    "user_id":user_id
   }
-  db_order = crud_order.create_order(db, user, db_cart, data)
-  razorpay_order = razorpay_client.order.create({
-        "amount": int(total * 100),  # Razorpay uses paise
-        "currency": "INR",
-        "payment_capture": "1"
-    })
+  return db_cart, data
+
+@app.post('/place-order/payment-request',dependencies=[Depends(RateLimiter(times=10, seconds=60))])
+async def create_razorpay_transaction(db:Session=Depends(get_db),user:User=Depends(get_current_user)):
+  # No DB connection is held while the gateway answers: the cart is read
+  # and the session closed, then the gateway order is awaited on the event
+  # loop, then the checkout is written with a fresh connection.
+  user_id = user.id
+
+  def read_cart():
+    try:
+      return _checkout_data(db, user_id)[1]
+    finally:
+      db.close()
+
+  data = await run_in_threadpool(read_cart)
+  total = data["total"]
+  razorpay_order = await get_gateway().create_order(int(total * 100))  # Razorpay uses paise
   transaction_data = {
     "transaction_id":razorpay_order["id"],
     "amount":total,
     "payment_method":"razorpay",
     "status":"created",
-    "order_id":db_order.id,
     "transaction_metadata":razorpay_order
   }
-  crud_order.create_transaction(
-        db,
-        transaction_data
-    )
-  
-  #  hold product stock to avoid conflict
-  crud_order.hold_cart_product_stock(db,db_cart)
+
+  def place_order():
+    db_cart, current = _checkout_data(db, user_id)
+    if current["total"] != total:
+      # the cart changed in another tab while the gateway was answering
+      raise HTTPException(status_code=409, detail="Your cart changed during checkout, please try again.")
+    crud_order.create_order(db, db.get(User, user_id), db_cart, data, transaction_data)
+
+  await run_in_threadpool(place_order)
   return {
-        "order_id": str(db_order.id),
+        "order_id": str(data["id"]),
         "razorpay_order_id": razorpay_order["id"],
         "amount": total,
         "currency": "INR",
@@ -116,61 +124,30 @@ def update_transaction_status(transaction_id:str,data:TransactionUpdate,db:Sessi
 
 @app.post("/razorpay-webhook")
 async def razorpay_webhook(request: Request,background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    """Step 2: Razorpay Webhook → verify signature, confirm payment or mark failed"""
-    try:
-        # 1️⃣ Get raw body and headers
-        body = await request.body()
-        signature = request.headers.get("x-razorpay-signature")
-        print(signature)
-        print(request.headers)
-        if not signature:
-            raise HTTPException(status_code=400, detail="Missing Razorpay signature")
-
-        # 2️⃣ Verify signature with secret
-        expected_signature = hmac.new(
-            bytes(settings.RAZORPAY_SECRET_PASSWORD, "utf-8"),
-            body,
-            hashlib.sha256
-        ).hexdigest()
-
-        if not hmac.compare_digest(expected_signature, signature):
-            raise HTTPException(status_code=400, detail="Invalid signature")
-
-        # 3️⃣ Parse JSON body after verification
-        payload = await request.json()
-        event = payload.get("event")
-        data = payload.get("payload", {})
-
-        # 4️⃣ Handle Razorpay events
-        if event == "payment.captured":
-            razorpay_order_id = data["payment"]["entity"]["order_id"]
-            payment_id = data["payment"]["entity"]["id"]
-
-            crud_order.mark_payment_success(db, razorpay_order_id, payment_id)
-            crud_order.clear_cart(db, razorpay_order_id)
-            db_transaction = crud_order.get_transaction_by_id(db, razorpay_order_id)
-            print(db_transaction)
-            if db_transaction:
-                db_order = crud_order.get_order_by_id(db, db_transaction.order_id)
-                if db_order and db_order.user and db_order.user.email:
-                    products = crud_order._order_items_to_products(db_order)
-                    # send in background; currency INR by default
-                    background_tasks.add_task(
-                    send_order_confirmation_email,
-                    db_order.user.email,
-                    str(db_order.order_number or db_order.id),
-                    products,
-                    None  # optional order_url; or omit entirely to let function generate it
-                )
-
-        elif event == "payment.failed":
-            razorpay_order_id = data["payment"]["entity"]["order_id"]
-            crud_order.mark_payment_failed(db, razorpay_order_id)
-
-    except Exception as e:
-        print(f"Error occurred while processing webhook: {e}")
-        raise HTTPException(status_code=400, detail=f"Webhook handling failed: {str(e)}")
+    """Verify the signature and queue the event; webhooks.py applies it."""
+    body = await request.body()
+    signature = request.headers.get("x-razorpay-signature")
+    if not signature:
+        raise HTTPException(status_code=400, detail="Missing Razorpay signature")
+
+    expected_signature = hmac.new(
+        bytes(settings.RAZORPAY_SECRET_PASSWORD, "utf-8"),
+        body,
+        hashlib.sha256
+    ).hexdigest()
 
+    if not hmac.compare_digest(expected_signature, signature):
+        raise HTTPException(status_code=400, detail="Invalid signature")
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    # stored means Razorpay can stop retrying; anything that goes wrong later is retried by the worker
+    if await run_in_threadpool(webhooks.enqueue_event, db, request.headers.get("x-razorpay-event-id"), body, payload):
+        background_tasks.add_task(webhooks.drain_webhook_events)
+        # runs after the drain above, so a confirmation it queued goes out right away
+        background_tasks.add_task(drain_outbox)
     return {"status": "ok"}
 
 @app.get('/list',response_model=PaginationResponse[OrderUserResponse])
@@ -180,9 +157,10 @@ def get_orders_list(
     sort_by_date:str =Query("desc",regex="^(asc|desc)$"),
     db:Session=Depends(get_db),
     search: Optional[str] = Query(None, description="Search in order"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (empty for the first page); switches to keyset pagination"),
     user:User=Depends(get_current_user)
     ):
-    return crud_order.get_list_of_orders(db,user.id,page,size,sort_by_date,search)
+    return crud_order.get_list_of_orders(db,user.id,page,size,sort_by_date,search,cursor)
 
 
 @app.get('/admin/list',response_model=PaginationResponse[OrderResponse],dependencies=[Depends(is_admin)])
@@ -191,8 +169,10 @@ def get_orders_list(
     size:int = Query(10,ge=1),
     sort_by_date:str =Query("desc",regex="^(asc|desc)$"),
     db:Session=Depends(get_db),
-    search: Optional[str] = Query(None, description="Search in order")    ):
-    return crud_order.get_list_of_orders(db,None,page,size,sort_by_date,search)
+    search: Optional[str] = Query(None, description="Search in order"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (empty for the first page); switches to keyset pagination"),
+    ):
+    return crud_order.get_list_of_orders(db,None,page,size,sort_by_date,search,cursor)
 
 @app.delete("/{order_id}")
 def delete_order(order_id:str,db:Session=Depends(get_db),user:User=Depends(is_admin)):
@@ -200,6 +180,17 @@ def delete_order(order_id:str,db:Session=Depends(get_db),user:User=Depends(is_ad
     return {'detail':'Deleted Successfully'}
 
 
+@app.put("/item/{order_item_id}/rating")
+def rate_order_item(order_item_id:str,data:OrderItemRating,db:Session=Depends(get_db),user:User=Depends(get_current_user)):
+    db_order_item = crud_order.get_order_item_by_id(db,order_item_id)
+    if not db_order_item or db_order_item.order.user_id != user.id:
+        raise HTTPException(status_code=404,detail='Order item not found')
+    if db_order_item.order.status not in crud_order.SOLD_ORDER_STATUSES:
+        raise HTTPException(status_code=400,detail='Only purchased items can be rated')
+    crud_order.rate_order_item(db,db_order_item,data.rating)
+    return {'detail':'Rating saved'}
+
+
 @app.put("/status/{order_id}",dependencies=[Depends(is_admin)])
 def update_order_status(order_id:str,data:OrderStatusUpdate,db:Session=Depends(get_db),user:User=Depends(is_admin)):
     db_order = crud_order.get_order_by_id(db,order_id)
@@ -1,31 +1,49 @@
-from fastapi import APIRouter,Form,Depends,File,UploadFile,HTTPException,Query,Response
+from fastapi import APIRouter,Form,Depends,File,UploadFile,HTTPException,Query,Response,BackgroundTasks,Request
+from fastapi.responses import StreamingResponse,FileResponse
 from app.app_product.schemas import *
 from app.app_users.schemas import *
 from app.core.deps import is_admin,get_db,get_current_user
 from app.core.security import create_access_token
 from sqlalchemy.orm import Session
 import app.app_product.crud as crud_product 
+from app.app_product import feed,bulk
+import csv
 from google.oauth2 import id_token
 from google.auth.transport import requests
-from app.core.config import settings
 from app.common.utils import generate_otp
 from app.lib.resend import send_reset_link
 from app.app_users.models import User
 from typing import List
 from fastapi.encoders import jsonable_encoder
+from app.lib.cache import product_cache,MISSING
 
 from app.common.schemas import PaginationResponse
 app  = APIRouter()
 category_router = APIRouter()
 import json
+import os
 
 
 
+@app.get("/suggest",response_model=ProductSuggestResponse)
+def suggest_products(
+    q: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(8, ge=1, le=20),
+    db: Session = Depends(get_db),
+):
+    return crud_product.get_product_suggestions(db, q, limit)
+
+
 @app.get("/show/{product_id}")
 def get_product(
     product_id: str,
     db: Session = Depends(get_db),
 ):
+    cache_key = f"show:{product_id}"
+    product_data = product_cache.get(cache_key)
+    if product_data is not MISSING:
+        return product_data
+
     db_product = crud_product.get_product_by_id(db, product_id, is_admin=True)
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -35,10 +53,21 @@ def get_product(
     # encode ORM to dict
     product_data  = ProductResponse.from_orm(db_product)
     product_data.related_products = related_products
-    
+    product_data = jsonable_encoder(product_data)
+
+    tags = crud_product.product_cache_tags(db_product)
+    tags.update(crud_product.product_tag(item["id"]) for item in related_products)
+    product_cache.set(cache_key, product_data, tags)
     return product_data
+
+@app.get("/cache/stats")
+def get_cache_stats(user:User=Depends(is_admin)):
+    """Counters of this worker's product cache."""
+    return product_cache.snapshot()
+
 @app.post('',response_model=ProductResponse)
 def create_product(
+      background_tasks: BackgroundTasks,
       title:str=Form(...),
       description:str=Form(...),
       price:float = Form(...),
@@ -84,13 +113,9 @@ def create_product(
   db.flush()
   product_id = db_product.id
   #  now let's create images
-  print(len(images))
   db_images = []
   if images:
-    
-    for image in images:
-      db_product_image = crud_product.upload_product_image(db,image,product_id)
-      db_images.append(db_product_image)
+    db_images = crud_product.upload_product_images(db,images,product_id)
   
   # now let's commit all
   try:
@@ -104,6 +129,11 @@ def create_product(
   except:
       db.rollback()
       raise
+  crud_product.sync_search_index(db_product)
+  crud_product.invalidate_product_cache(tags=crud_product.product_cache_tags(db_product) | {"product:list"})
+  background_tasks.add_task(crud_product.refresh_related_products)
+  if db_images:
+    background_tasks.add_task(crud_product.generate_image_variants, [db_image.id for db_image in db_images])
   print(ProductResponse.from_orm(db_product))
   return db_product
 
@@ -111,6 +141,7 @@ def create_product(
 @app.put("/{product_id}", response_model=ProductResponse)
 def update_product(
     product_id: str,
+    background_tasks: BackgroundTasks,
     title: str = Form(...),
     description: str = Form(...),
     price: float = Form(...),
@@ -137,6 +168,8 @@ def update_product(
     db_product = crud_product.get_product_by_id(db, product_id,is_admin=True)
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
+    # category / collection may change, so collect the old tags first
+    cache_tags = crud_product.product_cache_tags(db_product)
     update_data = {
       "code":code,
       "category":category,
@@ -161,9 +194,7 @@ def update_product(
     new_product_images = []
     # add new images
     if images:
-        for image in images:
-            db_product_image = crud_product.upload_product_image(db, image, product_id)
-            new_product_images.append(db_product_image)
+        new_product_images = crud_product.upload_product_images(db, images, product_id)
     # commit & refresh
     try:
       
@@ -176,16 +207,22 @@ def update_product(
     except:
         db.rollback()
         raise
+    crud_product.sync_search_index(db_product)
+    crud_product.invalidate_product_cache(tags=cache_tags | crud_product.product_cache_tags(db_product) | {"product:list"})
+    background_tasks.add_task(crud_product.refresh_related_products)
+    if new_product_images:
+        background_tasks.add_task(crud_product.generate_image_variants, [db_image.id for db_image in new_product_images])
     return db_product
   
 @app.delete("/{product_id}")
 def delete_product(
     product_id: str,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     user: User = Depends(is_admin),
 ):
     # fetch product
-    db_product = crud_product.get_product_by_id(db, product_id,is_admin=True)
+    db_product = crud_product.get_product_by_id(db, product_id,is_admin=True,with_reviews=False)
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
 
@@ -194,80 +231,138 @@ def delete_product(
         crud_product.delete_product_image(db,image.id)  # delete from storage
 
     # delete product
+    deleted_id = db_product.id
+    cache_tags = crud_product.product_cache_tags(db_product)
     db.delete(db_product)
     db.commit()
+    crud_product.remove_from_search_index(deleted_id)
+    crud_product.invalidate_product_cache(tags=cache_tags | {"product:list"})
+    background_tasks.add_task(crud_product.refresh_related_products)
 
     return {"detail": f"Product {product_id} deleted successfully"}
 
+@app.get("/facets",response_model=ProductFacetsResponse)
+def get_product_facets(
+    filter:str =Query(""),
+    search: Optional[str] = Query(None),
+    category:Optional[str]=Query(None),
+    attr: List[str] = Query([], description="metadata filters as key:value, repeatable"),
+    db:Session=Depends(get_db)
+    ):
+    attributes = crud_product.parse_attribute_filters(attr)
+    return crud_product.get_product_facets(db,filter,search,category,attributes)
+
+@app.get("/attributes",response_model=List[ProductAttributeFacet])
+def get_product_attributes(db:Session=Depends(get_db)):
+    return crud_product.get_product_attributes(db)
+
 @app.get("/list",response_model=PaginationResponse[ProductListResponse])
 def get_product_list(
     page:int = Query(1,ge=1),
     size:int = Query(10,ge=1),
     filter:str =Query(""),
-    search: Optional[str] = Query(None, description="Search in title or description"),
+    search: Optional[str] = Query(None, description="Full-text search in title, code and description"),
     category:Optional[str]=Query(None),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (empty for the first page); switches to keyset pagination"),
+    attr: List[str] = Query([], description="metadata filters as key:value, repeatable; OR within a key, AND across keys"),
     db:Session=Depends(get_db)
     ):
     print(size,page,search,filter)
-    return crud_product.get_list_of_product(db,page,size,filter,search,category)
+    attributes = crud_product.parse_attribute_filters(attr)
+    cache_key = "list:" + json.dumps([page,size,filter,search,category,cursor,attributes],sort_keys=True)
+    data = product_cache.get(cache_key)
+    if data is not MISSING:
+        return data
+    result = crud_product.get_list_of_product(db,page,size,filter,search,category,cursor=cursor,attributes=attributes)
+    data = jsonable_encoder(result)
+    # a list is dropped on any catalog write (product:list) and when one of its products changes
+    tags = {"product:list", *(crud_product.product_tag(item.id) for item in result.items)}
+    if category:
+        tags.add(f"category:{category.lower()}")
+    product_cache.set(cache_key, data, tags)
+    return data
 
 @app.get("/list/admin",response_model=PaginationResponse[ProductAdminListResponse])
 def get_product_list(
     page:int = Query(1,ge=1),
     size:int = Query(10,ge=1),
     sort_by_price:str =Query("asc",regex="^(asc|desc)$"),
-    search: Optional[str] = Query(None, description="Search in title or description"),
+    search: Optional[str] = Query(None, description="Full-text search in title, code and description"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (empty for the first page); switches to keyset pagination"),
     db:Session=Depends(get_db),
+    sort_by_sold: Optional[str] = Query(None, regex="^(asc|desc)$"),
+    min_sold: Optional[int] = Query(None, ge=0),
     user:User=Depends(is_admin)
     ):
-    return crud_product.get_list_of_product(db,page,size,sort_by_price,search,None,is_admin=True)
+    price_sort = "lowest_first" if sort_by_price == "asc" else "highest_first"
+    return crud_product.get_list_of_product(
+        db,page,size,price_sort,search,None,is_admin=True,cursor=cursor,
+        sort_by_sold=sort_by_sold,min_sold=min_sold,
+    )
 
-@app.get('/feed/products.tsv')
-def get_products_feed(db:Session=Depends(get_db),):
-    products =  crud_product.get_all_products(db)
-    headers = [
-        "id",
-        "title",
-        "description",
-        "link",
-        "image_link",
-        "availability",
-        "price",
-        "condition"
-    ]
-    lines = ["\t".join(headers)]
-
-    for product in products:
-        if not product.active:
-            continue  # skip inactive products
-
-        # Use first image if exists
-        image_url = product.images[0].url if product.images else "https://upload.wikimedia.org/wikipedia/commons/0/0a/No-image-available.png"
-
-        # Google Merchant price format: "12.00 USD"
-        price_str = f"{product.price:.2f} INR" if product.price else "0 INR"
+@app.post("/import")
+def import_products(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, regex="^(csv|jsonl)$", description="defaults to the file extension"),
+    db: Session = Depends(get_db),
+    user: User = Depends(is_admin),
+):
+    fmt = format or ("jsonl" if (file.filename or "").lower().endswith((".jsonl", ".ndjson")) else "csv")
+    try:
+        report = bulk.import_products(db, file.file, fmt)
+    except (csv.Error, UnicodeDecodeError) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Could not read {fmt} file: {e}")
+    product_ids = report.pop("product_ids")
+    if product_ids:
+        crud_product.build_search_index(db)
+        crud_product.invalidate_product_cache(product_ids, tags={"product:list"})
+        background_tasks.add_task(crud_product.refresh_related_products)
+    return report
 
-        # Product link (adjust your frontend URL structure)
-        link = f"{settings.FRONTEND_URL}/product/{product.id}"
+@app.get("/export")
+def export_products(
+    format: str = Query("csv", regex="^(csv|jsonl)$"),
+    user: User = Depends(is_admin),
+):
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="products.{format}"'}
+    return StreamingResponse(bulk.export_products(format), media_type=media_type, headers=headers)
 
-        availability = "in stock" if product.stock > 0 else "out of stock"
+@app.get('/feed/products.tsv')
+def get_products_feed(request:Request,db:Session=Depends(get_db),):
+    version = feed.catalog_version(db)
+    path = feed.gzip_path(version)
+    stored = os.path.exists(path)
+    gzipped = stored and "gzip" in request.headers.get("accept-encoding", "")
+    # byte-different bodies need different strong ETags
+    etag = f'"{version}-gzip"' if gzipped else f'"{version}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=300", "Vary": "Accept-Encoding"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
 
-        # Condition is usually 'new'
-        condition = "new"
+    media_type = "text/tab-separated-values"
+    if gzipped:
+        return FileResponse(path, media_type=media_type, headers={**headers, "Content-Encoding": "gzip"})
+    if stored:
+        return StreamingResponse(feed.iter_gzip_file(path), media_type=media_type, headers=headers)
+    # first request for this catalog version: stream it and keep the gzip copy
+    return StreamingResponse(feed.stream_and_store(version), media_type=media_type, headers=headers)
 
-        # Add row
-        row = [
-            str(product.id),
-            product.title,
-            product.description or "",
-            link,
-            image_url,
-            availability,
-            price_str,
-            condition
-        ]
-        lines.append("\t".join(row))
 
-    tsv_content = "\n".join(lines)
+@category_router.get("",response_model=List[CategoryResponse])
+def get_categories(db:Session=Depends(get_db)):
+    facets = crud_product.get_product_facets(db)
+    return [CategoryResponse(name=facet.value,count=facet.count) for facet in facets.categories]
 
-    return Response(content=tsv_content, media_type="text/tab-separated-values")
+@category_router.get("/{category}",response_model=PaginationResponse[ProductListResponse])
+def get_category_products(
+    category:str,
+    page:int = Query(1,ge=1),
+    size:int = Query(10,ge=1),
+    filter:str =Query(""),
+    cursor: Optional[str] = Query(None),
+    db:Session=Depends(get_db)
+    ):
+    return crud_product.get_list_of_product(db,page,size,filter,None,category,cursor=cursor)
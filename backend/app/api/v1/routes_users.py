@@ -8,10 +8,9 @@ from google.oauth2 import id_token
 from google.auth.transport import requests
 from app.core.config import settings
 from app.common.utils import generate_otp
-from app.lib.resend import send_reset_link
+from app.lib.resend import send_reset_link,send_contact_inquiry
+from app.lib.email_outbox import drain_outbox
 from app.app_users.models import User
-import resend
-from datetime import datetime
 from fastapi_limiter.depends import RateLimiter
 from datetime import timedelta
 from app.core.security import create_access_token,decode_token
@@ -57,7 +56,9 @@ def forgot_password(data:ForgotPassword,background_tasks: BackgroundTasks,db:Ses
   if not user:
     raise HTTPException(status_code=404,detail="User not found")
   token = create_access_token({'sub':user.email},expires_delta=timedelta(minutes=30))
-  background_tasks.add_task(send_reset_link,email,token)
+  send_reset_link(db,email,token)
+  db.commit()
+  background_tasks.add_task(drain_outbox)
   return {'token':token}
   
 
@@ -102,157 +103,10 @@ def get_address(db:Session=Depends(get_db),user:User=Depends(get_current_user)):
 
 
 @app.post('/contact-us',dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-def send_user_enquiry(data:ContactUs,db:Session=Depends(get_db)):
-  html_content = f"""
-  <!DOCTYPE html>
-  <html lang="en">
-  <head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>New Contact Inquiry</title>
-  </head>
-  <body style="margin: 0; padding: 0; font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; background-color: #f4f7fa;">
-    <table role="presentation" style="width: 100%; border-collapse: collapse; background-color: #f4f7fa;">
-      <tr>
-        <td align="center" style="padding: 40px 0;">
-          <table role="presentation" style="width: 600px; border-collapse: collapse; background-color: #ffffff; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1); border-radius: 8px; overflow: hidden;">
-            
-            <!-- Header -->
-            <tr>
-              <td style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 40px 30px; text-align: center;">
-                <h1 style="margin: 0; color: #ffffff; font-size: 28px; font-weight: 600; letter-spacing: -0.5px;">
-                  📧 New Contact Inquiry
-                </h1>
-                <p style="margin: 10px 0 0 0; color: #e0e7ff; font-size: 14px;">
-                  You have received a new message from your website
-                </p>
-              </td>
-            </tr>
-            
-            <!-- Content -->
-            <tr>
-              <td style="padding: 40px 30px;">
-                
-                <!-- Subject Badge -->
-                <div style="background-color: #f0f4ff; border-left: 4px solid #667eea; padding: 15px 20px; margin-bottom: 30px; border-radius: 4px;">
-                  <p style="margin: 0; color: #667eea; font-size: 12px; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px;">Subject</p>
-                  <p style="margin: 5px 0 0 0; color: #1f2937; font-size: 18px; font-weight: 600;">
-                    {data.subject}
-                  </p>
-                </div>
-                
-                <!-- Contact Information -->
-                <table role="presentation" style="width: 100%; border-collapse: collapse; margin-bottom: 30px;">
-                  <tr>
-                    <td style="padding: 12px 0; border-bottom: 1px solid #e5e7eb;">
-                      <table role="presentation" style="width: 100%; border-collapse: collapse;">
-                        <tr>
-                          <td style="width: 30px; vertical-align: top;">
-                            <span style="font-size: 18px;">👤</span>
-                          </td>
-                          <td>
-                            <p style="margin: 0; color: #6b7280; font-size: 12px; font-weight: 500;">Full Name</p>
-                            <p style="margin: 4px 0 0 0; color: #1f2937; font-size: 15px; font-weight: 600;">
-                              {data.first_name} {data.last_name}
-                            </p>
-                          </td>
-                        </tr>
-                      </table>
-                    </td>
-                  </tr>
-                  
-                  <tr>
-                    <td style="padding: 12px 0; border-bottom: 1px solid #e5e7eb;">
-                      <table role="presentation" style="width: 100%; border-collapse: collapse;">
-                        <tr>
-                          <td style="width: 30px; vertical-align: top;">
-                            <span style="font-size: 18px;">📧</span>
-                          </td>
-                          <td>
-                            <p style="margin: 0; color: #6b7280; font-size: 12px; font-weight: 500;">Email Address</p>
-                            <p style="margin: 4px 0 0 0; color: #1f2937; font-size: 15px; font-weight: 600;">
-                              <a href="mailto:{data.email}" style="color: #667eea; text-decoration: none;">
-                                {data.email}
-                              </a>
-                            </p>
-                          </td>
-                        </tr>
-                      </table>
-                    </td>
-                  </tr>
-                  
-                  <tr>
-                    <td style="padding: 12px 0; border-bottom: 1px solid #e5e7eb;">
-                      <table role="presentation" style="width: 100%; border-collapse: collapse;">
-                        <tr>
-                          <td style="width: 30px; vertical-align: top;">
-                            <span style="font-size: 18px;">📱</span>
-                          </td>
-                          <td>
-                            <p style="margin: 0; color: #6b7280; font-size: 12px; font-weight: 500;">Phone Number</p>
-                            <p style="margin: 4px 0 0 0; color: #1f2937; font-size: 15px; font-weight: 600;">
-                              <a href="tel:{data.phone}" style="color: #667eea; text-decoration: none;">
-                                {data.phone}
-                              </a>
-                            </p>
-                          </td>
-                        </tr>
-                      </table>
-                    </td>
-                  </tr>
-                </table>
-                
-                <!-- Message -->
-                <div style="margin-top: 30px;">
-                  <p style="margin: 0 0 10px 0; color: #6b7280; font-size: 12px; font-weight: 600; text-transform: uppercase; letter-spacing: 0.5px;">
-                    💬 Message
-                  </p>
-                  <div style="background-color: #f9fafb; border: 1px solid #e5e7eb; border-radius: 6px; padding: 20px; line-height: 1.6;">
-                    <p style="margin: 0; color: #374151; font-size: 15px; white-space: pre-wrap;">
-{data.message}
-                    </p>
-                  </div>
-                </div>
-                
-                <!-- Action Button -->
-                <div style="text-align: center; margin-top: 35px;">
-                  <a href="mailto:{data.email}?subject=Re: {data.subject}" 
-                     style="display: inline-block; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: #ffffff; text-decoration: none; padding: 14px 32px; border-radius: 6px; font-weight: 600; font-size: 15px; box-shadow: 0 4px 6px rgba(102, 126, 234, 0.3);">
-                    Reply to {data.first_name}
-                  </a>
-                </div>
-                
-              </td>
-            </tr>
-            
-            <!-- Footer -->
-            <tr>
-              <td style="background-color: #f9fafb; padding: 25px 30px; text-align: center; border-top: 1px solid #e5e7eb;">
-                <p style="margin: 0; color: #6b7280; font-size: 13px; line-height: 1.5;">
-                  This email was sent from your website's contact form.<br>
-                  <strong style="color: #374151;">Lerah Royal E-commerce</strong>
-                </p>
-                <p style="margin: 15px 0 0 0; color: #9ca3af; font-size: 12px;">
-                  © {datetime.now().year} Lerah Royal. All rights reserved.
-                </p>
-              </td>
-            </tr>
-            
-          </table>
-        </td>
-      </tr>
-    </table>
-  </body>
-  </html>
-  """
-  # return {'detail':'Message Sent Successfully'}
-
-  resend.Emails.send({
-    "from": settings.RESEND_FROM_ADDRESS,
-    "to": settings.RESEND_FROM_ADDRESS,
-    "subject": f"New Contact Inquiry: {data.subject}",
-    "html": html_content 
-  })
+def send_user_enquiry(data:ContactUs,background_tasks: BackgroundTasks,db:Session=Depends(get_db)):
+  send_contact_inquiry(db, data)
+  db.commit()
+  background_tasks.add_task(drain_outbox)
   return {"detail": "Your message has been sent successfully. We'll get back to you soon!"}
 
 
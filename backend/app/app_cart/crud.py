@@ -1,8 +1,8 @@
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session,selectinload,joinedload
 from app.app_cart.models import Coupon
 from app.app_cart.schemas import CouponCreate, CouponUpdate,CouponResponse
-from app.common.schemas import PaginationResponse
+from app.common.crud import to_paginate
 from app.app_cart.models import Cart,CartItem
 from app.app_users.models import User
 def create_coupon(db: Session, data: CouponCreate):
@@ -30,33 +30,31 @@ def delete_coupon(db: Session, coupon):
     db.commit()
     return True
 
-def get_list_of_coupons(db: Session, page, size,search):
-    skip = (page - 1) * size
+def get_list_of_coupons(db: Session, page, size,search,cursor=None):
     query = db.query(Coupon)
-    query = query.order_by(Coupon.created_at.desc())
     if search:
         query = query.filter(
             Coupon.code.ilike(f"%{search}%"),
         
         )
-    total = query.count()
-    items = query.offset(skip).limit(size).all()
-    has_next = skip + size < total
-    has_prev = page > 1
-    return PaginationResponse[CouponResponse](
-    items=items,
-    page=page,
-    size=size,
-    has_next=has_next,
-    has_prev=has_prev,
-    total=total,
+    if cursor is None:
+        query = query.order_by(Coupon.created_at.desc())
+    return to_paginate(
+        query, CouponResponse, page, size,
+        db=db, cursor=cursor, sort_column=Coupon.created_at, id_column=Coupon.id,
     )
 
 
 # cart crud
 
 def get_cart_by_user_id(db:Session,user_id):
-    return db.query(Cart).filter(Cart.user_id == user_id).first()
+    # items and their products in one batch each instead of one query per line
+    return (
+        db.query(Cart)
+        .options(selectinload(Cart.items).selectinload(CartItem.product), joinedload(Cart.coupon))
+        .filter(Cart.user_id == user_id)
+        .first()
+    )
 
 def create_cart(db:Session,user:User):
     db_cart = Cart(
@@ -1,9 +1,10 @@
 import uuid, datetime
-from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Numeric
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Numeric, Index
 from sqlalchemy.dialects.postgresql import UUID, JSON
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from app.common.mixin import IDMixin,CreatedUpdatedAtMixin
+from app.app_product.models import PLACEHOLDER_IMAGE_URL
 
 
 class Cart(Base,IDMixin,CreatedUpdatedAtMixin):
@@ -23,11 +24,17 @@ class CartItem(Base,IDMixin,CreatedUpdatedAtMixin):
     price = Column(Numeric(12,2),nullable=False)
     cart = relationship('Cart', back_populates="items", uselist=False)
     product = relationship('Product',back_populates="cart_items",uselist=False)
+    __table_args__ = (
+        Index("ix_cart_items_cart_product", "cart_id", "product_id"),
+    )
     @property
     def image(self) -> str | None:
-        if self.product and self.product.images:
-            return self.product.images[0].url   # return first image
-        return "https://lightwidget.com/wp-content/uploads/localhost-file-not-found.jpg"
+        if self.product:
+            return self.product.thumbnail_url
+        return PLACEHOLDER_IMAGE_URL
+    @property
+    def placeholder(self) -> str | None:
+        return self.product.primary_image_placeholder if self.product else None
     @property
     def title(self) -> str | None:
         if self.product : return self.product.title
@@ -41,4 +48,7 @@ class Coupon(Base, IDMixin, CreatedUpdatedAtMixin):
     min_order = Column(Numeric(12,2),nullable=False)
     max_uses = Column(Integer, nullable=True)  
     used_count = Column(Integer, default=0, nullable=False)
-    expires_at = Column(DateTime, nullable=True)
\ No newline at end of file
+    expires_at = Column(DateTime, nullable=True)
+
+
+Index("ix_coupons_created", Coupon.created_at.desc(), Coupon.id.desc())
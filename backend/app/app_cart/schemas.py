@@ -56,6 +56,7 @@ class CartItemResponse(BaseModel):
     qty: int
     price: float
     image : str | None
+    placeholder : str | None = None
     title : str | None
     product : CartProductResponse 
     class Config:
@@ -4,10 +4,18 @@ from app.app_order.schemas import *
 from app.app_cart.models import Cart,CartItem,Coupon
 from app.app_users.models import User
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from app.app_product.crud import get_product_by_id
+from sqlalchemy import or_, func, select, update, insert, values, column, Integer
+from fastapi import HTTPException
+from app.app_product.crud import apply_product_sales,apply_product_rating,invalidate_product_cache,SOLD_ORDER_STATUSES
+from app.app_product.models import Product
+from datetime import datetime, timedelta
+import uuid
+from collections import deque
+from threading import Lock
+from app.core.config import settings
 from app.app_users.models import Address
 from app.common.schemas import PaginationResponse
+from app.common.crud import paginate_cursor,count_rows
 from decimal import Decimal
 def get_order_by_id(db:Session,id:int):
     return db.query(Order).filter(Order.id == id).first()
@@ -17,22 +25,51 @@ def get_transaction_by_transaction_id(db: Session, transaction_id: str):
 def delete_order_by_id(db:Session,id:int):
     db_order = get_order_by_id(db,id)
     if db_order:
+        # an unpaid order still holds stock; give it back before the rows go
+        released = release_order_stock(db, db_order)
+        # a sold one is counted in the sales rollup; take its lines back out
+        if db_order.status in SOLD_ORDER_STATUSES:
+            apply_product_sales(db, db_order.items, -1)
         db.delete(db_order)
         db.commit()
+        invalidate_product_cache(released)
         return {"message":"Order Deleted Successfully"}     
     return  
+_order_numbers = deque()
+_order_numbers_lock = Lock()
+
+
 def generate_order_number(db:Session):
-    # Get the max order_number and increment
-    last_order = db.query(Order).order_by(Order.created_at.desc()).first()
-    if last_order and last_order.order_number and last_order.order_number.isdigit():
-        return str(int(last_order.order_number) + 1)
-    return "1250"
+    """
+    Next order number from order_number_seq. Sequences never hand the same
+    value out twice and don't wait on other transactions, so concurrent
+    checkouts can't collide. With ORDER_NUMBER_BLOCK_SIZE > 1 the process
+    keeps a block of numbers and only goes to Postgres when it runs out;
+    numbers then stay unique but are no longer in creation order across
+    workers, and a restart skips what was left of the block.
+    """
+    block_size = settings.ORDER_NUMBER_BLOCK_SIZE
+    if block_size <= 1:
+        return str(db.execute(select(ORDER_NUMBER_SEQ.next_value())).scalar_one())
+    with _order_numbers_lock:
+        if not _order_numbers:
+            _order_numbers.extend(db.execute(
+                select(ORDER_NUMBER_SEQ.next_value()).select_from(func.generate_series(1, block_size))
+            ).scalars())
+        return str(_order_numbers.popleft())
 
 def verify_cart_stock(db:Session,cart:Cart):
     items:List[CartItem] = cart.items
+    if not items:
+        return True
+    # one query for every line, stock only
+    stock = dict(
+        db.query(Product.id, Product.stock)
+        .filter(Product.id.in_([item.product_id for item in items]), Product.active == True)
+        .all()
+    )
     for item in items:
-      db_product = get_product_by_id(db,item.product_id,is_admin=False)
-      if not db_product or db_product.stock < item.qty:
+      if stock.get(item.product_id) is None or stock[item.product_id] < item.qty:
           return False
     return True
 
@@ -57,16 +94,27 @@ def calculate_cart_totals(db:Session,db_cart:Cart):
     return subtotal,tax,discount,total
 
 def clear_cart(db:Session,transaction_id):
+    # the caller commits (webhooks.py, together with the payment it belongs to)
     transaction = db.query(OrderTransaction).filter(OrderTransaction.transaction_id == transaction_id).first()
-    order:Order = transaction.order
-    user:User = order.user
-    db_cart = user.cart
-    db.delete(db_cart)
-    db.commit()
+    if not transaction or not transaction.order.user:
+        return
+    db_cart = transaction.order.user.cart
+    if db_cart:
+        db.delete(db_cart)
 
-def create_order(db:Session,user:User,db_cart:Cart,data:dict):
+def create_order(db:Session,user:User,db_cart:Cart,data:dict,transaction_data:dict):
+    """
+    Write a checkout in one transaction with one commit: the order, its
+    items (one multi-row INSERT), the stock holds and the
+    payment transaction row. Nothing is left behind when the stock or the
+    coupon runs out; reserve_cart_stock raises 400 and everything is rolled
+    back. Nothing is refreshed afterwards; the order id is generated here
+    and left in data['id'].
+    """
+    data['id'] = uuid.uuid4()
     data['order_number'] = generate_order_number(db)
     data['status'] = "payment_pending"
+    data['coupon_id'] = db_cart.coupon_id
     address:Address = user.address
     snapshot = {
             "full_name": address.full_name,
@@ -81,108 +129,286 @@ def create_order(db:Session,user:User,db_cart:Cart,data:dict):
     data['shipping_address'] = snapshot
     db_order = Order(**data)
     db.add(db_order)
-    db.flush()
-    cart_items:List[CartItem] = db_cart.items
-    order_items = []
-    for cart_item in cart_items:
-        order_item = OrderItem(
-            order_id=db_order.id,
-            product_id=cart_item.product_id,
-            name=cart_item.product.title,
-            qty=cart_item.qty,
-            unit_price=cart_item.product.price,
-            total_price=cart_item.price,
-        )
-        order_items.append(order_item)
-        db.add(order_item)
-
-    # create order address
-    
-    
-
-    db.commit()
-    db.refresh(db_order)
-    for item in order_items:
-        db.refresh(item)
+    try:
+        db.flush()
+        reserved = reserve_cart_stock(db, db_cart, db_order)
+        cart_items:List[CartItem] = db_cart.items
+        db.execute(insert(OrderItem), [
+            {
+                "id": uuid.uuid4(),
+                "order_id": db_order.id,
+                "product_id": cart_item.product_id,
+                "name": cart_item.product.title,
+                "qty": cart_item.qty,
+                "unit_price": cart_item.product.price,
+                "total_price": cart_item.price,
+            }
+            for cart_item in cart_items
+        ])
+        db.add(OrderTransaction(order_id=db_order.id, **transaction_data))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    invalidate_product_cache(reserved)
     return db_order
 
-def create_transaction(db:Session,create_data):
-    db_transaction = OrderTransaction(**create_data)
-    db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
-    return db_transaction
-
 def mark_payment_success(db:Session,razorpay_order_id,payment_id):
+    """
+    The order's payment was captured. Returns (order, product_id -> qty whose
+    stock moved); the caller commits, then invalidates those products.
+    """
     transaction = db.query(OrderTransaction).filter(OrderTransaction.transaction_id == razorpay_order_id).first()
-    if transaction:
-        transaction.status = "paid"
-        transaction.transaction_metadata["payment_id"] = payment_id
-        transaction.order.status = "payment_paid"
-        db.commit()
-    # clear cart items
+    if not transaction:
+        return None, {}
+    transaction.status = "paid"
+    # reassign, in-place changes to a JSON column aren't tracked
+    transaction.transaction_metadata = {**(transaction.transaction_metadata or {}), "payment_id": payment_id}
+    if transaction.order.status not in SOLD_ORDER_STATUSES:
+        apply_product_sales(db, transaction.order.items, 1, datetime.utcnow())
+    transaction.order.status = "payment_paid"
+    moved = consume_order_stock(db, transaction.order)
+    return transaction.order, moved
 
 def mark_payment_failed(db: Session, razorpay_order_id: str):
+    """
+    A payment attempt failed. Returns product_id -> qty given back; the
+    caller commits, then invalidates those products.
+    """
     transaction = db.query(OrderTransaction).filter(OrderTransaction.transaction_id == razorpay_order_id).first()
-    if transaction:
-        transaction.status = "failed"
-        transaction.order.status = "payment_failed"
-        db.commit()
-        
-    # restore the stock again
+    if not transaction:
+        return {}
+    if transaction.status == "paid":
+        # a failed attempt before the one that went through
+        return {}
     db_order:Order = transaction.order
-    db_user:User = db_order.user
-    db_cart:Cart = db_user.cart
-    restore_product_stock(db,db_cart)
-
-def restore_product_stock(db:Session,cart:Cart):
-    cart_items:List[CartItem] = cart.items
-    updated_product = []
-    for item in cart_items:
-        product = item.product
-        product.stock += item.qty
-        updated_product.append(product)
-    # decrement the coupon used count
-    coupon = None
-    if cart.coupon:
-        coupon = cart.coupon
-        coupon.used_count -= 1
+    transaction.status = "failed"
+    if db_order.status in SOLD_ORDER_STATUSES:
+        apply_product_sales(db, db_order.items, -1)
+    db_order.status = "payment_failed"
+    # give the reserved stock back; a no-op when it already was
+    return release_order_stock(db, db_order)
+
+
+def _stock_lines(items) -> dict:
+    """product_id -> qty, summed, for cart or order lines."""
+    lines = {}
+    for item in items:
+        if item.product_id is not None:
+            lines[item.product_id] = lines.get(item.product_id, 0) + item.qty
+    return lines
+
+
+def _stock_values(lines: dict):
+    return values(
+        column("product_id", Product.id.type), column("qty", Integer), name="wanted"
+    ).data(list(lines.items()))
+
+
+def reserve_cart_stock(db: Session, cart: Cart, order: Order):
+    """
+    Take every cart line out of stock for `order` in one statement, or none
+    of them, and record the holds with an expiry.
+
+    The rows are locked in id order first (so two checkouts sharing products
+    can't deadlock), then a single UPDATE ... FROM (VALUES ...) only touches
+    rows that still have enough stock; under READ COMMITTED that condition is
+    re-checked against the latest row version once the lock is held, so
+    concurrent checkouts can't both take the last piece. Fewer RETURNING
+    rows than lines means something ran out. The coupon use is claimed the
+    same way. Runs inside create_order's transaction: raises 400 when either
+    fails and leaves the rollback to the caller. Returns product_id -> qty.
+    """
+    lines = _stock_lines(cart.items)
+    if not lines:
+        raise HTTPException(status_code=400, detail="Cart is empty")
+    wanted = _stock_values(lines)
+    locked = (
+        select(Product.id)
+        .where(Product.id.in_(list(lines)))
+        .order_by(Product.id)
+        .with_for_update()
+        .cte("locked")
+        .prefix_with("MATERIALIZED")
+    )
+    reserve = (
+        update(Product)
+        .where(
+            Product.id == wanted.c.product_id,
+            Product.id.in_(select(locked.c.id)),
+            Product.active == True,
+            Product.stock >= wanted.c.qty,
+        )
+        .values(stock=Product.stock - wanted.c.qty, updated_at=datetime.utcnow())
+        .returning(Product.id)
+        .execution_options(synchronize_session=False)
+    )
+    reserved = db.execute(reserve).scalars().all()
+    if len(reserved) < len(lines):
+        raise HTTPException(
+            status_code=400,
+            detail="One or more products in your cart are out of stock or unavailable. Please review your cart and try again."
+        )
+    if order.coupon_id:
+        claimed = db.execute(
+            update(Coupon)
+            .where(
+                Coupon.id == order.coupon_id,
+                or_(Coupon.max_uses.is_(None), Coupon.used_count < Coupon.max_uses),
+            )
+            .values(used_count=Coupon.used_count + 1)
+            .returning(Coupon.id)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if claimed is None:
+            raise HTTPException(status_code=400, detail="This coupon has reached its usage limit.")
+    expires_at = datetime.utcnow() + timedelta(minutes=settings.STOCK_HOLD_MINUTES)
+    db.execute(insert(StockReservation), [
+        {"id": uuid.uuid4(), "order_id": order.id, "product_id": product_id, "qty": qty,
+         "status": ReservationStatus.HELD.value, "expires_at": expires_at}
+        for product_id, qty in lines.items()
+    ])
+    return lines
+
+
+def _move_reservations(db: Session, order_ids, from_status: str, to_status: str) -> dict:
+    """Flip reservations of `order_ids` between states; product_id -> qty of the rows that moved."""
+    moved = db.execute(
+        update(StockReservation)
+        .where(StockReservation.order_id.in_(list(order_ids)), StockReservation.status == from_status)
+        .values(status=to_status, updated_at=datetime.utcnow())
+        .returning(StockReservation.product_id, StockReservation.qty)
+        .execution_options(synchronize_session=False)
+    ).all()
+    lines = {}
+    for product_id, qty in moved:
+        lines[product_id] = lines.get(product_id, 0) + qty
+    return lines
+
+
+def _adjust_stock(db: Session, lines: dict, sign: int):
+    if not lines:
+        return
+    wanted = _stock_values(lines)
+    db.execute(
+        update(Product)
+        .where(Product.id == wanted.c.product_id)
+        .values(stock=Product.stock + sign * wanted.c.qty, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def release_order_stock(db: Session, order: Order):
+    """
+    Give back what `order` still holds (payment failed, cancelled, expired).
+    Only held rows move, so a second call (a retried webhook, the sweeper
+    racing the webhook) changes nothing. Returns product_id -> qty given
+    back; the caller commits and then invalidates those products.
+    """
+    lines = _move_reservations(db, [order.id], ReservationStatus.HELD.value, ReservationStatus.RELEASED.value)
+    _adjust_stock(db, lines, 1)
+    if lines and order.coupon_id:
+        db.execute(
+            update(Coupon)
+            .where(Coupon.id == order.coupon_id)
+            .values(used_count=func.greatest(Coupon.used_count - 1, 0))
+            .execution_options(synchronize_session=False)
+        )
+    return lines
+
+
+def consume_order_stock(db: Session, order: Order):
+    """
+    Payment landed: the holds become permanent. If the sweeper had already
+    released them (payment after expiry) the stock is taken again, even if
+    that drives it negative, since the order is paid. Returns product_id ->
+    qty taken again; the caller commits and then invalidates those products.
+    """
+    _move_reservations(db, [order.id], ReservationStatus.HELD.value, ReservationStatus.CONSUMED.value)
+    retaken = _move_reservations(db, [order.id], ReservationStatus.RELEASED.value, ReservationStatus.CONSUMED.value)
+    if retaken:
+        print(f"Order {order.id} paid after its stock hold expired, stock taken again: {retaken}")
+        _adjust_stock(db, retaken, -1)
+        if order.coupon_id:
+            db.execute(
+                update(Coupon)
+                .where(Coupon.id == order.coupon_id)
+                .values(used_count=Coupon.used_count + 1)
+                .execution_options(synchronize_session=False)
+            )
+    return retaken
+
+
+def release_expired_reservations(db: Session, batch_size: int = 200) -> int:
+    """
+    One sweeper pass: release up to `batch_size` orders whose holds have
+    expired. SKIP LOCKED lets several workers sweep at once without waiting
+    on each other or on a checkout touching the same rows. Returns the
+    number of orders released.
+    """
+    now = datetime.utcnow()
+    expired = db.execute(
+        select(StockReservation.order_id)
+        .where(StockReservation.status == ReservationStatus.HELD.value, StockReservation.expires_at < now)
+        .order_by(StockReservation.expires_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    order_ids = set(expired)
+    if not order_ids:
+        db.rollback()
+        return 0
+    released = set()
+    for db_order in db.query(Order).filter(Order.id.in_(list(order_ids))):
+        released.update(release_order_stock(db, db_order))
+        if db_order.status == OrderStatus.PAYMENT_PENDING.value:
+            db_order.status = OrderStatus.PAYMENT_FAILED.value
     db.commit()
-    for product in updated_product:
-        db.refresh(product)
-    db.refresh(coupon)
-
-def hold_cart_product_stock(db:Session,cart:Cart):
-    cart_items: List[CartItem] = cart.items
-    updated_products = []
-    for item in cart_items:
-        product = item.product
-        product.stock = product.stock - item.qty if (product.stock - item.qty ) >= 0 else 0
-        updated_products.append(product)
-    # also increment th coupon usage
-    coupon  = None
-    if cart.coupon:
-        coupon = cart.coupon
-        coupon.used_count += 1
-    
-    db.commit() 
-    if coupon:
-        db.refresh(coupon)
-    for product in updated_products:
-        db.refresh(product)
+    invalidate_product_cache(released)
+    return len(order_ids)
+
+
+def get_order_item_by_id(db:Session,id):
+    return db.query(OrderItem).filter(OrderItem.id == id).first()
+
+def rate_order_item(db:Session,db_order_item:OrderItem,rating:int):
+    # re-read under a row lock: two ratings of one item at once would both
+    # swap out the same old rating and leave the product's totals off
+    db_order_item = (
+        db.query(OrderItem)
+        .filter(OrderItem.id == db_order_item.id)
+        .with_for_update()
+        .populate_existing()
+        .one()
+    )
+    apply_product_rating(db, db_order_item.product_id, db_order_item.rating, rating)
+    db_order_item.rating = rating
+    db.commit()
+    invalidate_product_cache([db_order_item.product_id])
+    db.refresh(db_order_item)
+    return db_order_item
 
 def get_transaction_by_id(db:Session,transaction_id:str):
     return db.query(OrderTransaction).filter(OrderTransaction.transaction_id == transaction_id).first()
 
 
 def update_order(db:Session,db_order,update_data:dict):
+    was_sold = db_order.status in SOLD_ORDER_STATUSES
     for attr,value in update_data.items():
         setattr(db_order,attr,value)
+    # keep the sales rollup in step with cancellations / reinstatements
+    is_sold = db_order.status in SOLD_ORDER_STATUSES
+    if was_sold != is_sold:
+        apply_product_sales(db, db_order.items, 1 if is_sold else -1, datetime.utcnow())
+    released = {}
+    if db_order.status in (OrderStatus.PAYMENT_FAILED.value, OrderStatus.CANCELLED.value):
+        released = release_order_stock(db, db_order)
     db.commit()
+    invalidate_product_cache(released)
     db.refresh(db_order)
     return db_order
 
-def get_list_of_orders(db:Session,user_id,page,size,sort_by_date,search):
+def get_list_of_orders(db:Session,user_id,page,size,sort_by_date,search,cursor=None):
     skip = (page - 1) * size
     if user_id :
         query = db.query(Order).filter(Order.user_id==user_id)
@@ -192,6 +418,19 @@ def get_list_of_orders(db:Session,user_id,page,size,sort_by_date,search):
         query = query.filter(
             Order.order_number.ilike(f"%{search}%"),
         )
+    schema = OrderUserResponse if user_id else OrderResponse
+    if cursor is not None:
+        orders, next_cursor = paginate_cursor(query, cursor, size, Order.created_at, Order.id, sort_by_date != "asc")
+        return PaginationResponse[schema](
+        items=[schema.from_orm(order) for order in orders],
+        page=page,
+        size=size,
+        has_next=next_cursor is not None,
+        has_prev=bool(cursor),
+        total=count_rows(db, query, exact=False),
+        next_cursor=next_cursor,
+    )
+
     if sort_by_date == "asc":
         query = query.order_by(Order.created_at.asc())
     else:
@@ -202,18 +441,8 @@ def get_list_of_orders(db:Session,user_id,page,size,sort_by_date,search):
     orders = query.offset(skip).limit(size).all()
     has_next = skip + size < total
     has_prev = page > 1
-    if(user_id):
-        return PaginationResponse[OrderUserResponse](
-        items=[OrderUserResponse.from_orm(order) for order in orders],
-        page=page,
-        size=size,
-        has_next=has_next,
-        has_prev=has_prev,
-        total=total,
-    )
-    else:
-        return PaginationResponse[OrderResponse](
-        items=[OrderResponse.from_orm(order) for order in orders],
+    return PaginationResponse[schema](
+        items=[schema.from_orm(order) for order in orders],
         page=page,
         size=size,
         has_next=has_next,
@@ -1,6 +1,6 @@
 # app/orders/models.py
 import uuid, datetime
-from sqlalchemy import Column, String, DateTime, Numeric, ForeignKey,Integer
+from sqlalchemy import Column, String, DateTime, Numeric, ForeignKey,Integer,Index,DDL,event,UniqueConstraint,Sequence
 from sqlalchemy.dialects.postgresql import UUID, JSON
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -16,6 +16,10 @@ class OrderStatus(str, Enum):
     CANCELLED = "cancelled"
 
 
+# order numbers come from here (crud.generate_order_number); alembic 6e1a9d3c5b72 moves it past existing ones
+ORDER_NUMBER_SEQ = Sequence("order_number_seq", start=1250, metadata=Base.metadata)
+
+
 class Order(Base,CreatedUpdatedAtMixin,IDMixin):
     __tablename__ = "orders"
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"), index=True, nullable=True)
@@ -29,10 +33,18 @@ class Order(Base,CreatedUpdatedAtMixin,IDMixin):
     delivery_tracking_id = Column(String(255),nullable=True)
     shipping_charge = Column(Numeric(12,2), nullable=False, default=0)
     shipping_address = Column(JSON, nullable=False)
+    # coupon whose use this order claimed, handed back if the order never gets paid
+    coupon_id = Column(UUID(as_uuid=True), ForeignKey("coupons.id", ondelete="SET NULL"), nullable=True)
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
     transaction = relationship("OrderTransaction", back_populates="order", cascade="all, delete-orphan", uselist=False)
     user = relationship("User", back_populates="orders")
 
+# list shapes, see alembic a6d3f8c2e471
+Index("ix_orders_user_created", Order.user_id, Order.created_at.desc(), Order.id.desc())
+Index("ix_orders_created", Order.created_at.desc(), Order.id.desc())
+Index("ix_orders_order_number_trgm", Order.order_number, postgresql_using="gin", postgresql_ops={"order_number": "gin_trgm_ops"})
+event.listen(Order.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
 class OrderTransaction(Base, IDMixin, CreatedUpdatedAtMixin):
     __tablename__ = "order_transactions"
     order_id = Column(UUID(as_uuid=True), ForeignKey("orders.id", ondelete="CASCADE"), unique=True, index=True, nullable=False)
@@ -57,3 +69,79 @@ class OrderItem(Base):
     order = relationship("Order", back_populates="items")
     # 
 
+
+class ReservationStatus(str, Enum):
+    HELD = "held"
+    CONSUMED = "consumed"
+    RELEASED = "released"
+
+
+class StockReservation(Base, IDMixin, CreatedUpdatedAtMixin):
+    """
+    Stock taken out of products.stock for an unpaid order. Held rows turn
+    consumed when the payment lands or released (stock given back) when it
+    fails or expires; each transition happens once.
+    """
+    __tablename__ = "stock_reservations"
+    order_id = Column(UUID(as_uuid=True), ForeignKey("orders.id", ondelete="CASCADE"), nullable=False)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    qty = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False, default=ReservationStatus.HELD.value)
+    expires_at = Column(DateTime, nullable=False)
+    __table_args__ = (
+        UniqueConstraint("order_id", "product_id", name="uq_stock_reservations_order_product"),
+    )
+
+
+# the sweeper's scan: only live holds, oldest expiry first
+Index(
+    "ix_stock_reservations_held_expiry",
+    StockReservation.expires_at,
+    postgresql_where=StockReservation.status == ReservationStatus.HELD.value,
+)
+
+
+class WebhookEventStatus(str, Enum):
+    PENDING = "pending"
+    PROCESSED = "processed"
+    DEAD = "dead"
+
+
+class PaymentWebhookEvent(Base, IDMixin, CreatedUpdatedAtMixin):
+    """
+    A verified Razorpay webhook, stored as received and applied later by
+    app_order/webhooks.py. event_id is Razorpay's, so a redelivered event
+    is stored once. Events that keep failing end up dead with their error.
+    """
+    __tablename__ = "payment_webhook_events"
+    event_id = Column(String(128), unique=True, nullable=False)
+    event = Column(String(64), nullable=False)
+    razorpay_order_id = Column(String(128), nullable=True)
+    payload = Column(JSON, nullable=False)
+    # Razorpay's created_at for the event; events of one order apply in this order
+    occurred_at = Column(DateTime, nullable=False)
+    status = Column(String(20), nullable=False, default=WebhookEventStatus.PENDING.value)
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    last_error = Column(String, nullable=True)
+    processed_at = Column(DateTime, nullable=True)
+
+
+# the worker's scans: due events, and "is there an older one for this order"
+Index(
+    "ix_payment_webhook_events_pending",
+    PaymentWebhookEvent.available_at,
+    postgresql_where=PaymentWebhookEvent.status == WebhookEventStatus.PENDING.value,
+)
+Index(
+    "ix_payment_webhook_events_order_pending",
+    PaymentWebhookEvent.razorpay_order_id,
+    PaymentWebhookEvent.occurred_at,
+    postgresql_where=PaymentWebhookEvent.status == WebhookEventStatus.PENDING.value,
+)
+# pruning of processed events, see alembic c2f7a9d4e815
+Index(
+    "ix_payment_webhook_events_processed",
+    PaymentWebhookEvent.processed_at,
+    postgresql_where=PaymentWebhookEvent.status == WebhookEventStatus.PROCESSED.value,
+)
@@ -1,5 +1,5 @@
 # app/orders/schemas.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from uuid import UUID
 from datetime import datetime
@@ -120,4 +120,7 @@ class TransactionUpdate(BaseModel):
 class OrderStatusUpdate(BaseModel):
     status: str
     delivery_tracking_id: str | None = None
-    delivery_partner: str | None = None
\ No newline at end of file
+    delivery_partner: str | None = None
+
+class OrderItemRating(BaseModel):
+    rating: int = Field(..., ge=1, le=5)
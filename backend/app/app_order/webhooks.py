@@ -0,0 +1,194 @@
+"""
+Razorpay webhook queue.
+
+The endpoint only verifies the signature and stores the event in
+payment_webhook_events (keyed by Razorpay's event id, so redeliveries are
+dropped), then answers 200. process_webhook_events() applies stored events
+in batches:
+
+- each event runs in its own savepoint, and its effects commit together
+  with its "processed" mark, so an event is applied exactly once;
+- only the oldest pending event of an order is picked, so events of one
+  order apply in the order Razorpay created them;
+- a failing event is retried with backoff and goes dead after
+  WEBHOOK_MAX_ATTEMPTS, keeping its last error for a look by hand;
+- processed events are deleted after WEBHOOK_RETENTION_DAYS, long after
+  Razorpay stops redelivering them.
+
+It runs right after each webhook and on a timer from main.py, and as
+`python -m app.commands process-webhooks`.
+"""
+import hashlib
+import traceback
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, delete, exists, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, aliased
+
+import app.app_order.crud as crud_order
+from app.app_product.crud import invalidate_product_cache
+from app.app_order.models import PaymentWebhookEvent, WebhookEventStatus
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.lib.resend import send_order_confirmation_email
+
+HANDLED_EVENTS = {"payment.captured", "payment.failed"}
+BATCH_SIZE = 100
+PRUNE_BATCH_SIZE = 1000
+RETRY_BASE_SECONDS = 5
+
+
+def _occurred_at(created_at) -> datetime:
+  """The event's created_at as naive UTC; now when it is missing or not a timestamp."""
+  if not created_at:
+    return datetime.utcnow()
+  try:
+    return datetime.fromtimestamp(int(created_at), timezone.utc).replace(tzinfo=None)
+  except (TypeError, ValueError, OverflowError, OSError):
+    return datetime.utcnow()
+
+
+def enqueue_event(db: Session, event_id: str | None, body: bytes, payload: dict) -> bool:
+  """Store a verified webhook; False when it is not one we handle or was already stored."""
+  event = payload.get("event")
+  if event not in HANDLED_EVENTS:
+    return False
+  entity = payload.get("payload", {}).get("payment", {}).get("entity", {})
+  row = {
+    "id": uuid.uuid4(),
+    # the header is missing on old webhook setups; the body is unique enough then
+    "event_id": event_id or hashlib.sha256(body).hexdigest(),
+    "event": event,
+    "razorpay_order_id": entity.get("order_id"),
+    "payload": payload,
+    "occurred_at": _occurred_at(payload.get("created_at")),
+    "status": WebhookEventStatus.PENDING.value,
+    "attempts": 0,
+    "available_at": datetime.utcnow(),
+    "created_at": datetime.utcnow(),
+    "updated_at": datetime.utcnow(),
+  }
+  stored = db.execute(
+    insert(PaymentWebhookEvent).values(**row)
+    .on_conflict_do_nothing(index_elements=["event_id"])
+    .returning(PaymentWebhookEvent.id)
+  ).first()
+  db.commit()
+  return stored is not None
+
+
+def _sequence(event):
+  # occurred_at has whole seconds, so events of one second go by arrival
+  return (event.occurred_at, event.created_at, event.id)
+
+
+def _claim_batch(db: Session, batch_size: int) -> list:
+  earlier = aliased(PaymentWebhookEvent)
+  return db.execute(
+    select(PaymentWebhookEvent)
+    .where(
+      PaymentWebhookEvent.status == WebhookEventStatus.PENDING.value,
+      PaymentWebhookEvent.available_at <= datetime.utcnow(),
+      ~exists().where(and_(
+        earlier.razorpay_order_id == PaymentWebhookEvent.razorpay_order_id,
+        earlier.status == WebhookEventStatus.PENDING.value,
+        tuple_(*_sequence(earlier)) < tuple_(*_sequence(PaymentWebhookEvent)),
+      )),
+    )
+    .order_by(*_sequence(PaymentWebhookEvent))
+    .limit(batch_size)
+    # a row another worker holds is skipped, and the order's next event
+    # stays behind it because it isn't the head of its order
+    .with_for_update(skip_locked=True)
+  ).scalars().all()
+
+
+def _apply(db: Session, event: PaymentWebhookEvent) -> dict:
+  """The event's effects; returns the product ids whose stock moved."""
+  entity = event.payload["payload"]["payment"]["entity"]
+  if event.event == "payment.captured":
+    db_order, moved = crud_order.mark_payment_success(db, entity["order_id"], entity["id"])
+    crud_order.clear_cart(db, entity["order_id"])
+    if db_order and db_order.user and db_order.user.email:
+      # through the outbox, so it commits (or not) with the payment
+      send_order_confirmation_email(
+        db,
+        db_order.user.email,
+        str(db_order.order_number or db_order.id),
+        crud_order._order_items_to_products(db_order),
+        None,
+      )
+    return moved
+  if event.event == "payment.failed":
+    return crud_order.mark_payment_failed(db, entity["order_id"])
+  return {}
+
+
+def process_webhook_events(db: Session, batch_size: int = BATCH_SIZE) -> int:
+  """Apply one batch of due events; returns how many were handled."""
+  events = _claim_batch(db, batch_size)
+  if not events:
+    db.rollback()
+    return 0
+  stock_changed = set()
+  now = datetime.utcnow()
+  for event in events:
+    event.attempts += 1
+    try:
+      with db.begin_nested():
+        moved = _apply(db, event)
+      stock_changed.update(moved)
+    except Exception as e:
+      traceback.print_exc()
+      event.last_error = f"{type(e).__name__}: {e}"[:2000]
+      if event.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+        event.status = WebhookEventStatus.DEAD.value
+      else:
+        event.available_at = now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (event.attempts - 1))
+      continue
+    event.status = WebhookEventStatus.PROCESSED.value
+    event.processed_at = now
+    event.last_error = None
+  db.commit()
+  # only now: a read between the UPDATE and the commit would cache the old stock again
+  invalidate_product_cache(stock_changed)
+  return len(events)
+
+
+def prune_processed_events(db: Session, batch_size: int = PRUNE_BATCH_SIZE) -> int:
+  """Delete one batch of events processed more than WEBHOOK_RETENTION_DAYS ago; returns how many."""
+  cutoff = datetime.utcnow() - timedelta(days=settings.WEBHOOK_RETENTION_DAYS)
+  expired = (
+    select(PaymentWebhookEvent.id)
+    .where(
+      PaymentWebhookEvent.status == WebhookEventStatus.PROCESSED.value,
+      PaymentWebhookEvent.processed_at < cutoff,
+    )
+    .limit(batch_size)
+    .with_for_update(skip_locked=True)
+  )
+  deleted = db.execute(delete(PaymentWebhookEvent).where(PaymentWebhookEvent.id.in_(expired))).rowcount
+  db.commit()
+  return deleted
+
+
+def drain_webhook_events():
+  """Every due event, batch after batch, with its own session; then the pruning."""
+  with SessionLocal() as db:
+    while process_webhook_events(db):
+      pass
+    while prune_processed_events(db):
+      pass
+
+
+def requeue_dead_events(db: Session) -> int:
+  """Give dead events a fresh set of attempts, after the cause was fixed."""
+  events = db.query(PaymentWebhookEvent).filter(PaymentWebhookEvent.status == WebhookEventStatus.DEAD.value).all()
+  for event in events:
+    event.status = WebhookEventStatus.PENDING.value
+    event.attempts = 0
+    event.available_at = datetime.utcnow()
+  db.commit()
+  return len(events)
@@ -0,0 +1,269 @@
+"""
+Bulk catalog import / export.
+
+Import validates rows in Python while writing them into a COPY stream for a
+temporary staging table, then upserts the whole batch into products with one
+INSERT ... ON CONFLICT (code) DO UPDATE. Rows that fail validation are
+skipped and reported with their line number; everything else lands in a
+single transaction. Export streams the same columns back out, CSV through
+COPY TO STDOUT and JSONL from a server side cursor.
+"""
+import csv
+import io
+import json
+import tempfile
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.app_product.models import Product
+from app.core.database import SessionLocal
+
+IMPORT_COLUMNS = (
+  "code", "title", "description", "price", "actual_price", "stock",
+  "category", "collection", "active", "featured", "product_metadata",
+)
+# products.price / actual_price are DECIMAL(10,5)
+MAX_PRICE = Decimal("100000")
+MAX_STOCK = 2 ** 31 - 1
+MAX_REPORTED_ERRORS = 1000
+EXPORT_CHUNK_SIZE = 2000
+TRUE_VALUES = {"1", "true", "t", "yes", "y"}
+FALSE_VALUES = {"0", "false", "f", "no", "n"}
+
+STAGING_TABLE = """
+CREATE TEMP TABLE product_import (
+  line integer,
+  code text, title text, description text,
+  price numeric, actual_price numeric, stock integer,
+  category text, collection text, active boolean, featured boolean,
+  product_metadata jsonb
+) ON COMMIT DROP
+"""
+
+UPSERT = """
+INSERT INTO products (
+  id, code, title, description, price, actual_price, stock,
+  category, collection, active, featured, product_metadata, created_at, updated_at
+)
+SELECT
+  gen_random_uuid(), code, title, description, price, actual_price, stock,
+  category, collection, active, featured, product_metadata,
+  now() AT TIME ZONE 'utc', now() AT TIME ZONE 'utc'
+FROM product_import
+ON CONFLICT (code) DO UPDATE SET
+  title = EXCLUDED.title,
+  description = EXCLUDED.description,
+  price = EXCLUDED.price,
+  actual_price = EXCLUDED.actual_price,
+  stock = EXCLUDED.stock,
+  category = EXCLUDED.category,
+  collection = EXCLUDED.collection,
+  active = EXCLUDED.active,
+  featured = EXCLUDED.featured,
+  product_metadata = EXCLUDED.product_metadata,
+  updated_at = EXCLUDED.updated_at
+RETURNING id, (xmax = 0) AS inserted
+"""
+
+
+def _text(raw, field, max_length, required=False, default=None):
+  value = raw.get(field)
+  value = default if value is None or str(value).strip() == "" else str(value).strip()
+  if required and not value:
+    raise ValueError(f"{field} is required")
+  if value is not None and len(value) > max_length:
+    raise ValueError(f"{field} is longer than {max_length} characters")
+  return value
+
+
+def _price(raw, field, default=None):
+  value = raw.get(field)
+  if value is None or str(value).strip() == "":
+    if default is None:
+      raise ValueError(f"{field} is required")
+    return default
+  try:
+    price = Decimal(str(value).strip())
+  except InvalidOperation:
+    raise ValueError(f"{field} is not a number")
+  if not price.is_finite() or price < 0 or price >= MAX_PRICE:
+    raise ValueError(f"{field} must be between 0 and {MAX_PRICE}")
+  return price
+
+
+def _int(raw, field, default):
+  value = raw.get(field)
+  if value is None or str(value).strip() == "":
+    return default
+  try:
+    number = int(str(value).strip())
+  except ValueError:
+    raise ValueError(f"{field} is not an integer")
+  if not 0 <= number <= MAX_STOCK:
+    raise ValueError(f"{field} is out of range")
+  return number
+
+
+def _bool(raw, field, default):
+  value = raw.get(field)
+  if isinstance(value, bool):
+    return value
+  if value is None or str(value).strip() == "":
+    return default
+  value = str(value).strip().lower()
+  if value in TRUE_VALUES:
+    return True
+  if value in FALSE_VALUES:
+    return False
+  raise ValueError(f"{field} is not a boolean")
+
+
+def _metadata(raw):
+  value = raw.get("product_metadata")
+  if value is None or value == "":
+    return {}
+  if isinstance(value, str):
+    try:
+      value = json.loads(value)
+    except json.JSONDecodeError:
+      raise ValueError("product_metadata is not valid JSON")
+  if not isinstance(value, (dict, list)):
+    raise ValueError("product_metadata must be an object or a list")
+  return value
+
+
+def parse_row(raw: dict) -> list:
+  """Staging row for one input record, ValueError with a readable message if it is invalid."""
+  price = _price(raw, "price")
+  return [
+    _text(raw, "code", 100, required=True),
+    _text(raw, "title", 255, required=True),
+    _text(raw, "description", 100000, default=""),
+    price,
+    _price(raw, "actual_price", default=price),
+    _int(raw, "stock", 0),
+    _text(raw, "category", 10000),
+    _text(raw, "collection", 200, default="everyday_elegance"),
+    _bool(raw, "active", True),
+    _bool(raw, "featured", False),
+    json.dumps(_metadata(raw)),
+  ]
+
+
+def read_records(binary_file, fmt: str):
+  """Yield (line number, record dict or parse error) from an uploaded CSV / JSONL file."""
+  stream = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+  if fmt == "csv":
+    reader = csv.DictReader(stream)
+    for record in reader:
+      yield reader.line_num, record
+    return
+  for line_number, line in enumerate(stream, start=1):
+    if not line.strip():
+      continue
+    try:
+      record = json.loads(line)
+    except json.JSONDecodeError as e:
+      yield line_number, ValueError(f"invalid JSON: {e.msg}")
+      continue
+    yield line_number, record if isinstance(record, dict) else ValueError("each line must be a JSON object")
+
+
+def import_products(db: Session, binary_file, fmt: str) -> dict:
+  errors = []
+  failed = 0
+  first_line = {}
+  with tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024, mode="w+", newline="") as buffer:
+    writer = csv.writer(buffer)
+    staged = 0
+    for line, record in read_records(binary_file, fmt):
+      code = record.get("code") if isinstance(record, dict) else None
+      try:
+        if isinstance(record, ValueError):
+          raise record
+        row = parse_row(record)
+        if row[0] in first_line:
+          # ON CONFLICT can't touch the same product twice in one statement
+          raise ValueError(f"code {row[0]} already appears on line {first_line[row[0]]}")
+        first_line[row[0]] = line
+      except ValueError as e:
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+          errors.append({"line": line, "code": code, "error": str(e)})
+        continue
+      writer.writerow([line, *["t" if v is True else "f" if v is False else v for v in row]])
+      staged += 1
+
+    inserted = updated = 0
+    product_ids = []
+    if staged:
+      buffer.seek(0)
+      db.execute(text(STAGING_TABLE))
+      cursor = db.connection().connection.cursor()
+      cursor.copy_expert(
+        "COPY product_import (line, " + ", ".join(IMPORT_COLUMNS) + ") FROM STDIN "
+        "WITH (FORMAT csv, FORCE_NOT_NULL (description))",
+        buffer,
+      )
+      for product_id, was_inserted in db.execute(text(UPSERT)):
+        product_ids.append(product_id)
+        if was_inserted:
+          inserted += 1
+        else:
+          updated += 1
+    db.commit()
+  return {
+    "inserted": inserted,
+    "updated": updated,
+    "failed": failed,
+    "errors": errors,
+    "product_ids": product_ids,
+  }
+
+
+def _export_row(product) -> dict:
+  return {
+    "code": product.code,
+    "title": product.title,
+    "description": product.description,
+    "price": str(product.price) if product.price is not None else None,
+    "actual_price": str(product.actual_price) if product.actual_price is not None else None,
+    "stock": product.stock,
+    "category": product.category,
+    "collection": product.collection,
+    "active": product.active,
+    "featured": product.featured,
+    "product_metadata": product.product_metadata,
+  }
+
+
+def export_products(fmt: str):
+  """Yield the catalog in the import format. Opens its own session, the response streams after the request's one closed."""
+  with SessionLocal() as db:
+    if fmt == "csv":
+      with tempfile.TemporaryFile() as buffer:
+        cursor = db.connection().connection.cursor()
+        cursor.copy_expert(
+          "COPY (SELECT " + ", ".join(IMPORT_COLUMNS) + " FROM products ORDER BY code) "
+          "TO STDOUT WITH (FORMAT csv, HEADER)",
+          buffer,
+        )
+        buffer.seek(0)
+        while chunk := buffer.read(64 * 1024):
+          yield chunk
+      return
+    rows = (
+      db.query(*[getattr(Product, column) for column in IMPORT_COLUMNS])
+      .order_by(Product.code)
+      .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+    lines = []
+    for product in rows:
+      lines.append(json.dumps(_export_row(product)) + "\n")
+      if len(lines) >= EXPORT_CHUNK_SIZE:
+        yield "".join(lines).encode()
+        lines = []
+    if lines:
+      yield "".join(lines).encode()
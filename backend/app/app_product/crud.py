@@ -1,33 +1,262 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_,func, case, desc
-from fastapi import UploadFile
+from sqlalchemy.orm import Session,selectinload,joinedload
+from sqlalchemy import or_,func, case, desc, literal, literal_column
+from fastapi import UploadFile,HTTPException
 from app.app_product.models import *
 import uuid
 import os
 from app.app_product.schemas import *
-from app.lib.upload import upload_file,delete_file
+from app.lib.upload import upload_files,delete_file
+from app.lib.images import process_image,variant_paths,get_pool as get_image_pool
+from functools import partial
 from app.common.schemas import PaginationResponse
+from app.common.crud import paginate_cursor,count_rows,cursor_offset,offset_cursor
 from datetime import timedelta
 from sqlalchemy import func
-from app.app_order.models import OrderItem
+from app.app_order.models import Order,OrderItem,OrderStatus,StockReservation,ReservationStatus
+from sqlalchemy import insert,select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import re
 from decimal import Decimal
+from difflib import get_close_matches
+from threading import Lock
+from cachetools import TTLCache, cached
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import array
+from app.app_product.search_index import product_search_index
+from app.app_product import related
+from app.core.database import SessionLocal
+from app.core.config import settings
+from app.lib.cache import product_cache,MISSING
+import json
 
 from typing import List
+
+
+def build_search_query(search: str):
+    """
+    Turn free text into a prefix-matching tsquery ("kund jhum" -> 'kund:* & jhum:*').
+    Returns None when the text has nothing word-like to match on.
+    """
+    terms = re.findall(r"\w+", (search or "").lower())
+    if not terms:
+        return None
+    return func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+
+
+# order statuses whose lines count as sold
+SOLD_ORDER_STATUSES = (OrderStatus.PAYMENT_PAID.value, OrderStatus.SHIPPED.value)
+
+
+def apply_product_sales(db: Session, order_items, sign: int = 1, sold_at=None):
+    """
+    Add (sign=1) or take back (sign=-1) order lines in product_sales_stats
+    with a single upsert. Runs inside the caller's transaction.
+    """
+    totals = {}
+    for item in order_items:
+        if item.product_id is None:
+            continue
+        units, revenue = totals.get(item.product_id, (0, 0))
+        totals[item.product_id] = (units + item.qty, revenue + item.total_price)
+    if not totals:
+        return
+    stmt = pg_insert(ProductSalesStats).values([
+        {
+            "product_id": product_id,
+            "units_sold": sign * units,
+            "revenue": sign * revenue,
+            "last_sold_at": sold_at if sign > 0 else None,
+        }
+        for product_id, (units, revenue) in totals.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProductSalesStats.product_id],
+        set_={
+            "units_sold": ProductSalesStats.units_sold + stmt.excluded.units_sold,
+            "revenue": ProductSalesStats.revenue + stmt.excluded.revenue,
+            "last_sold_at": func.greatest(ProductSalesStats.last_sold_at, stmt.excluded.last_sold_at),
+        },
+    )
+    db.execute(stmt)
+
+
+def rebuild_product_sales_stats(db: Session):
+    """Recompute product_sales_stats from order history (backfill / repair)."""
+    sold = (
+        select(
+            OrderItem.product_id,
+            func.sum(OrderItem.qty),
+            func.sum(OrderItem.total_price),
+            func.max(Order.created_at),
+        )
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(Order.status.in_(SOLD_ORDER_STATUSES), OrderItem.product_id.isnot(None))
+        .group_by(OrderItem.product_id)
+    )
+    db.query(ProductSalesStats).delete()
+    db.execute(
+        insert(ProductSalesStats).from_select(
+            ["product_id", "units_sold", "revenue", "last_sold_at"], sold
+        )
+    )
+    db.commit()
+
+
+def refresh_related_products():
+    """Background task: incremental product_related refresh after catalog writes."""
+    with SessionLocal() as db:
+        related.refresh_related_products(db)
+
+
+def build_search_index(db: Session):
+    if settings.SEARCH_BACKEND == "memory":
+        product_search_index.build(db)
+
+
+def sync_search_index(db_product: Product):
+    """Patch this worker's in-memory index after a product was committed."""
+    if settings.SEARCH_BACKEND == "memory":
+        product_search_index.upsert(db_product.id, db_product.title, db_product.code, db_product.description, db_product.active)
+
+
+def remove_from_search_index(product_id):
+    if settings.SEARCH_BACKEND == "memory":
+        product_search_index.remove(product_id)
+
+
+def patch_search_index(tags):
+    """
+    Catalog writes of other workers, from the cache invalidation channel
+    (subscribed in main.py). Creates, updates, deletes and imports carry
+    "product:list" next to the product:<id> tags of what they wrote.
+    """
+    if settings.SEARCH_BACKEND != "memory" or not product_search_index.ready or "product:list" not in tags:
+        return
+    product_ids = [uuid.UUID(tag.split(":", 1)[1]) for tag in tags if tag.startswith("product:") and tag != "product:list"]
+    if product_ids:
+        with SessionLocal() as db:
+            product_search_index.refresh(db, product_ids)
+
+
+def product_tag(product_id) -> str:
+  return f"product:{product_id}"
+
+
+def product_cache_tags(db_product: Product) -> set:
+  """Cache tags a write to db_product has to invalidate."""
+  return {
+    product_tag(db_product.id),
+    f"category:{(db_product.category or '').lower()}",
+    f"collection:{db_product.collection_slug or ''}",
+  }
+
+
+def invalidate_product_cache(product_ids=(), tags=()):
+  """Drop cached detail/list responses in every worker; call after commit."""
+  # "catalog" guards whole-catalog values such as the feed version
+  product_cache.invalidate({"catalog", *tags, *(product_tag(product_id) for product_id in product_ids)})
+
+
+def _suggest_key(db, q, limit):
+    return (" ".join(q.lower().split()), limit)
+
+
+# popular prefixes are answered from here so keystroke traffic skips postgres
+@cached(TTLCache(maxsize=4096, ttl=300), key=_suggest_key, lock=Lock())
+def get_product_suggestions(db: Session, q: str, limit: int = 8) -> ProductSuggestResponse:
+    term, _ = _suggest_key(db, q, limit)
+
+    # the default 0.6 / 0.3 cut offs drop one letter typos in short words
+    db.execute(text(
+        "SET LOCAL pg_trgm.word_similarity_threshold = 0.4; "
+        "SET LOCAL pg_trgm.similarity_threshold = 0.3"
+    ))
+    score = func.greatest(
+        func.word_similarity(term, Product.title),
+        func.coalesce(func.similarity(term, Product.code), 0),
+    )
+    rows = (
+        db.query(Product.id, Product.title, Product.code, score.label("score"))
+        .filter(Product.active == True)
+        .filter(or_(
+            literal(term).op("<%")(Product.title),
+            Product.code.op("%")(term),
+        ))
+        .order_by(desc("score"), Product.title)
+        .limit(limit)
+        .all()
+    )
+    suggestions = [
+        ProductSuggestion(id=row.id, title=row.title, code=row.code, score=float(row.score))
+        for row in rows
+    ]
+
+    # "did you mean": swap each query word for its closest word in the matches
+    did_you_mean = None
+    if suggestions and not any(term in s.title.lower() for s in suggestions):
+        vocabulary = {w for s in suggestions for w in re.findall(r"\w+", s.title.lower())}
+        corrected = []
+        for word in term.split():
+            match = get_close_matches(word, vocabulary, n=1, cutoff=0.6)
+            corrected.append(match[0] if match else word)
+        if corrected != term.split():
+            did_you_mean = " ".join(corrected)
+
+    return ProductSuggestResponse(query=term, suggestions=suggestions, did_you_mean=did_you_mean)
+
+
 def get_product_by_code(db:Session,code):
   return db.query(Product).filter(Product.code == code).first()
 
 
+def _related_item(candidate: Product) -> dict:
+    # convert any Decimal to float for JSON serialization
+    actual_price = float(candidate.actual_price) if isinstance(candidate.actual_price, Decimal) else candidate.actual_price
+    price = float(candidate.price) if isinstance(candidate.price, Decimal) else candidate.price
+    return {
+        "id": candidate.id,
+        "title": candidate.title,
+        "code": candidate.code,
+        "actual_price": actual_price,
+        "price": price,
+        "image": candidate.listing_image_url,
+        "image_srcset": candidate.image_srcset,
+        "placeholder": candidate.primary_image_placeholder,
+        "stock": candidate.stock,
+        "category": candidate.category,
+        "collection": candidate.collection,
+    }
+
+
 def get_related_products(
     db: Session,
     product_id: str,
     limit: int = 4
 ) -> List[dict]:
+    # precomputed neighbours (see app_product/related.py), one indexed lookup
+    related = (
+        db.query(Product)
+        .join(ProductRelated, ProductRelated.related_id == Product.id)
+        .filter(ProductRelated.product_id == product_id, Product.active == True)
+        .order_by(ProductRelated.rank)
+        .limit(limit)
+        .all()
+    )
+    if related:
+        return [_related_item(candidate) for candidate in related]
+    return score_related_products(db, product_id, limit)
+
+
+def score_related_products(
+    db: Session,
+    product_id: str,
+    limit: int = 4
+) -> List[dict]:
+    """Live scoring, used until the product has precomputed neighbours."""
     product = db.query(Product).filter(Product.id == product_id).one_or_none()
     if not product:
         return []
 
-    collection_val = (product.collection or "").lower()
     category_val = (product.category or "").lower()
 
     title_words = re.findall(r"\w+", product.title or "")
@@ -35,7 +264,7 @@ def get_related_products(
 
     # scoring expression
     score_expr = case(
-    (func.lower(Product.collection) == collection_val, 50),
+    (Product.collection_slug == product.collection_slug, 50),
     else_=0
 )
     score_expr = score_expr + case(
@@ -57,81 +286,176 @@ def get_related_products(
 
     results = q.all()  # returns list of (Product, score)
 
-    items = []
-    for candidate, score in results:
-        first_image_url = (
-            candidate.images[0].url
-            if candidate.images
-            else "https://lightwidget.com/wp-content/uploads/localhost-file-not-found.jpg"
-        )
+    return [_related_item(candidate) for candidate, score in results]
 
-        # convert any Decimal to float for JSON serialization
-        actual_price = float(candidate.actual_price) if isinstance(candidate.actual_price, Decimal) else candidate.actual_price
-        price = float(candidate.price) if isinstance(candidate.price, Decimal) else candidate.price
 
-        items.append({
-            "id": candidate.id,
-            "title": candidate.title,
-            "code": candidate.code,
-            "actual_price": actual_price,
-            "price": price,
-            "image": first_image_url,
-            "stock": candidate.stock,
-            "category": candidate.category,
-            "collection": candidate.collection,
-        })
-
-    return items
-
-
-
-def get_product_by_id(db: Session, id, is_admin: bool):
+def get_product_by_id(db: Session, id, is_admin: bool, with_reviews: bool = True):
     query = db.query(Product).filter(Product.id == id)
     if not is_admin:
         query = query.filter(Product.active == True)
 
     product = query.first()
 
-    if product:
-        # calculate review count and average rating
-        review_data = (
-            db.query(
-                func.count(OrderItem.id).label("review_count"),
-                func.avg(OrderItem.rating).label("avg_rating"),
-            )
-            .filter(OrderItem.product_id == product.id, OrderItem.rating != None)
-            .first()
-        )
-
-        product.review_count = review_data.review_count or 0
-        product.avg_rating = float(review_data.avg_rating) if review_data.avg_rating else None
+    if product and with_reviews:
+        # review count, average and histogram come from the rating rollup
+        stats = product.rating_stats
+        product.review_count = stats.rating_count if stats else 0
+        product.avg_rating = stats.average if stats else None
+        product.rating_histogram = stats.histogram if stats else {star: 0 for star in range(1, 6)}
     
     return product
 
+def apply_product_rating(db: Session, product_id, old_rating: int | None, new_rating: int | None):
+    """
+    Move one rating in product_rating_stats from old_rating to new_rating
+    (None for "no rating") with a single upsert. Runs inside the caller's
+    transaction.
+    """
+    if product_id is None or old_rating == new_rating:
+        return
+    values = {
+        "product_id": product_id,
+        "rating_count": (new_rating is not None) - (old_rating is not None),
+        "rating_sum": (new_rating or 0) - (old_rating or 0),
+    }
+    for star in range(1, 6):
+        values[f"star_{star}"] = (new_rating == star) - (old_rating == star)
+    stmt = pg_insert(ProductRatingStats).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProductRatingStats.product_id],
+        set_={
+            column: getattr(ProductRatingStats, column) + stmt.excluded[column]
+            for column in values if column != "product_id"
+        },
+    )
+    db.execute(stmt)
+
 def create_product(db:Session,data):
   db_product = Product(**data)
   return db_product
 
+def upload_product_images(db:Session,files:List[UploadFile],product_id:str):
+  """
+  Store several uploads concurrently and build their ProductImage rows.
+  Files are content addressed, so an image already in the catalog is not
+  stored or processed again: the new row shares its path and variants.
+  """
+  stored = upload_files(files,"products",lock=lambda paths: lock_stored_files(db, paths))
+  hashes = {content_hash for _, content_hash in stored}
+  processed = {
+    image.content_hash: image
+    for image in db.query(ProductImage).filter(ProductImage.content_hash.in_(hashes), ProductImage.variants.isnot(None))
+  }
+  db_product = db.get(Product, uuid.UUID(str(product_id)))
+  db_images = []
+  for file_path, content_hash in stored:
+    source = processed.get(content_hash)
+    db_product_image = ProductImage(
+      id=uuid.uuid4(),
+      path=file_path,
+      content_hash=content_hash,
+      alt="Product Image",
+      product_id=product_id,
+      width=source.width if source else None,
+      height=source.height if source else None,
+      variants=source.variants if source else None,
+      placeholder=source.placeholder if source else None,
+    )
+    # first image becomes the listing image
+    if db_product and not db_product.primary_image_id:
+      set_primary_image(db_product, db_product_image)
+    db_images.append(db_product_image)
+  return db_images
+
+
 def upload_product_image(db:Session,file:UploadFile,product_id:str):
-  folder = "products"
-  filename = f"{uuid.uuid4().hex}"
-  file_path = upload_file(file,folder,filename)
-  db_product_images = ProductImage(
-    path=file_path,
-    alt="Product Image",
-    product_id=product_id
-  )
-  print('created',filename)
-  return db_product_images
+  return upload_product_images(db,[file],product_id)[0]
+
+
+def set_primary_image(db_product: Product, db_image: ProductImage | None):
+  """Copy the listing image (and its variants once processed) onto the product row."""
+  db_product.primary_image_id = db_image.id if db_image else None
+  db_product.primary_image_path = db_image.path if db_image else None
+  db_product.primary_image_variants = db_image.variants if db_image else None
+  db_product.primary_image_placeholder = db_image.placeholder if db_image else None
+
+
+def generate_image_variants(image_ids):
+  """
+  Background task: hand freshly committed uploads to the image process pool.
+  Returns straight away, the results are stored by _store_image_variants.
+  """
+  with SessionLocal() as db:
+    paths = [
+      path for (path,) in db.query(ProductImage.path)
+      .filter(ProductImage.id.in_(list(image_ids)), ProductImage.variants.is_(None))
+      .distinct()
+    ]
+  for path in paths:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    future = get_image_pool().submit(process_image, path, f"{settings.MEDIA_FOLDER}/products/variants", stem)
+    future.add_done_callback(partial(_store_image_variants, path))
+
+
+def _store_image_variants(path, future):
+  try:
+    result = future.result()
+  except Exception as e:
+    print(f"Image processing failed for {path}: {e}")
+    return
+  with SessionLocal() as db:
+    db_images = db.query(ProductImage).filter(ProductImage.path == path).all()
+    if not db_images:
+      # deleted while it was being processed
+      for variant_path in variant_paths(result["variants"]):
+        delete_file(variant_path)
+      return
+    for db_image in db_images:
+      db_image.width = result["width"]
+      db_image.height = result["height"]
+      db_image.variants = result["variants"]
+      db_image.placeholder = result["placeholder"]
+      db_product = db_image.product
+      if db_product and db_product.primary_image_id == db_image.id:
+        set_primary_image(db_product, db_image)
+    db.commit()
+    invalidate_product_cache([db_image.product_id for db_image in db_images])
 
 
 def get_product_image_by_id(db:Session,id):
   return db.query(ProductImage).filter(ProductImage.id == id).first()
+def lock_stored_files(db:Session, paths):
+  """
+  Serialise the check "is another row using this file" with uploads of the
+  same content, until the transaction ends. Lock paths in sorted order.
+  """
+  for path in paths:
+    db.execute(select(func.pg_advisory_xact_lock(func.hashtext(path))))
+
 def delete_product_image(db:Session, id):
   db_product_image = get_product_image_by_id(db,id)
   if not db_product_image:
     return True
-  delete_file(db_product_image.url)
+  # stored files are shared by every row with the same content; an upload
+  # of that content waits here, or this sees its committed row
+  lock_stored_files(db, [db_product_image.path])
+  shared = (
+    db.query(ProductImage.id)
+    .filter(ProductImage.path == db_product_image.path, ProductImage.id != db_product_image.id)
+    .first()
+  )
+  if shared is None:
+    delete_file(db_product_image.url)
+    for path in variant_paths(db_product_image.variants):
+      delete_file(path)
+  db_product = db_product_image.product
+  if db_product and db_product.primary_image_id == db_product_image.id:
+    next_image = (
+      db.query(ProductImage)
+      .filter(ProductImage.product_id == db_product.id, ProductImage.id != db_product_image.id)
+      .first()
+    )
+    set_primary_image(db_product, next_image)
   db.delete(db_product_image)
   db.commit()
   return True
@@ -145,17 +469,69 @@ def update_product(db:Session,db_product,update_data:dict):
 
 
 
-def get_list_of_product(
-    db: Session,
-    page: int,
-    size: int,
+def parse_attribute_filters(values) -> dict:
+    """["metal:silver", "stone:kundan", "metal:gold"] -> {"metal": ["silver", "gold"], "stone": ["kundan"]}"""
+    attributes = {}
+    for value in values or []:
+        key, sep, attribute_value = value.partition(":")
+        if not sep or not key.strip() or not attribute_value.strip():
+            raise HTTPException(status_code=400, detail=f"Invalid attribute filter {value!r}, expected key:value")
+        attributes.setdefault(key.strip(), []).append(attribute_value.strip())
+    return attributes
+
+
+def attribute_condition(key: str, values: list):
+    """
+    product_metadata containment for one attribute, any of `values`. Both
+    stored shapes are matched: the admin form's [{"key": .., "value": ..}]
+    list and a plain {"key": "value"} object. Every branch is an @> that
+    ix_products_metadata (jsonb_path_ops) can answer.
+    """
+    conditions = []
+    for value in values:
+        conditions.append(Product.product_metadata.contains([{"key": key, "value": value}]))
+        conditions.append(Product.product_metadata.contains({key: value}))
+    return or_(*conditions)
+
+
+# filter values that sort the listing instead of narrowing it
+PRICE_SORTS = ("lowest_first", "highest_first")
+
+
+def memory_search_ready() -> bool:
+    return settings.SEARCH_BACKEND == "memory" and product_search_index.ready
+
+
+def _ranked_page(db: Session, query, search, filter, category, is_admin, attributes, offset, size):
+    """
+    (products, total) of a relevance ordered search on the in-memory index.
+    Ranking, counting and the page cut happen here; postgres only fetches
+    the page's rows by primary key. The index knows which products are
+    active; any other filter narrows the ranked ids with one id-only query.
+    """
+    ranked_ids = product_search_index.search(search, active_only=not is_admin)
+    narrowing = apply_product_filters(db.query(Product.id), filter, None, category, True, attributes=attributes)
+    if ranked_ids and narrowing.whereclause is not None:
+        kept = {row.id for row in narrowing.filter(Product.id.in_(ranked_ids))}
+        ranked_ids = [product_id for product_id in ranked_ids if product_id in kept]
+    page_ids = ranked_ids[offset:offset + size]
+    rows = {product.id: product for product in query.filter(Product.id.in_(page_ids))} if page_ids else {}
+    return [rows[product_id] for product_id in page_ids if product_id in rows], len(ranked_ids)
+
+
+def apply_product_filters(
+    query,
     filter: str,
     search: str,
     category: str,
-    is_admin: bool = False
+    is_admin: bool = False,
+    relevance_ordered: bool = False,
+    attributes: dict | None = None,
 ):
-    skip = (page - 1) * size
-    query = db.query(Product)
+    """Search / category / attribute / listing filters shared by the product list and the facets."""
+    # --- Attribute filters: AND across keys, OR within a key ---
+    for key, values in (attributes or {}).items():
+        query = query.filter(attribute_condition(key, values))
 
     # --- Category filter ---
     if category:
@@ -166,7 +542,18 @@ def get_list_of_product(
         query = query.filter(Product.active == True)
 
     # --- Search filter ---
-    if search:
+    search_query = build_search_query(search) if search else None
+    if search and memory_search_ready():
+        # relevance ordered listings page in memory (_ranked_page) and never get here
+        query = query.filter(Product.id.in_(product_search_index.search(search)))
+    elif search_query is not None:
+        # served by the GIN index on search_vector
+        query = query.filter(Product.search_vector.op("@@")(search_query))
+        if relevance_ordered:
+            # most relevant first unless a price sort was asked for
+            query = query.order_by(func.ts_rank(Product.search_vector, search_query).desc())
+    elif search:
+        # punctuation only (e.g. part of a code), nothing to tokenize
         query = query.filter(
             or_(
                 Product.title.ilike(f"%{search}%"),
@@ -175,43 +562,214 @@ def get_list_of_product(
             )
         )
 
-    # --- Sorting / special filters ---
-    if not filter:
-        query = query.order_by(Product.updated_at.desc())
-    elif filter == "featured":
+    # --- Special filters ---
+    if filter == "featured":
         query = query.filter(Product.featured == True)
     elif filter == "new_arrivals":
         query = query.filter(Product.created_at >= datetime.now() - timedelta(days=30))
-    elif filter == "lowest_first":
-        query = query.order_by(Product.price.asc())
-    elif filter == "highest_first":
-        query = query.order_by(Product.price.desc())
-    elif filter in ("everyday_elegance", "occasion_charm", "the_bridal_edit", "designer_choice"):
-        collection_slug = filter  
-        collection_name = filter.replace("_", " ")  
-        query = query.filter(
-            or_(
-                func.lower(Product.collection) == collection_slug.lower(),
-                func.lower(Product.collection) == collection_name.lower(),
-                Product.collection.ilike(f"%{collection_name}%"),
-                Product.collection.ilike(f"%{collection_slug}%"),
-            )
+    elif filter and filter not in PRICE_SORTS:
+        # anything else names a collection; an unknown one matches nothing
+        # rather than falling through to the whole catalog (ix_products_collection_listing)
+        query = query.filter(Product.collection_slug == slugify_collection(filter))
+    return query
+
+
+# upper edges of the price facet buckets (INR); the last bucket is open ended
+PRICE_BUCKET_EDGES = (500, 1000, 2500, 5000, 10000)
+
+
+def get_product_facets(
+    db: Session,
+    filter: str = "",
+    search: str | None = None,
+    category: str | None = None,
+    attributes: dict | None = None,
+) -> ProductFacetsResponse:
+    """
+    Category, collection, featured and price bucket counts for a listing
+    context, in one GROUPING SETS query. The category counts ignore the
+    selected category so the other categories stay visible; everything
+    else is counted inside it. Results without a search term are cached
+    until the catalog changes.
+    """
+    cache_key = "facets:" + json.dumps([filter, category.lower() if category else None, attributes or {}], sort_keys=True)
+    if not search:
+        cached_facets = product_cache.get(cache_key)
+        if cached_facets is not MISSING:
+            return ProductFacetsResponse(**cached_facets)
+
+    in_category = func.lower(Product.category) == category.lower() if category else literal(True)
+    bucket = func.width_bucket(Product.price, array(PRICE_BUCKET_EDGES, type_=Product.price.type))
+    # categories are matched case-insensitively everywhere, so count them that way too
+    category_key = func.lower(Product.category)
+    query = apply_product_filters(db.query(Product), filter, search, None, attributes=attributes)
+    rows = (
+        query.with_entities(
+            func.min(Product.category).label("category"),
+            Product.collection_slug,
+            Product.featured,
+            bucket.label("bucket"),
+            func.grouping(category_key).label("by_category"),
+            func.grouping(Product.collection_slug).label("by_collection"),
+            func.grouping(Product.featured).label("by_featured"),
+            func.grouping(bucket).label("by_bucket"),
+            func.count().label("all_count"),
+            func.count().filter(in_category).label("count"),
         )
+        .group_by(func.grouping_sets(
+            category_key, Product.collection_slug, Product.featured, bucket, literal_column("()"),
+        ))
+        .all()
+    )
+
+    facets = {"total": 0, "categories": [], "collections": [], "featured": 0, "price_buckets": []}
+    edges = (None,) + tuple(float(edge) for edge in PRICE_BUCKET_EDGES) + (None,)
+    for row in rows:
+        # grouping() is 0 for the column a row is grouped by
+        if row.by_category == 0:
+            facets["categories"].append({"value": row.category, "count": row.all_count})
+        elif row.count == 0:
+            continue
+        elif row.by_collection == 0:
+            facets["collections"].append({"value": row.collection_slug, "count": row.count})
+        elif row.by_featured == 0:
+            if row.featured:
+                facets["featured"] = row.count
+        elif row.by_bucket == 0:
+            if row.bucket is None:
+                # products without a price have no range to offer
+                continue
+            index = row.bucket
+            facets["price_buckets"].append({"min": edges[index], "max": edges[index + 1], "count": row.count})
+        else:
+            facets["total"] = row.count
+    facets["categories"].sort(key=lambda facet: -facet["count"])
+    facets["collections"].sort(key=lambda facet: -facet["count"])
+    facets["price_buckets"].sort(key=lambda facet: facet["min"] or 0)
+
+    if not search:
+        product_cache.set(cache_key, facets, {"product:list"})
+    return ProductFacetsResponse(**facets)
+
+
+PRODUCT_ATTRIBUTES_SQL = text("""
+    SELECT attribute.key, attribute.value, count(*) AS count
+    FROM products p
+    CROSS JOIN LATERAL (
+        SELECT element->>'key', element->>'value'
+        FROM jsonb_array_elements(CASE WHEN jsonb_typeof(p.product_metadata) = 'array' THEN p.product_metadata ELSE '[]' END) element
+        WHERE jsonb_typeof(element) = 'object'
+        UNION ALL
+        SELECT entry.key, entry.value
+        FROM jsonb_each_text(CASE WHEN jsonb_typeof(p.product_metadata) = 'object' THEN p.product_metadata ELSE '{}' END) entry
+    ) attribute (key, value)
+    WHERE p.active AND attribute.key <> '' AND attribute.value <> ''
+    GROUP BY attribute.key, attribute.value
+    ORDER BY attribute.key, count DESC
+""")
+
+
+def get_product_attributes(db: Session) -> List[ProductAttributeFacet]:
+    """Distinct metadata keys / values of active products with counts, cached until the catalog changes."""
+    attributes = product_cache.get("attributes")
+    if attributes is MISSING:
+        grouped = {}
+        for key, value, count in db.execute(PRODUCT_ATTRIBUTES_SQL):
+            grouped.setdefault(key, []).append({"value": value, "count": count})
+        attributes = [{"key": key, "values": values} for key, values in grouped.items()]
+        product_cache.set("attributes", attributes, {"product:list"})
+    return [ProductAttributeFacet(**attribute) for attribute in attributes]
+
+
+def get_reserved_stock(db: Session, product_ids) -> dict:
+    """product_id -> qty held by unpaid orders; products.stock already excludes it."""
+    if not product_ids:
+        return {}
+    return dict(
+        db.query(StockReservation.product_id, func.sum(StockReservation.qty))
+        .filter(
+            StockReservation.product_id.in_(list(product_ids)),
+            StockReservation.status == ReservationStatus.HELD.value,
+        )
+        .group_by(StockReservation.product_id)
+        .all()
+    )
+
+
+def get_list_of_product(
+    db: Session,
+    page: int,
+    size: int,
+    filter: str,
+    search: str,
+    category: str,
+    is_admin: bool = False,
+    cursor: str | None = None,
+    sort_by_sold: str | None = None,
+    min_sold: int | None = None,
+    attributes: dict | None = None,
+):
+    skip = (page - 1) * size
+    query = db.query(Product)
+    if is_admin:
+        # the admin rows serialize full image lists, batch load them
+        query = query.options(selectinload(Product.images), joinedload(Product.sales_stats))
+    # --- Units sold (admin), read from the rollup ---
+    units_sold = func.coalesce(ProductSalesStats.units_sold, 0)
+    if sort_by_sold or min_sold:
+        query = query.outerjoin(ProductSalesStats, ProductSalesStats.product_id == Product.id)
+    if min_sold:
+        query = query.filter(units_sold >= min_sold)
+    if sort_by_sold:
+        query = query.order_by(units_sold.asc() if sort_by_sold == "asc" else units_sold.desc())
+    relevance_ordered = bool(search) and filter not in PRICE_SORTS
+    # ordered by something other than a plain column, cursors carry an offset
+    presorted = relevance_ordered or bool(sort_by_sold)
+
+    ranked_in_memory = relevance_ordered and not (sort_by_sold or min_sold) and memory_search_ready()
+    if not ranked_in_memory:
+        query = apply_product_filters(query, filter, search, category, is_admin, relevance_ordered, attributes)
+
+    # --- Sorting ---
+    sort_column, descending = Product.updated_at, True
+    if filter == "lowest_first":
+        sort_column, descending = Product.price, False
+    elif filter == "highest_first":
+        sort_column, descending = Product.price, True
 
     # --- Pagination ---
-    total = query.count()
-    products = query.offset(skip).limit(size).all()
-    has_next = skip + size < total
-    has_prev = page > 1
+    next_cursor = None
+    if ranked_in_memory:
+        offset = cursor_offset(cursor) if cursor is not None else skip
+        products, total = _ranked_page(db, query, search, filter, category, is_admin, attributes, offset, size)
+        has_next = offset + size < total
+        if cursor is not None:
+            next_cursor = offset_cursor(offset + size) if has_next else None
+        has_prev = bool(cursor) if cursor is not None else page > 1
+    elif cursor is not None:
+        # keyset on (sort column, id); relevance ranked pages carry an offset
+        if presorted:
+            products, next_cursor = paginate_cursor(query.order_by(Product.id), cursor, size)
+        else:
+            # a product without a price comes last in both price sorts
+            products, next_cursor = paginate_cursor(query, cursor, size, sort_column, Product.id, descending, nulls_last=sort_column is Product.price)
+        total = count_rows(db, query, exact=False)
+        has_next = next_cursor is not None
+        has_prev = bool(cursor)
+    else:
+        sort_order = sort_column.desc() if descending else sort_column.asc()
+        if sort_column is Product.price:
+            sort_order = sort_order.nulls_last()
+        query = query.order_by(sort_order, Product.id.desc() if descending else Product.id.asc())
+        total = query.count()
+        products = query.offset(skip).limit(size).all()
+        has_next = skip + size < total
+        has_prev = page > 1
     items = []
     # --- User vs Admin response ---
     if not is_admin:
         for product in products:
-            first_image_url = (
-                product.images[0].url
-                if product.images
-                else "https://lightwidget.com/wp-content/uploads/localhost-file-not-found.jpg"
-            )
+            first_image_url = product.listing_image_url
             items.append(
                 ProductListResponse(
                     id=product.id,
@@ -220,9 +778,12 @@ def get_list_of_product(
                     actual_price=product.actual_price,
                     price=product.price,
                     image=first_image_url,
+                    image_srcset=product.image_srcset,
+                    placeholder=product.primary_image_placeholder,
                     stock=product.stock,
                     category=product.category,
-                    collection=product.collection
+                    collection=product.collection,
+                    collection_slug=product.collection_slug,
                 )
             )
         return PaginationResponse[ProductListResponse](
@@ -232,12 +793,16 @@ def get_list_of_product(
             has_next=has_next,
             has_prev=has_prev,
             total=total,
+            next_cursor=next_cursor,
         )
     else:
+        reserved = get_reserved_stock(db, [product.id for product in products])
         for product in products:
-            total_sold = sum(item.qty for item in product.order_items)
+            total_sold = product.sales_stats.units_sold if product.sales_stats else 0
             item_response = ProductAdminListResponse.from_orm(product)
             item_response.total_sold = total_sold
+            item_response.reserved_stock = reserved.get(product.id, 0)
+            item_response.on_hand_stock = product.stock + item_response.reserved_stock
             items.append(item_response)
 
         return PaginationResponse[ProductAdminListResponse](
@@ -247,4 +812,5 @@ def get_list_of_product(
             has_next=has_next,
             has_prev=has_prev,
             total=total,
+            next_cursor=next_cursor,
         )
@@ -0,0 +1,129 @@
+"""
+Merchant (Google Shopping) product feed.
+
+Rows come off a server side cursor in chunks, so memory stays flat whatever
+the catalog size. The catalog version (max updated_at plus row count) is the
+ETag and is cached until the next catalog write; the first request after a
+change writes a gzip copy to MEDIA_FOLDER/feeds while streaming, and later
+requests are served from that file until the catalog changes again. The
+gzip and plain responses are different representations, so the gzip one's
+ETag carries a "-gzip" suffix.
+"""
+import glob
+import gzip
+import hashlib
+import os
+import uuid
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.app_product.models import Product
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.lib.cache import product_cache, MISSING
+
+FEED_COLUMNS = ["id", "title", "description", "link", "image_link", "availability", "price", "condition"]
+FEED_DIR = os.path.join(settings.MEDIA_FOLDER, "feeds")
+FEED_IMAGE_PLACEHOLDER = "https://upload.wikimedia.org/wikipedia/commons/0/0a/No-image-available.png"
+CHUNK_SIZE = 1000
+
+
+def catalog_version(db: Session) -> str:
+  version = product_cache.get("feed:version")
+  if version is MISSING:
+    # count catches deletes, which leave max(updated_at) alone
+    latest, total = db.query(func.max(Product.updated_at), func.count(Product.id)).one()
+    version = hashlib.sha1(f"{latest}:{total}".encode()).hexdigest()[:16]
+    product_cache.set("feed:version", version, {"catalog"})
+  return version
+
+
+def gzip_path(version: str) -> str:
+  return os.path.join(FEED_DIR, f"products-{version}.tsv.gz")
+
+
+def _clean(value) -> str:
+  return str(value or "").replace("\t", " ").replace("\r", " ").replace("\n", " ")
+
+
+def _row(product) -> str:
+  image_url = f"{settings.BASE_URL}/{product.primary_image_path}" if product.primary_image_path else FEED_IMAGE_PLACEHOLDER
+  return "\t".join([
+    str(product.id),
+    _clean(product.title),
+    _clean(product.description),
+    f"{settings.FRONTEND_URL}/product/{product.id}",
+    image_url,
+    "in stock" if (product.stock or 0) > 0 else "out of stock",
+    f"{product.price:.2f} INR" if product.price else "0 INR",
+    "new",
+  ]) + "\n"
+
+
+def iter_feed_chunks():
+  """TSV bytes, CHUNK_SIZE rows at a time. Opens its own session: it runs after the request's one is closed."""
+  with SessionLocal() as db:
+    rows = (
+      db.query(
+        Product.id, Product.title, Product.description, Product.price,
+        Product.stock, Product.primary_image_path,
+      )
+      .filter(Product.active == True)
+      .order_by(Product.id)
+      .execution_options(yield_per=CHUNK_SIZE)
+    )
+    yield ("\t".join(FEED_COLUMNS) + "\n").encode()
+    lines = []
+    for product in rows:
+      lines.append(_row(product))
+      if len(lines) >= CHUNK_SIZE:
+        yield "".join(lines).encode()
+        lines = []
+    if lines:
+      yield "".join(lines).encode()
+
+
+def stream_and_store(version: str):
+  """Stream the feed and keep a gzip copy of it for `version`."""
+  os.makedirs(FEED_DIR, exist_ok=True)
+  tmp_path = os.path.join(FEED_DIR, f".{uuid.uuid4().hex}.tmp")
+  try:
+    with gzip.open(tmp_path, "wb") as out:
+      for chunk in iter_feed_chunks():
+        out.write(chunk)
+        yield chunk
+    os.replace(tmp_path, gzip_path(version))
+  finally:
+    # client went away half way, or the rename already happened
+    if os.path.exists(tmp_path):
+      os.remove(tmp_path)
+  _remove_old_copies(keep=gzip_path(version))
+
+
+def _remove_old_copies(keep: str):
+  """
+  Drop stored copies except `keep` and the one before it: a request that
+  picked the previous version just before this one was stored may still be
+  about to open that file.
+  """
+  paths = sorted(glob.glob(os.path.join(FEED_DIR, "products-*.tsv.gz")), key=_mtime, reverse=True)
+  for path in [path for path in paths if path != keep][1:]:
+    try:
+      os.remove(path)
+    except FileNotFoundError:
+      pass
+
+
+def _mtime(path: str) -> float:
+  try:
+    return os.path.getmtime(path)
+  except FileNotFoundError:
+    return 0.0
+
+
+def iter_gzip_file(path: str):
+  """Plain TSV out of a stored copy, for clients that don't accept gzip."""
+  with gzip.open(path, "rb") as f:
+    while chunk := f.read(64 * 1024):
+      yield chunk
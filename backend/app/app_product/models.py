@@ -1,13 +1,53 @@
+import re
 import uuid
-from sqlalchemy import Column, String, Text, Boolean, DateTime, Numeric, Integer, ForeignKey,DECIMAL,JSON
+from datetime import datetime
+from sqlalchemy import Column, String, Text, Boolean, DateTime, Numeric, Integer, ForeignKey,DECIMAL,JSON,Computed,Index,Float
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import DDL,event,func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from app.common.mixin import IDMixin,CreatedUpdatedAtMixin
 from app.core.config import settings
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB,TSVECTOR
 
 
+# weighted document used by catalog search: title > code > description
+PRODUCT_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(code, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+# canonical collection key: "The Bridal Edit " -> "the_bridal_edit"
+COLLECTION_SLUG = (
+    "btrim(regexp_replace(lower(coalesce(collection, '')), '[^a-z0-9]+', '_', 'g'), '_')"
+)
+
+
+def slugify_collection(value: str | None) -> str:
+    """Python side of COLLECTION_SLUG, for matching request values against the column."""
+    return re.sub(r"[^a-z0-9]+", "_", (value or "").lower()).strip("_")
+
+
+PLACEHOLDER_IMAGE_URL = "https://lightwidget.com/wp-content/uploads/localhost-file-not-found.jpg"
+# variant widths served to listing cards and cart/thumbnail slots
+LISTING_IMAGE_WIDTH = 400
+THUMBNAIL_IMAGE_WIDTH = 200
+
+
+def variant_url(variants, width: int, fmt: str = "webp") -> str | None:
+    """URL of the smallest `fmt` variant at least `width` wide, else the largest one."""
+    sizes = sorted((int(w), path) for w, path in ((variants or {}).get(fmt) or {}).items())
+    if not sizes:
+        return None
+    path = next((path for w, path in sizes if w >= width), sizes[-1][1])
+    return f"{settings.BASE_URL}/{path}"
+
+
+def variant_srcset(variants, fmt: str = "webp") -> str | None:
+    sizes = sorted((int(w), path) for w, path in ((variants or {}).get(fmt) or {}).items())
+    if not sizes:
+        return None
+    return ", ".join(f"{settings.BASE_URL}/{path} {w}w" for w, path in sizes)
 
 
 class Product(Base, IDMixin, CreatedUpdatedAtMixin):
@@ -20,21 +60,135 @@ class Product(Base, IDMixin, CreatedUpdatedAtMixin):
     actual_price = Column(DECIMAL(10,5))
     description = Column(Text)
     collection = Column(String(200),default="everyday_elegance")
+    collection_slug = Column(Text, Computed(COLLECTION_SLUG, persisted=True))
     active = Column(Boolean, default=True)
     product_metadata = Column(JSONB,nullable=True,default=[])
     featured = Column(Boolean, default=False)
     category = Column(String,nullable=True)
+    search_vector = Column(TSVECTOR, Computed(PRODUCT_SEARCH_VECTOR, persisted=True))
+    # copy of the first image so listings never have to load product_images
+    primary_image_id = Column(UUID(as_uuid=True), nullable=True)
+    primary_image_path = Column(String(500), nullable=True)
+    primary_image_variants = Column(JSONB(none_as_null=True), nullable=True)
+    primary_image_placeholder = Column(Text, nullable=True)
     images = relationship("ProductImage", back_populates="product", cascade="all, delete-orphan")
     order_items = relationship("OrderItem", back_populates="product", cascade="all, delete-orphan")
     cart_items = relationship("CartItem", back_populates="product", cascade="all, delete-orphan")
+    sales_stats = relationship("ProductSalesStats", back_populates="product", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    rating_stats = relationship("ProductRatingStats", back_populates="product", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    __table_args__ = (
+        Index("ix_products_search_vector", "search_vector", postgresql_using="gin"),
+        # trigram indexes behind the typo tolerant /suggest endpoint
+        Index("ix_products_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        Index("ix_products_code_trgm", "code", postgresql_using="gin", postgresql_ops={"code": "gin_trgm_ops"}),
+        # attribute filters: product_metadata @> ...
+        Index("ix_products_metadata", "product_metadata", postgresql_using="gin", postgresql_ops={"product_metadata": "jsonb_path_ops"}),
+        # bulk import upserts on ON CONFLICT (code)
+        Index("ux_products_code", "code", unique=True),
+    )
+    @property
+    def primary_image_url(self) -> str:
+        if self.primary_image_path:
+            return f"{settings.BASE_URL}/{self.primary_image_path}"
+        return PLACEHOLDER_IMAGE_URL
+
+    @property
+    def listing_image_url(self) -> str:
+        return variant_url(self.primary_image_variants, LISTING_IMAGE_WIDTH) or self.primary_image_url
+
+    @property
+    def thumbnail_url(self) -> str:
+        return variant_url(self.primary_image_variants, THUMBNAIL_IMAGE_WIDTH) or self.primary_image_url
+
+    @property
+    def image_srcset(self) -> str | None:
+        return variant_srcset(self.primary_image_variants)
+
+event.listen(Product.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+# listing shapes, see alembic a6d3f8c2e471
+Index("ix_products_active_updated", Product.updated_at.desc(), Product.id.desc(), postgresql_where=Product.active)
+Index("ix_products_active_price", Product.price, Product.id, postgresql_where=Product.active)
+# highest_first keeps unpriced products last too, see alembic b8e4f2a6c031
+Index("ix_products_active_price_desc", Product.price.desc().nulls_last(), Product.id.desc(), postgresql_where=Product.active)
+Index(
+    "ix_products_category_lower",
+    func.lower(Product.category), Product.updated_at.desc(), Product.id.desc(),
+    postgresql_where=Product.active,
+)
+Index("ix_products_updated", Product.updated_at.desc(), Product.id.desc())
+# collection pages: equality on slug + active, rows already in updated_at order
+Index(
+    "ix_products_collection_listing",
+    Product.collection_slug, Product.active, Product.updated_at.desc(), Product.id.desc(),
+)
+
+
 class ProductImage(Base):
     __tablename__ = "product_images"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), index=True)
     path = Column(String(500), nullable=False)  
+    # sha256 of the stored file; rows with the same hash share one file
+    content_hash = Column(String(64), nullable=True, index=True)
     alt = Column(String(255),default="Product Image")
+    # filled in by the image pipeline once the upload has been processed
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    variants = Column(JSONB(none_as_null=True), nullable=True)  # {"webp": {"200": path, ...}, "jpeg": {...}}
+    placeholder = Column(Text, nullable=True)  # tiny blurred data URI
     product = relationship("Product", back_populates="images",uselist=False)
+    __table_args__ = (
+        Index("ix_product_images_path", "path"),
+    )
     @property
     def url(self) -> str:
         return f"{settings.BASE_URL}/{self.path}"
+    @property
+    def thumbnail(self) -> str:
+        return variant_url(self.variants, LISTING_IMAGE_WIDTH) or self.url
+    @property
+    def srcset(self) -> str | None:
+        return variant_srcset(self.variants)
+    @property
+    def jpeg_srcset(self) -> str | None:
+        return variant_srcset(self.variants, "jpeg")
+
+
+class ProductSalesStats(Base):
+    """Running totals of paid order lines, kept in step by the order crud."""
+    __tablename__ = "product_sales_stats"
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    units_sold = Column(Integer, nullable=False, default=0, index=True)
+    revenue = Column(Numeric(14,2), nullable=False, default=0)
+    last_sold_at = Column(DateTime, nullable=True)
+    product = relationship("Product", back_populates="sales_stats")
+
+
+class ProductRatingStats(Base):
+    """Rating count, sum and 1-5 star histogram, kept in step with OrderItem.rating."""
+    __tablename__ = "product_rating_stats"
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    rating_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    star_1 = Column(Integer, nullable=False, default=0)
+    star_2 = Column(Integer, nullable=False, default=0)
+    star_3 = Column(Integer, nullable=False, default=0)
+    star_4 = Column(Integer, nullable=False, default=0)
+    star_5 = Column(Integer, nullable=False, default=0)
+    product = relationship("Product", back_populates="rating_stats")
+    @property
+    def average(self) -> float | None:
+        return self.rating_sum / self.rating_count if self.rating_count else None
+    @property
+    def histogram(self) -> dict:
+        return {star: getattr(self, f"star_{star}") for star in range(1, 6)}
+
 
+class ProductRelated(Base):
+    """Top related products per product, written by app.app_product.related."""
+    __tablename__ = "product_related"
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    related_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    score = Column(Float, nullable=False)
+    computed_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
@@ -0,0 +1,175 @@
+"""
+Precomputed related products.
+
+Each product becomes a vector: hashed TF-IDF over its title tokens
+(L2 normalised) next to one-hot collection and category columns. The
+columns are scaled so that a dot product reproduces the weights of the old
+live score: same collection 50, same category 20, title overlap up to 6.
+Neighbours come out of blocked X[block] @ X_active.T products, so memory
+stays at BLOCK_SIZE x active floats whatever the catalog size, and the
+top K per row are written to product_related.
+
+Incremental runs only recompute rows for products changed since the last
+run (plus rows that pointed at them or came up short) and merge changed
+products into the other lists where one of them beats the list's lowest
+score; idf weights drift slightly between full runs. The watermark is the
+newest updated_at the run read, stored as computed_at.
+"""
+import re
+import zlib
+
+import numpy as np
+from sqlalchemy import func, insert, text
+from sqlalchemy.orm import Session
+
+from app.app_product.models import Product, ProductRelated
+
+TOP_K = 8
+TITLE_BUCKETS = 256
+BLOCK_SIZE = 512
+COLLECTION_WEIGHT = 50.0
+CATEGORY_WEIGHT = 20.0
+TITLE_WEIGHT = 6.0
+# newer products win ties, like the live query's updated_at ordering
+RECENCY_TIEBREAK = 1e-3
+# serialises runs across workers
+ADVISORY_LOCK_ID = 7318041
+
+
+def _title_buckets(title):
+  tokens = [t for t in re.findall(r"\w+", (title or "").lower()) if len(t) > 2]
+  return [zlib.crc32(t.encode()) % TITLE_BUCKETS for t in tokens]
+
+
+def vectorize(products):
+  """(n, d) float32 feature matrix for rows of (title, collection, category)."""
+  n = len(products)
+  buckets = [_title_buckets(p.title) for p in products]
+  collections = {}
+  categories = {}
+  for p in products:
+    collections.setdefault((p.collection or "").lower(), len(collections))
+    categories.setdefault((p.category or "").lower(), len(categories))
+
+  X = np.zeros((n, TITLE_BUCKETS + len(collections) + len(categories)), dtype=np.float32)
+  for i, row in enumerate(buckets):
+    np.add.at(X[i], row, 1.0)
+  df = np.count_nonzero(X[:, :TITLE_BUCKETS], axis=0)
+  X[:, :TITLE_BUCKETS] *= (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+  norms = np.linalg.norm(X[:, :TITLE_BUCKETS], axis=1, keepdims=True)
+  np.divide(X[:, :TITLE_BUCKETS], norms, out=X[:, :TITLE_BUCKETS], where=norms > 0)
+  X[:, :TITLE_BUCKETS] *= np.sqrt(TITLE_WEIGHT)
+
+  offset = TITLE_BUCKETS
+  for i, p in enumerate(products):
+    X[i, offset + collections[(p.collection or "").lower()]] = np.sqrt(COLLECTION_WEIGHT)
+  offset += len(collections)
+  for i, p in enumerate(products):
+    X[i, offset + categories[(p.category or "").lower()]] = np.sqrt(CATEGORY_WEIGHT)
+  return X
+
+
+def _blocks(X, rows, candidates, tiebreak):
+  """Yield (row indexes, score block) of X[rows] against X[candidates]."""
+  C = X[candidates].T
+  position = np.full(len(X), -1)
+  position[candidates] = np.arange(len(candidates))
+  for start in range(0, len(rows), BLOCK_SIZE):
+    block = rows[start:start + BLOCK_SIZE]
+    scores = X[block] @ C + tiebreak
+    own = position[block]
+    mask = own >= 0
+    scores[np.nonzero(mask)[0], own[mask]] = -np.inf
+    yield block, scores
+
+
+def _top_k(scores, k):
+  k = min(k, scores.shape[1])
+  if k <= 0:
+    return np.empty((len(scores), 0), dtype=int)
+  part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+  order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+  return np.take_along_axis(part, order, axis=1)
+
+
+def refresh_related_products(db: Session, full: bool = False, k: int = TOP_K):
+  """
+  Recompute product_related. Returns the number of products rewritten, or
+  None when another worker is already running.
+  """
+  if not db.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": ADVISORY_LOCK_ID}).scalar():
+    return None
+  last_run = None if full else db.query(func.max(ProductRelated.computed_at)).scalar()
+
+  products = (
+    db.query(Product.id, Product.title, Product.collection, Product.category, Product.active, Product.updated_at)
+    .order_by(Product.updated_at)
+    .all()
+  )
+  if not products:
+    return 0
+  # a clock reading could pass a write that commits after the read above
+  watermark = products[-1].updated_at
+  X = vectorize(products)
+  candidates = np.array([i for i, p in enumerate(products) if p.active], dtype=int)
+  # products are sorted by updated_at, so the index doubles as recency
+  tiebreak = (candidates / max(len(products), 1) * RECENCY_TIEBREAK).astype(np.float32)
+  expected = min(k, len(candidates) - 1) if len(candidates) else 0
+
+  lists = {}
+  if last_run is not None:
+    for row in db.query(ProductRelated).order_by(ProductRelated.product_id, ProductRelated.rank):
+      lists.setdefault(row.product_id, []).append((row.related_id, row.score))
+
+  if last_run is None:
+    recompute = set(range(len(products)))
+    merge = set()
+  else:
+    changed = {i for i, p in enumerate(products) if p.updated_at > last_run}
+    changed_ids = {products[i].id for i in changed}
+    recompute = set(changed)
+    for i, p in enumerate(products):
+      neighbours = lists.get(p.id)
+      if neighbours is None or len(neighbours) < expected or any(r in changed_ids for r, _ in neighbours):
+        recompute.add(i)
+    changed_active = np.array(sorted(changed & set(candidates.tolist())), dtype=int)
+    merge = set() if not len(changed_active) else set(range(len(products))) - recompute
+
+  new_lists = {}
+  rows = np.array(sorted(recompute), dtype=int)
+  for block, scores in _blocks(X, rows, candidates, tiebreak):
+    for offset, (i, top) in enumerate(zip(block, _top_k(scores, k))):
+      new_lists[products[i].id] = [
+        (products[candidates[j]].id, float(scores[offset, j])) for j in top
+      ]
+
+  if merge:
+    rows = np.array(sorted(merge), dtype=int)
+    changed_tiebreak = (changed_active / max(len(products), 1) * RECENCY_TIEBREAK).astype(np.float32)
+    for block, scores in _blocks(X, rows, changed_active, changed_tiebreak):
+      best = scores.max(axis=1)
+      for offset, i in enumerate(block):
+        product_id = products[i].id
+        current = lists.get(product_id, [])
+        if current and len(current) >= expected and best[offset] <= current[-1][1]:
+          # none of the changed products makes this list
+          continue
+        merged = list(current)
+        merged += [
+          (products[changed_active[j]].id, float(scores[offset, j]))
+          for j in range(len(changed_active)) if np.isfinite(scores[offset, j])
+        ]
+        merged.sort(key=lambda pair: pair[1], reverse=True)
+        if merged[:k] != current:
+          new_lists[product_id] = merged[:k]
+
+  if new_lists:
+    db.query(ProductRelated).filter(ProductRelated.product_id.in_(list(new_lists))).delete(synchronize_session=False)
+    db.execute(insert(ProductRelated), [
+      {"product_id": product_id, "rank": rank, "related_id": related_id, "score": score, "computed_at": watermark}
+      for product_id, neighbours in new_lists.items()
+      for rank, (related_id, score) in enumerate(neighbours)
+    ])
+  # changed products are always rewritten, which moves the max(computed_at) watermark
+  db.commit()
+  return len(new_lists)
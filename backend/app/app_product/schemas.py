@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List
+from typing import List, Dict
 from uuid import UUID
 from typing import Optional
 
@@ -10,6 +10,12 @@ class ProductImageBase(BaseModel):
   path : str
   alt : str
   url : str
+  thumbnail : str | None = None
+  srcset : str | None = None
+  jpeg_srcset : str | None = None
+  width : int | None = None
+  height : int | None = None
+  placeholder : str | None = None
   class Config:
         orm_mode = True
         from_attributes = True
@@ -36,6 +42,7 @@ class ProductBase(BaseModel):
 class ProductResponse(ProductBase):
   review_count: int | None =  None
   avg_rating: float | None =  None
+  rating_histogram: Dict[int, int] | None = None
   related_products: Optional[List["ProductListResponse"]] = None  # <- add this
   class Config:
     orm_mode = True
@@ -51,8 +58,11 @@ class ProductListResponse(BaseModel):
   actual_price: float
   price: float
   image: str
+  image_srcset: str | None = None
+  placeholder: str | None = None
   stock : int
   collection: str | None
+  collection_slug: str | None = None
   id : UUID
   class Config:
     orm_mode = True
@@ -67,6 +77,43 @@ class ProductAdminListResponse(ProductBase):
   stock : int 
   collection: str | None
   total_sold: int | None =None
+  reserved_stock: int = 0
+  on_hand_stock: int | None = None
   class Config:
     orm_mode = True
-    from_attributes=True
\ No newline at end of file
+    from_attributes=True
+
+class ProductSuggestion(BaseModel):
+  id: UUID
+  title: str
+  code: str | None
+  score: float
+
+class ProductSuggestResponse(BaseModel):
+  query: str
+  suggestions: List[ProductSuggestion]
+  did_you_mean: str | None = None
+
+class FacetValue(BaseModel):
+  value: str | None
+  count: int
+
+class PriceBucketFacet(BaseModel):
+  min: float | None
+  max: float | None
+  count: int
+
+class ProductFacetsResponse(BaseModel):
+  total: int
+  categories: List[FacetValue]
+  collections: List[FacetValue]
+  featured: int
+  price_buckets: List[PriceBucketFacet]
+
+class CategoryResponse(BaseModel):
+  name: str | None
+  count: int
+
+class ProductAttributeFacet(BaseModel):
+  key: str
+  values: List[FacetValue]
@@ -0,0 +1,198 @@
+"""
+In-process inverted index over the catalog (SEARCH_BACKEND=memory).
+
+Every worker keeps its own copy: token -> posting array of row ids, with a
+parallel array of weighted term frequencies. Row ids are handed out in
+increasing order so posting arrays stay sorted by construction; updates
+retire the old row and append a new one, and retired rows are compacted
+away once they outnumber the live ones. Writes made by other workers come
+in through the cache invalidation channel (see crud.patch_search_index).
+"""
+import math
+import re
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from operator import itemgetter
+from threading import RLock
+
+from sqlalchemy.orm import Session
+
+from app.app_product.models import Product
+
+TOKEN_RE = re.compile(r"\w+")
+# a title hit counts as three occurrences, a code hit as two
+FIELD_WEIGHTS = (("title", 3), ("code", 2), ("description", 1))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+  return TOKEN_RE.findall((text or "").lower())
+
+
+class ProductSearchIndex:
+  def __init__(self):
+    self._lock = RLock()
+    self.ready = False
+    self._reset()
+
+  def _reset(self):
+    self._postings = {}          # token -> array('I') of row ids, ascending
+    self._freqs = {}             # token -> array('H') of weighted tf, aligned with _postings
+    self._products = []          # row id -> product id, None once retired
+    self._rows = {}              # product id -> live row id
+    self._inactive = set()       # product ids hidden from the storefront
+    self._lengths = array("I")   # row id -> weighted document length
+    self._total_length = 0
+    self._vocabulary = []        # sorted tokens, rebuilt lazily for prefix lookups
+    self._vocabulary_dirty = False
+
+  def __len__(self):
+    return len(self._rows)
+
+  def build(self, db: Session):
+    """Load the whole catalog; called once per worker at startup."""
+    rows = (
+      db.query(Product.id, Product.title, Product.code, Product.description, Product.active)
+      .execution_options(yield_per=2000)
+    )
+    with self._lock:
+      self._reset()
+      for row in rows:
+        self._add(row.id, row.title, row.code, row.description, row.active)
+      self.ready = True
+
+  def upsert(self, product_id, title, code, description, active=True):
+    with self._lock:
+      self._retire(product_id)
+      self._add(product_id, title, code, description, active)
+      self._maybe_compact()
+
+  def remove(self, product_id):
+    with self._lock:
+      self._retire(product_id)
+      self._maybe_compact()
+
+  def refresh(self, db: Session, product_ids):
+    """Re-read these products; the ones no longer in the table are dropped."""
+    product_ids = set(product_ids)
+    rows = (
+      db.query(Product.id, Product.title, Product.code, Product.description, Product.active)
+      .filter(Product.id.in_(product_ids))
+      .all()
+    )
+    with self._lock:
+      for row in rows:
+        self._retire(row.id)
+        self._add(row.id, row.title, row.code, row.description, row.active)
+      for product_id in product_ids - {row.id for row in rows}:
+        self._retire(product_id)
+      self._maybe_compact()
+
+  def search(self, text: str, limit: int | None = None, active_only: bool = False) -> list:
+    """
+    Product ids matching every term of `text` (each term as a prefix, like
+    the postgres path), best BM25 score first. All of them unless a limit
+    is given: callers page through the list themselves and count it.
+    """
+    terms = tokenize(text)
+    if not terms:
+      return []
+    with self._lock:
+      live = len(self._rows) or 1
+      avg_length = (self._total_length / live) or 1
+      scores = None
+      for term in terms:
+        term_scores = {}
+        for token in self._expand(term):
+          rows = self._postings[token]
+          idf = math.log(1 + (live - len(rows) + 0.5) / (len(rows) + 0.5))
+          for row, tf in zip(rows, self._freqs[token]):
+            if self._products[row] is None or (scores is not None and row not in scores):
+              continue
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[row] / avg_length)
+            term_scores[row] = term_scores.get(row, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        if scores is None:
+          scores = term_scores
+        else:
+          scores = {row: scores[row] + score for row, score in term_scores.items()}
+        if not scores:
+          return []
+      if active_only and self._inactive:
+        scores = {row: score for row, score in scores.items() if self._products[row] not in self._inactive}
+      if limit is None:
+        ranked = sorted(scores.items(), key=itemgetter(1), reverse=True)
+      else:
+        ranked = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+      return [self._products[row] for row, _ in ranked]
+
+  def _expand(self, term):
+    if self._vocabulary_dirty:
+      self._vocabulary = sorted(self._postings)
+      self._vocabulary_dirty = False
+    i = bisect_left(self._vocabulary, term)
+    while i < len(self._vocabulary) and self._vocabulary[i].startswith(term):
+      yield self._vocabulary[i]
+      i += 1
+
+  def _add(self, product_id, title, code, description, active=True):
+    fields = {"title": title, "code": code, "description": description}
+    counts = Counter()
+    for field, weight in FIELD_WEIGHTS:
+      for token in tokenize(fields[field]):
+        counts[token] += weight
+    row = len(self._products)
+    if not active:
+      self._inactive.add(product_id)
+    self._products.append(product_id)
+    self._rows[product_id] = row
+    for token, tf in counts.items():
+      if token not in self._postings:
+        self._postings[token] = array("I")
+        self._freqs[token] = array("H")
+        self._vocabulary_dirty = True
+      self._postings[token].append(row)
+      self._freqs[token].append(min(tf, 0xFFFF))
+    length = sum(counts.values())
+    self._lengths.append(length)
+    self._total_length += length
+
+  def _retire(self, product_id):
+    self._inactive.discard(product_id)
+    row = self._rows.pop(product_id, None)
+    if row is None:
+      return
+    self._products[row] = None
+    self._total_length -= self._lengths[row]
+
+  def _maybe_compact(self):
+    retired = len(self._products) - len(self._rows)
+    if retired < 1000 or retired < len(self._rows):
+      return
+    remap = {}
+    products = []
+    lengths = array("I")
+    for row, product_id in enumerate(self._products):
+      if product_id is not None:
+        remap[row] = len(products)
+        products.append(product_id)
+        lengths.append(self._lengths[row])
+    for token in list(self._postings):
+      postings, freqs = array("I"), array("H")
+      for row, tf in zip(self._postings[token], self._freqs[token]):
+        if row in remap:
+          postings.append(remap[row])
+          freqs.append(tf)
+      if postings:
+        self._postings[token], self._freqs[token] = postings, freqs
+      else:
+        del self._postings[token], self._freqs[token]
+        self._vocabulary_dirty = True
+    self._products = products
+    self._lengths = lengths
+    self._rows = {product_id: row for row, product_id in enumerate(products)}
+
+
+product_search_index = ProductSearchIndex()
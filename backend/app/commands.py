@@ -0,0 +1,130 @@
+"""
+Maintenance commands, run from the backend folder:
+
+    python -m app.commands rebuild-sales-stats
+    python -m app.commands rebuild-related [--full]
+    python -m app.commands build-image-variants
+    python -m app.commands check-query-plans
+    python -m app.commands release-expired-reservations
+    python -m app.commands process-webhooks [--requeue-dead]
+    python -m app.commands send-emails
+"""
+import argparse
+import sys
+
+from app.core.database import SessionLocal, engine
+# every model has to be imported for the relationships to resolve
+from app.app_cart.models import *
+from app.app_product.models import *
+from app.app_users.models import *
+from app.app_order.models import *
+import app.app_product.crud as crud_product
+import app.app_order.crud as crud_order
+import app.app_order.webhooks as webhooks
+from app.core.config import settings
+from app.lib.email_outbox import send_outbox, connect as connect_email_outbox
+from app.common.query_plans import hot_read_statements, sequential_scans
+from app.app_product.related import refresh_related_products
+from app.lib.images import get_pool as get_image_pool
+
+
+def rebuild_sales_stats(args):
+  with SessionLocal() as db:
+    crud_product.rebuild_product_sales_stats(db)
+  print("product_sales_stats rebuilt")
+
+
+def rebuild_related(args):
+  with SessionLocal() as db:
+    rewritten = refresh_related_products(db, full=args.full)
+  if rewritten is None:
+    print("another refresh is running, skipped")
+  else:
+    print(f"related products rewritten for {rewritten} products")
+
+
+def build_image_variants(args):
+  with SessionLocal() as db:
+    image_ids = [row.id for row in db.query(ProductImage.id).filter(ProductImage.variants.is_(None))]
+  crud_product.generate_image_variants(image_ids)
+  # wait for the pool; results are stored from its callbacks
+  get_image_pool().shutdown(wait=True)
+  print(f"variants generated for {len(image_ids)} images")
+
+
+def check_query_plans(args):
+  with SessionLocal() as db:
+    statements = hot_read_statements(db, engine)
+    problems = sequential_scans(db, statements)
+    db.rollback()
+  for statement, table, rows in problems:
+    print(f"Seq Scan on {table} (~{rows} rows):\n{statement}\n")
+  print(f"{len(statements)} statements explained, {len(problems)} sequential scans on large tables")
+  if problems:
+    sys.exit(1)
+
+
+def release_expired_reservations(args):
+  released = 0
+  with SessionLocal() as db:
+    while batch := crud_order.release_expired_reservations(db):
+      released += batch
+  print(f"stock released for {released} expired orders")
+
+
+def process_webhooks(args):
+  with SessionLocal() as db:
+    if args.requeue_dead:
+      print(f"{webhooks.requeue_dead_events(db)} dead events queued again")
+    handled = 0
+    while batch := webhooks.process_webhook_events(db):
+      handled += batch
+    pruned = 0
+    while batch := webhooks.prune_processed_events(db):
+      pruned += batch
+  print(f"{handled} webhook events handled, {pruned} old processed events deleted")
+
+
+def send_emails(args):
+  # the send rate is shared with the running app
+  connect_email_outbox(settings.REDIS_URL if settings.PRODUCTION == 'true' else "redis://localhost:6379/0")
+  sent = 0
+  with SessionLocal() as db:
+    while batch := send_outbox(db):
+      sent += batch
+  print(f"{sent} outbox emails attempted")
+
+
+def main():
+  parser = argparse.ArgumentParser(prog="python -m app.commands")
+  commands = parser.add_subparsers(dest="command", required=True)
+
+  command = commands.add_parser("rebuild-sales-stats", help="recompute product_sales_stats from paid orders")
+  command.set_defaults(func=rebuild_sales_stats)
+
+  command = commands.add_parser("rebuild-related", help="recompute product_related neighbours")
+  command.add_argument("--full", action="store_true", help="recompute every product, not only changed ones")
+  command.set_defaults(func=rebuild_related)
+
+  command = commands.add_parser("build-image-variants", help="generate resized variants for images that have none")
+  command.set_defaults(func=build_image_variants)
+
+  command = commands.add_parser("check-query-plans", help="fail if a hot read path plans a seq scan on a large table")
+  command.set_defaults(func=check_query_plans)
+
+  command = commands.add_parser("release-expired-reservations", help="give back stock held by unpaid orders past their hold")
+  command.set_defaults(func=release_expired_reservations)
+
+  command = commands.add_parser("process-webhooks", help="apply queued Razorpay webhook events")
+  command.add_argument("--requeue-dead", action="store_true", help="retry dead events first")
+  command.set_defaults(func=process_webhooks)
+
+  command = commands.add_parser("send-emails", help="send everything due in the email outbox")
+  command.set_defaults(func=send_emails)
+
+  args = parser.parse_args()
+  args.func(args)
+
+
+if __name__ == "__main__":
+  main()
@@ -1,6 +1,150 @@
-
+import base64
+import json
+import uuid
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from threading import Lock
+from cachetools import TTLCache
+from fastapi import HTTPException
+from sqlalchemy import text, tuple_, literal
+from sqlalchemy.orm import Session
 from app.common.schemas import PaginationResponse
-def to_paginate(query,schema,page=1,size=10):
+
+# counts for filtered listings, reused across pages for a minute
+_count_cache = TTLCache(maxsize=1024, ttl=60)
+_count_lock = Lock()
+
+
+def encode_cursor(payload: dict) -> str:
+  raw = json.dumps(payload, default=str, separators=(",", ":")).encode()
+  return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+  try:
+    payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+  except ValueError:
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+  if not isinstance(payload, dict):
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+  return payload
+
+def cursor_offset(cursor) -> int:
+  """The row offset an offset cursor points at; 0 for the first page."""
+  offset = decode_cursor(cursor).get("o", 0) if cursor else 0
+  if not isinstance(offset, int) or offset < 0:
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+  return offset
+
+def offset_cursor(offset: int) -> str:
+  return encode_cursor({"o": offset})
+
+def _coerce(value, column):
+  python_type = column.type.python_type
+  if value is None or isinstance(value, python_type):
+    return value
+  if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+    # a hand-made cursor can carry any JSON; only scalars name a row
+    raise TypeError(f"cursor value {value!r} is not a scalar")
+  if python_type is datetime:
+    return datetime.fromisoformat(value)
+  if python_type is Decimal:
+    try:
+      return Decimal(str(value))
+    except InvalidOperation:
+      raise ValueError(f"cursor value {value!r} is not a number")
+  if python_type is uuid.UUID:
+    return uuid.UUID(value)
+  return python_type(value)
+
+
+def paginate_cursor(query, cursor, size, sort_column=None, id_column=None, descending=True, nulls_last=False):
+  """
+  One page in cursor mode, returns (items, next_cursor).
+
+  With a sort column this is keyset pagination on (sort_column, id_column),
+  so deep pages cost the same as the first and rows inserted meanwhile never
+  shift the window. Without one (e.g. relevance ranked search, which is
+  already ordered) the opaque cursor just carries the next offset.
+  An empty cursor means the first page.
+
+  nulls_last is for a sort column that can be NULL: those rows come after
+  all others, in id order, whichever the direction. A (sort, id) bound is
+  never true for them, so they are read separately once the values run out.
+  """
+  payload = decode_cursor(cursor) if cursor else {}
+  if sort_column is None:
+    offset = cursor_offset(cursor)
+    items = query.offset(offset).limit(size + 1).all()
+    next_payload = {"o": offset + size}
+  else:
+    after = (lambda a, b: a < b) if descending else (lambda a, b: a > b)
+    sort_order = sort_column.desc() if descending else sort_column.asc()
+    if nulls_last:
+      sort_order = sort_order.nulls_last()
+    query = query.order_by(sort_order, id_column.desc() if descending else id_column.asc())
+    if "k" in payload:
+      try:
+        last_sort, last_id = (_coerce(v, c) for v, c in zip(payload["k"], (sort_column, id_column)))
+      except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+      if last_sort is None:
+        items = query.filter(sort_column.is_(None), after(id_column, literal(last_id, id_column.type))).limit(size + 1).all()
+      else:
+        key = tuple_(sort_column, id_column)
+        bound = tuple_(literal(last_sort, sort_column.type), literal(last_id, id_column.type))
+        items = query.filter(after(key, bound)).limit(size + 1).all()
+        if nulls_last and len(items) <= size:
+          items += query.filter(sort_column.is_(None)).limit(size + 1 - len(items)).all()
+    else:
+      items = query.limit(size + 1).all()
+    next_payload = None
+    if len(items) > size:
+      last = items[size - 1]
+      next_payload = {"k": [getattr(last, sort_column.key), getattr(last, id_column.key)]}
+  if len(items) <= size:
+    return items, None
+  return items[:size], encode_cursor(next_payload)
+
+
+def count_rows(db: Session, query, exact: bool = True):
+  """
+  Total for a listing. Cursor mode passes exact=False: an unfiltered listing
+  reads the planner estimate from pg_class.reltuples, a filtered one reuses
+  a recently cached count.
+  """
+  if exact:
+    return query.count()
+  if query.whereclause is None:
+    table = query.column_descriptions[0]["entity"].__table__.name
+    estimate = db.execute(
+      text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+      {"table": table},
+    ).scalar()
+    if estimate is not None and estimate >= 0:
+      return estimate
+  compiled = query.statement.compile(dialect=db.get_bind().dialect)
+  key = (str(compiled), repr(sorted(compiled.params.items())))
+  with _count_lock:
+    total = _count_cache.get(key)
+  if total is None:
+    total = query.order_by(None).count()
+    with _count_lock:
+      _count_cache[key] = total
+  return total
+
+
+def to_paginate(query,schema,page=1,size=10,db=None,cursor=None,sort_column=None,id_column=None,descending=True):
+  if cursor is not None:
+    items, next_cursor = paginate_cursor(query, cursor, size, sort_column, id_column, descending)
+    return PaginationResponse[schema](
+        items=items,
+        page=page,
+        size=size,
+        has_next=next_cursor is not None,
+        has_prev=bool(cursor),
+        total=count_rows(db, query, exact=False) if db is not None else None,
+        next_cursor=next_cursor,
+    )
   total = query.count()
   skip = (page - 1) * size
   items = query.offset(skip).limit(size).all()
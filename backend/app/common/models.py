@@ -0,0 +1,40 @@
+from datetime import datetime
+from enum import Enum
+from sqlalchemy import Column, String, Integer, DateTime, JSON, Index
+from app.core.database import Base
+from app.common.mixin import CreatedUpdatedAtMixin,IDMixin
+
+
+class EmailStatus(str, Enum):
+  PENDING = "pending"
+  SENT = "sent"
+  DEAD = "dead"
+
+
+class EmailOutbox(Base, IDMixin, CreatedUpdatedAtMixin):
+  """
+  An email waiting to go out through Resend. Rows are added in the same
+  transaction as the change they announce (app/lib/resend.py queue_email)
+  and sent by app/lib/email_outbox.py, so a rollback sends nothing and a
+  restart loses nothing.
+  """
+  __tablename__ = "email_outbox"
+  # the Resend email payload: from, to, subject, html, text
+  message = Column(JSON, nullable=False)
+  status = Column(String(20), nullable=False, default=EmailStatus.PENDING.value)
+  attempts = Column(Integer, nullable=False, default=0)
+  # also the lease: a worker sending a row pushes it out so nobody else picks it up
+  available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+  last_error = Column(String, nullable=True)
+  provider_id = Column(String(128), nullable=True)
+  sent_at = Column(DateTime, nullable=True)
+  # Idempotency-Key of the request that carries this row, fixed the first time
+  # it is claimed; rows sharing a key are only ever sent together
+  send_key = Column(String(64), nullable=True)
+
+
+Index(
+  "ix_email_outbox_pending",
+  EmailOutbox.available_at,
+  postgresql_where=EmailOutbox.status == EmailStatus.PENDING.value,
+)
@@ -0,0 +1,106 @@
+"""
+EXPLAIN based check of the hot read paths.
+
+capture_statements() records the SELECTs a block of crud calls sends to
+Postgres; sequential_scans() explains each one and reports sequential scans
+on tables big enough for that to matter, indexes_used() names the indexes
+the plans read. hot_read_statements() captures the crud calls behind the
+storefront, "my orders" and the admin lists. Run it against a staging copy
+of production data with `python -m app.commands check-query-plans`; the
+tests in tests/test_query_plans.py run it on a seeded database.
+"""
+import json
+from contextlib import contextmanager
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+# below this many rows a sequential scan is the right plan
+LARGE_TABLE_ROWS = 10000
+
+
+@contextmanager
+def capture_statements(engine, statements: list):
+  def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    head = statement.lstrip().upper()
+    # listing totals are estimated / cached on purpose (common/crud.py count_rows)
+    if head.startswith("SELECT") and not head.startswith("SELECT COUNT(*)") and not executemany:
+      statements.append((statement, parameters))
+
+  event.listen(engine, "before_cursor_execute", before_cursor_execute)
+  try:
+    yield statements
+  finally:
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _plan_nodes(node):
+  yield node
+  for child in node.get("Plans", []):
+    yield from _plan_nodes(child)
+
+
+def _explain(db: Session, statements):
+  """(statement, plan nodes) for each captured statement."""
+  cursor = db.connection().connection.cursor()
+  for statement, parameters in statements:
+    cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+      plan = json.loads(plan)
+    yield statement, list(_plan_nodes(plan[0]["Plan"]))
+
+
+def sequential_scans(db: Session, statements) -> list:
+  """(statement, table, estimated rows) for every seq scan on a large table."""
+  sizes = dict(db.execute(text(
+    "SELECT relname, reltuples::bigint FROM pg_class WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace"
+  )).all())
+  problems = []
+  for statement, nodes in _explain(db, statements):
+    for node in nodes:
+      table = node.get("Relation Name")
+      if node["Node Type"] == "Seq Scan" and sizes.get(table, 0) >= LARGE_TABLE_ROWS:
+        problems.append((statement, table, sizes[table]))
+  return problems
+
+
+def indexes_used(db: Session, statements) -> set:
+  """Names of the indexes any of the statements' plans read."""
+  return {node["Index Name"] for _, nodes in _explain(db, statements) for node in nodes if "Index Name" in node}
+
+
+def hot_read_statements(db: Session, engine) -> list:
+  """The statements of the read paths behind the storefront, "my orders" and the admin lists."""
+  from app.app_order.models import Order
+  from app.app_product.models import Product
+
+  product = db.query(Product).filter(Product.active == True).first()
+  order = db.query(Order).filter(Order.user_id.isnot(None)).first()
+  statements = []
+  with capture_statements(engine, statements):
+    _read_hot_paths(db, product, order)
+  return statements
+
+
+def _read_hot_paths(db: Session, product, order):
+  # imported here, the crud modules import app.common
+  import app.app_cart.crud as crud_cart
+  import app.app_order.crud as crud_order
+  import app.app_product.crud as crud_product
+
+  for filter in ("", "lowest_first", "highest_first", "featured"):
+    crud_product.get_list_of_product(db, 1, 20, filter, None, None, cursor="")
+  crud_product.get_list_of_product(db, 1, 20, "", "ring", None, cursor="")
+  crud_product.get_list_of_product(db, 1, 20, "lowest_first", None, None, is_admin=True, cursor="")
+  if product:
+    crud_product.get_list_of_product(db, 1, 20, "", None, product.category, cursor="")
+    if product.collection_slug:
+      crud_product.get_list_of_product(db, 1, 20, product.collection_slug, None, None, cursor="")
+    crud_product.get_product_by_id(db, product.id, is_admin=False)
+    crud_product.get_related_products(db, product.id)
+  crud_order.get_list_of_orders(db, None, 1, 20, "desc", None, cursor="")
+  crud_cart.get_list_of_coupons(db, 1, 20, None, cursor="")
+  if order:
+    crud_order.get_list_of_orders(db, order.user_id, 1, 20, "desc", None, cursor="")
+    crud_cart.get_cart_by_user_id(db, order.user_id)
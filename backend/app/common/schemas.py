@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Generic, TypeVar, List
+from typing import Generic, TypeVar, List, Optional
 
 T = TypeVar("T")
 
@@ -9,4 +9,6 @@ class PaginationResponse(BaseModel, Generic[T]):
     size: int
     has_next: bool
     has_prev: bool
-    total: int
\ No newline at end of file
+    # exact in offset mode; cached or estimated in cursor mode
+    total: Optional[int] = None
+    next_cursor: Optional[str] = None
\ No newline at end of file
@@ -19,9 +19,25 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD :str
     BASE_URL:str = "http:localhost:8000"
     MEDIA_FOLDER:str = "media"
+    MAX_UPLOAD_FILE_BYTES:int = 10 * 1024 * 1024
+    MAX_UPLOAD_TOTAL_BYTES:int = 100 * 1024 * 1024
+    STOCK_HOLD_MINUTES:int = 30  # unpaid checkouts give their stock back after this
+    RESERVATION_SWEEP_SECONDS:int = 60
+    ORDER_NUMBER_BLOCK_SIZE:int = 1  # >1: numbers each worker takes per sequence round trip
     RAZORPAY_KEY_ID:str
     RAZORPAY_SECRET:str
     RAZORPAY_SECRET_PASSWORD:str
+    RAZORPAY_API_URL:str = "https://api.razorpay.com/v1"
+    PAYMENT_GATEWAY_TIMEOUT_SECONDS:float = 10
+    PAYMENT_GATEWAY_RETRIES:int = 2
+    WEBHOOK_MAX_ATTEMPTS:int = 8  # then the event is parked as dead
+    WEBHOOK_POLL_SECONDS:int = 5
+    WEBHOOK_RETENTION_DAYS:int = 30  # processed events are deleted after this; Razorpay redelivers for a day at most
+    RESEND_API_URL:str = "https://api.resend.com"
+    EMAIL_SEND_RATE_PER_SECOND:float = 2  # Resend's default per-team limit, shared by all workers through Redis
+    EMAIL_MAX_ATTEMPTS:int = 8
+    EMAIL_POLL_SECONDS:int = 5
+    SEARCH_BACKEND:str = "postgres"  # "postgres" or "memory" (per-worker inverted index)
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,253 @@
+"""
+Two tier read cache for catalog responses.
+
+L1 is a size bounded TTL cache inside each worker, L2 is the Redis instance
+main.py already connects for FastAPILimiter. Entries carry tags such as
+"product:<id>", "category:<name>", "collection:<name>" or "product:list".
+Invalidating a tag deletes the tagged L2 keys and publishes the tags so
+every worker drops its L1 copies too. Without Redis (local dev) the cache
+degrades to L1 only.
+
+Other per-worker state derived from the catalog (the in-memory search
+index) follows the same messages through subscribe().
+
+A value computed from a read that started before an invalidation of one of
+its tags is not stored: every invalidation takes the next number of a
+counter and records it against its tags, a miss remembers the counter,
+and set() refuses when one of the value's tags was invalidated since.
+In Redis both halves run as scripts, so nothing gets in between.
+"""
+import json
+import threading
+import traceback
+import uuid
+from collections import Counter
+
+import redis
+from cachetools import TTLCache
+
+L1_SIZE = 2048
+L1_TTL = 30
+L2_TTL = 300
+INVALIDATE_CHANNEL = "cache:invalidate"
+MISSING = object()
+
+# KEYS: counter, tag -> number of its last invalidation; ARGV: key prefix, tags
+_INVALIDATE = """
+local number = redis.call('INCR', KEYS[1])
+for i = 2, #ARGV do
+  local tag_key = ARGV[1] .. 'tag:' .. ARGV[i]
+  for _, key in ipairs(redis.call('SMEMBERS', tag_key)) do
+    redis.call('DEL', ARGV[1] .. key)
+  end
+  redis.call('DEL', tag_key)
+  redis.call('HSET', KEYS[2], ARGV[i], number)
+end
+return number
+"""
+
+# KEYS: value key, tag -> number of its last invalidation;
+# ARGV: counter at the miss ('' = unchecked), value, ttl, key prefix, key, tags
+_SET = """
+if ARGV[1] ~= '' then
+  for i = 6, #ARGV do
+    local invalidated = redis.call('HGET', KEYS[2], ARGV[i])
+    if invalidated and tonumber(invalidated) > tonumber(ARGV[1]) then
+      return 0
+    end
+  end
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+for i = 6, #ARGV do
+  local tag_key = ARGV[4] .. 'tag:' .. ARGV[i]
+  redis.call('SADD', tag_key, ARGV[5])
+  redis.call('EXPIRE', tag_key, ARGV[3])
+end
+return 1
+"""
+
+
+class _L1Cache(TTLCache):
+  def __init__(self, stats, **kwargs):
+    super().__init__(**kwargs)
+    self._stats = stats
+
+  def popitem(self):
+    # only called when the cache is full
+    item = super().popitem()
+    self._stats["evictions"] += 1
+    return item
+
+
+class TaggedCache:
+  def __init__(self, namespace: str):
+    self.namespace = namespace
+    self.stats = Counter()
+    self._lock = threading.RLock()
+    self._l1 = _L1Cache(self.stats, maxsize=L1_SIZE, ttl=L1_TTL)
+    self._redis = None
+    # tells this worker's own messages apart on the channel
+    self._origin = uuid.uuid4().hex
+    self._subscribers = []
+    # the same bookkeeping for L1: a local counter and tag -> its value when last dropped
+    self._dropped = 0
+    self._dropped_at = {}
+    # key -> (local counter, Redis counter or None) at this thread's misses
+    self._misses = threading.local()
+    self._invalidate_script = None
+    self._set_script = None
+
+  def connect(self, url: str):
+    """Attach Redis (L2) and start listening for invalidations; call once per worker."""
+    try:
+      client = redis.from_url(url, decode_responses=True, socket_timeout=0.5)
+      pubsub = client.pubsub(ignore_subscribe_messages=True)
+      pubsub.subscribe(**{INVALIDATE_CHANNEL: self._on_invalidate})
+      pubsub.run_in_thread(sleep_time=1, daemon=True)
+      self._invalidate_script = client.register_script(_INVALIDATE)
+      self._set_script = client.register_script(_SET)
+      self._redis = client
+    except redis.RedisError as e:
+      print(f"Cache running without redis: {e}")
+
+  def subscribe(self, callback):
+    """
+    callback(tags) for every invalidation published by another worker. It
+    runs on the listener thread; the worker that invalidated is expected
+    to have updated its own state already.
+    """
+    self._subscribers.append(callback)
+
+  def get(self, key: str):
+    """Cached value for key, or MISSING."""
+    with self._lock:
+      entry = self._l1.get(key, MISSING)
+      dropped = self._dropped
+    if entry is not MISSING:
+      self.stats["l1_hits"] += 1
+      return entry[0]
+    raw, invalidated = None, None
+    if self._redis is not None:
+      try:
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.get(self._key(key))
+        pipe.get(self._counter_key)
+        raw, invalidated = pipe.execute()
+        invalidated = int(invalidated or 0)
+      except redis.RedisError:
+        pass
+      if raw is not None:
+        entry = json.loads(raw)
+        with self._lock:
+          self._l1[key] = (entry["value"], frozenset(entry["tags"]))
+        self.stats["l2_hits"] += 1
+        return entry["value"]
+    self.stats["misses"] += 1
+    pending = self._pending()
+    if len(pending) >= 64:
+      # misses that were never followed by a set (a 404, say)
+      pending.clear()
+    pending[key] = (dropped, invalidated)
+    return MISSING
+
+  def set(self, key: str, value, tags=()):
+    """
+    Store a JSON serialisable value under key. After a get() miss on this
+    thread, only if none of tags was invalidated since that miss.
+    """
+    tags = frozenset(tags)
+    dropped, invalidated = self._pending().pop(key, (None, None))
+    if self._redis is not None:
+      try:
+        stored = self._set_script(
+          keys=[self._key(key), self._invalidated_key],
+          args=["" if invalidated is None else invalidated, json.dumps({"value": value, "tags": sorted(tags)}),
+                L2_TTL, self._key(""), key, *sorted(tags)],
+        )
+      except redis.RedisError:
+        stored = True
+      if not stored:
+        self.stats["stale_sets"] += 1
+        return
+    with self._lock:
+      if dropped is not None and any(self._dropped_at.get(tag, 0) > dropped for tag in tags):
+        self.stats["stale_sets"] += 1
+        return
+      self._l1[key] = (value, tags)
+
+  def invalidate(self, tags):
+    """Drop every entry carrying one of tags, here and in all other workers."""
+    tags = sorted(set(tags))
+    if not tags:
+      return
+    self.stats["invalidations"] += 1
+    self._drop_local(tags)
+    if self._redis is None:
+      return
+    try:
+      pipe = self._redis.pipeline(transaction=False)
+      self._invalidate_script(keys=[self._counter_key, self._invalidated_key], args=[self._key(""), *tags], client=pipe)
+      pipe.publish(INVALIDATE_CHANNEL, json.dumps({"namespace": self.namespace, "tags": tags, "origin": self._origin}))
+      pipe.execute()
+    except redis.RedisError:
+      pass
+
+  def snapshot(self) -> dict:
+    with self._lock:
+      size = len(self._l1)
+    return {
+      "l1_hits": self.stats["l1_hits"],
+      "l2_hits": self.stats["l2_hits"],
+      "misses": self.stats["misses"],
+      "evictions": self.stats["evictions"],
+      "invalidations": self.stats["invalidations"],
+      "stale_sets": self.stats["stale_sets"],
+      "l1_size": size,
+      "l2_connected": self._redis is not None,
+    }
+
+  def _on_invalidate(self, message):
+    payload = json.loads(message["data"])
+    if payload.get("namespace") != self.namespace:
+      return
+    self._drop_local(payload["tags"])
+    if payload.get("origin") == self._origin:
+      return
+    for callback in self._subscribers:
+      try:
+        callback(payload["tags"])
+      except Exception:
+        # keep the listener thread alive for the next message
+        traceback.print_exc()
+
+  def _drop_local(self, tags):
+    tags = set(tags)
+    with self._lock:
+      self._dropped += 1
+      for tag in tags:
+        self._dropped_at[tag] = self._dropped
+      stale = [key for key, (_, entry_tags) in self._l1.items() if entry_tags & tags]
+      for key in stale:
+        self._l1.pop(key, None)
+
+  def _pending(self) -> dict:
+    if not hasattr(self._misses, "keys"):
+      self._misses.keys = {}
+    return self._misses.keys
+
+  @property
+  def _counter_key(self):
+    return f"cache:{self.namespace}:invalidations"
+
+  @property
+  def _invalidated_key(self):
+    return f"cache:{self.namespace}:invalidated"
+
+  def _key(self, key):
+    return f"cache:{self.namespace}:{key}"
+
+  def _tag_key(self, tag):
+    return f"cache:{self.namespace}:tag:{tag}"
+
+
+product_cache = TaggedCache("product")
@@ -0,0 +1,282 @@
+"""
+Email outbox delivery.
+
+send_outbox() claims due rows from email_outbox with FOR UPDATE SKIP LOCKED,
+leases them (available_at pushed LEASE_SECONDS ahead, committed) so the
+HTTP call happens without a transaction open (each send's status updates
+are committed before the next one goes out), and sends them through
+Resend's batch endpoint, up to BATCH_SIZE emails per request, over one
+keep-alive connection and at most EMAIL_SEND_RATE_PER_SECOND requests per
+second. That is Resend's limit for the whole team, so once connect() has
+been given Redis the spacing is shared by every worker and process sending
+mail; without Redis (local dev) it holds per process only. Failures are retried with exponential backoff and go
+dead after EMAIL_MAX_ATTEMPTS; a batch Resend rejects as a whole is split
+into single sends so one bad address doesn't hold back the rest. A worker
+that dies mid-send leaves its rows to be picked up once the lease runs
+out.
+
+The Idempotency-Key is what keeps a retry from sending twice, so it has to
+be the key of the request that may already have gone through. A row's key
+(send_key) is fixed the first time it is claimed: its own id when it goes
+alone, a fresh key shared by the rows of a batch otherwise. A batch is
+only ever retried whole, with its rows and key unchanged; the one time its
+rows move to keys of their own is after Resend rejected the batch, when
+nothing of it was sent.
+
+Point RESEND_API_URL at app/lib/stubs.py (resend_stub) to run without
+sending real mail.
+"""
+import threading
+import time
+import traceback
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+import redis
+from sqlalchemy import String, cast, func, select, update
+from sqlalchemy.orm import Session
+
+from app.common.models import EmailOutbox, EmailStatus
+from app.core.config import settings
+from app.core.database import SessionLocal
+
+BATCH_SIZE = 100  # Resend's limit per batch request
+LEASE_SECONDS = 120
+RETRY_BASE_SECONDS = 10
+RETRY_MAX_SECONDS = 3600
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> httpx.Client:
+  global _client
+  with _client_lock:
+    if _client is None:
+      _client = httpx.Client(
+        base_url=settings.RESEND_API_URL.rstrip("/"),
+        headers={"Authorization": f"Bearer {settings.RESEND_API_KEY}"},
+        timeout=httpx.Timeout(15.0, connect=3.0),
+        limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
+      )
+    return _client
+
+
+# takes the next free send slot; returns how long to wait for it, on Redis' clock
+_TAKE_SLOT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local slot = math.max(now, tonumber(redis.call('GET', KEYS[1]) or '0'))
+local interval = tonumber(ARGV[1])
+redis.call('SET', KEYS[1], tostring(slot + interval), 'PX', math.ceil((slot + interval - now) * 1000) + 1000)
+return tostring(slot - now)
+"""
+
+
+class _RateLimiter:
+  """Spaces calls at least 1 / rate seconds apart, across processes once connected to Redis."""
+
+  def __init__(self, rate: float):
+    self.interval = 1.0 / rate
+    self.next_at = 0.0
+    self.lock = threading.Lock()
+    self._take_slot = None
+
+  def connect(self, url: str):
+    try:
+      client = redis.from_url(url, decode_responses=True, socket_timeout=0.5)
+      client.ping()
+      self._take_slot = client.register_script(_TAKE_SLOT)
+    except redis.RedisError as e:
+      print(f"Email rate limit is per process: {e}")
+
+  def _local_delay(self) -> float:
+    with self.lock:
+      now = time.monotonic()
+      delay = self.next_at - now
+      self.next_at = max(now, self.next_at) + self.interval
+    return delay
+
+  def wait(self):
+    delay = None
+    if self._take_slot is not None:
+      try:
+        delay = float(self._take_slot(keys=["email:send:next_slot"], args=[self.interval]))
+      except redis.RedisError:
+        pass
+    if delay is None:
+      delay = self._local_delay()
+    if delay > 0:
+      time.sleep(delay)
+
+
+_rate_limiter = _RateLimiter(settings.EMAIL_SEND_RATE_PER_SECOND)
+
+
+def connect(url: str):
+  """Share the send rate through Redis; call once per process."""
+  _rate_limiter.connect(url)
+
+
+class _SendError(Exception):
+  def __init__(self, message: str, permanent: bool = False, retry_after: float | None = None):
+    super().__init__(message)
+    self.permanent = permanent
+    self.retry_after = retry_after
+
+
+def _post(path: str, body, idempotency_key: str):
+  _rate_limiter.wait()
+  try:
+    response = get_client().post(path, json=body, headers={"Idempotency-Key": idempotency_key})
+  except httpx.TransportError as e:
+    raise _SendError(f"{type(e).__name__}: {e}")
+  if response.status_code == 429:
+    retry_after = response.headers.get("retry-after", "")
+    raise _SendError("rate limited", retry_after=float(retry_after) if retry_after.replace(".", "", 1).isdigit() else None)
+  if response.status_code >= 500:
+    raise _SendError(f"{response.status_code}: {response.text[:500]}")
+  if response.is_error:
+    raise _SendError(f"{response.status_code}: {response.text[:500]}", permanent=True)
+  return response.json()
+
+
+def _claim(db: Session, batch_size: int) -> list:
+  """Lease due rows; rows keyed into an earlier batch come with the whole batch or not at all."""
+  now = datetime.utcnow()
+  pending = (EmailOutbox.status == EmailStatus.PENDING.value)
+  claimed = db.execute(
+    select(EmailOutbox.id, EmailOutbox.send_key)
+    .where(pending, EmailOutbox.available_at <= now)
+    .order_by(EmailOutbox.available_at, EmailOutbox.send_key)
+    .limit(batch_size)
+    .with_for_update(skip_locked=True)
+  ).all()
+  keys = {row.send_key for row in claimed if row.send_key}
+  if keys:
+    claimed += db.execute(
+      select(EmailOutbox.id, EmailOutbox.send_key)
+      .where(pending, EmailOutbox.send_key.in_(keys), EmailOutbox.id.not_in([row.id for row in claimed]))
+      .with_for_update(skip_locked=True)
+    ).all()
+    held = defaultdict(int)
+    for row in claimed:
+      held[row.send_key] += 1
+    total = dict(db.execute(
+      select(EmailOutbox.send_key, func.count())
+      .where(pending, EmailOutbox.send_key.in_(keys))
+      .group_by(EmailOutbox.send_key)
+    ).all())
+    # another worker holds part of a batch; it goes out on a later pass
+    claimed = [row for row in claimed if not row.send_key or held[row.send_key] == total[row.send_key]]
+  if not claimed:
+    db.rollback()
+    return []
+  fresh = [row.id for row in claimed if not row.send_key]
+  fresh_key = str(fresh[0]) if len(fresh) == 1 else uuid.uuid4().hex
+  rows = db.execute(
+    update(EmailOutbox)
+    .where(EmailOutbox.id.in_([row.id for row in claimed]))
+    .values(
+      available_at=now + timedelta(seconds=LEASE_SECONDS),
+      attempts=EmailOutbox.attempts + 1,
+      send_key=func.coalesce(EmailOutbox.send_key, fresh_key),
+    )
+    .returning(EmailOutbox.id, EmailOutbox.message, EmailOutbox.attempts, EmailOutbox.send_key)
+    .execution_options(synchronize_session=False)
+  ).all()
+  db.commit()
+  return rows
+
+
+def _mark_sent(db: Session, row_id, provider_id):
+  db.execute(
+    update(EmailOutbox)
+    .where(EmailOutbox.id == row_id)
+    .values(status=EmailStatus.SENT.value, sent_at=datetime.utcnow(), provider_id=provider_id, last_error=None)
+    .execution_options(synchronize_session=False)
+  )
+
+
+def _mark_failed(db: Session, row_id, attempts: int, error: _SendError):
+  if error.permanent or attempts >= settings.EMAIL_MAX_ATTEMPTS:
+    values = {"status": EmailStatus.DEAD.value}
+  else:
+    delay = error.retry_after or min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    values = {"available_at": datetime.utcnow() + timedelta(seconds=delay)}
+  db.execute(
+    update(EmailOutbox)
+    .where(EmailOutbox.id == row_id)
+    .values(last_error=str(error)[:2000], **values)
+    .execution_options(synchronize_session=False)
+  )
+
+
+def _send_single(db: Session, row, key: str):
+  try:
+    sent = _post("/emails", row.message, key)
+  except _SendError as e:
+    _mark_failed(db, row.id, row.attempts, e)
+  else:
+    _mark_sent(db, row.id, sent.get("id"))
+  # the row stays locked until this; never across the next send
+  db.commit()
+
+
+def _send_batch(db: Session, rows: list, key: str):
+  try:
+    sent = _post("/emails/batch", [row.message for row in rows], key)
+    results = sent.get("data") or []
+    if len(results) != len(rows):
+      # can't tell which went out; retry under the same key rather than guess
+      raise _SendError(f"batch of {len(rows)} answered with {len(results)} ids")
+  except _SendError as e:
+    if e.permanent:
+      # one invalid message fails the whole batch, so none of it was sent;
+      # find the bad one with single sends, each under a key of its own
+      db.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_([row.id for row in rows]))
+        .values(send_key=cast(EmailOutbox.id, String))
+        .execution_options(synchronize_session=False)
+      )
+      db.commit()
+      for row in rows:
+        _send_single(db, row, str(row.id))
+    else:
+      for row in rows:
+        _mark_failed(db, row.id, row.attempts, e)
+      db.commit()
+  else:
+    # ids come back in request order
+    for row, result in zip(rows, results):
+      _mark_sent(db, row.id, result.get("id"))
+    db.commit()
+
+
+def send_outbox(db: Session, batch_size: int = BATCH_SIZE) -> int:
+  """Send one batch of due emails; returns how many rows were attempted."""
+  rows = _claim(db, batch_size)
+  if not rows:
+    return 0
+  batches = defaultdict(list)
+  for row in rows:
+    batches[row.send_key].append(row)
+  for key, batch in batches.items():
+    if key == str(batch[0].id):
+      _send_single(db, batch[0], key)
+    else:
+      _send_batch(db, batch, key)
+  return len(rows)
+
+
+def drain_outbox():
+  """Every due email, batch after batch, with its own session."""
+  with SessionLocal() as db:
+    try:
+      while send_outbox(db):
+        pass
+    except Exception:
+      traceback.print_exc()
@@ -0,0 +1,81 @@
+"""
+Resized image variants, produced in a process pool off the request path.
+
+Every upload gets WebP and JPEG copies at VARIANT_WIDTHS (never upscaled),
+with EXIF and other metadata dropped, plus a tiny blurred WebP data URI used
+as a placeholder while the real image loads.
+"""
+import base64
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+from PIL import Image, ImageFilter, ImageOps
+
+VARIANT_WIDTHS = (200, 400, 800, 1600)
+VARIANT_FORMATS = {"webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg")}
+QUALITY = 80
+PLACEHOLDER_WIDTH = 16
+POOL_WORKERS = 2
+
+_pool = None
+_pool_lock = Lock()
+
+
+def _flatten(image):
+  """RGB copy, transparent areas on white (JPEG has no alpha)."""
+  if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+    image = image.convert("RGBA")
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+  return image.convert("RGB")
+
+
+def process_image(source_path: str, output_dir: str, stem: str) -> dict:
+  """
+  Runs in a pool process. Returns
+  {"width", "height", "variants": {"webp": {"400": path, ...}, "jpeg": {...}}, "placeholder"}.
+  """
+  os.makedirs(output_dir, exist_ok=True)
+  with Image.open(source_path) as original:
+    image = _flatten(ImageOps.exif_transpose(original))
+  width, height = image.size
+
+  widths = [w for w in VARIANT_WIDTHS if w < width]
+  if width <= VARIANT_WIDTHS[-1]:
+    widths.append(width)
+  variants = {name: {} for name in VARIANT_FORMATS}
+  for target in widths:
+    resized = image if target == width else image.resize(
+      (target, max(1, round(height * target / width))), Image.LANCZOS
+    )
+    for name, (pil_format, extension) in VARIANT_FORMATS.items():
+      path = f"{output_dir}/{stem}_{target}.{extension}"
+      # saving without exif=/icc_profile= leaves the metadata behind
+      resized.save(path, pil_format, quality=QUALITY, optimize=True)
+      variants[name][str(target)] = path
+
+  tiny = image.resize(
+    (PLACEHOLDER_WIDTH, max(1, round(height * PLACEHOLDER_WIDTH / width))), Image.BILINEAR
+  ).filter(ImageFilter.GaussianBlur(1))
+  buffer = io.BytesIO()
+  tiny.save(buffer, "WEBP", quality=40)
+  placeholder = "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+  return {"width": width, "height": height, "variants": variants, "placeholder": placeholder}
+
+
+def get_pool() -> ProcessPoolExecutor:
+  global _pool
+  with _pool_lock:
+    if _pool is None:
+      # spawn: forking a threaded server process is not safe
+      _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def variant_paths(variants) -> list:
+  return [path for sizes in (variants or {}).values() for path in sizes.values()]
@@ -0,0 +1,88 @@
+"""
+Local stand-ins for external services, for development and load tests.
+
+    STUB_GATEWAY_DELAY_SECONDS=2 uvicorn app.lib.stubs:gateway_stub --port 9100
+
+then run the backend with RAZORPAY_API_URL=http://localhost:9100/v1. The
+delay simulates a slow gateway; STUB_GATEWAY_FAILURE_RATE (0..1) makes that
+share of calls answer 503 to exercise the retries.
+
+    uvicorn app.lib.stubs:resend_stub --port 9101
+
+with RESEND_API_URL=http://localhost:9101 accepts email sends the way
+Resend does and keeps them in memory (GET /emails lists them).
+STUB_RESEND_FAILURE_RATE works like the gateway one, and a message without
+a "to" is rejected with 422 like Resend would.
+"""
+import asyncio
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+gateway_stub = FastAPI(title="Payment gateway stub")
+
+
+@gateway_stub.post("/v1/orders")
+async def create_gateway_order(request: Request):
+  await asyncio.sleep(float(os.environ.get("STUB_GATEWAY_DELAY_SECONDS", "0")))
+  if random.random() < float(os.environ.get("STUB_GATEWAY_FAILURE_RATE", "0")):
+    return JSONResponse(status_code=503, content={"error": {"description": "stub failure"}})
+  body = await request.json()
+  return {
+    "id": f"order_stub{uuid.uuid4().hex[:14]}",
+    "entity": "order",
+    "amount": body["amount"],
+    "amount_paid": 0,
+    "amount_due": body["amount"],
+    "currency": body.get("currency", "INR"),
+    "receipt": body.get("receipt"),
+    "status": "created",
+    "attempts": 0,
+    "created_at": int(time.time()),
+  }
+
+
+resend_stub = FastAPI(title="Resend stub")
+resend_stub.state.sent = []
+
+
+def _accept_email(message: dict) -> dict:
+  email = {"id": str(uuid.uuid4()), **message}
+  resend_stub.state.sent.append(email)
+  return {"id": email["id"]}
+
+
+def _resend_failure():
+  if random.random() < float(os.environ.get("STUB_RESEND_FAILURE_RATE", "0")):
+    return JSONResponse(status_code=503, content={"name": "internal_server_error", "message": "stub failure"})
+  return None
+
+
+@resend_stub.post("/emails")
+async def send_email(request: Request):
+  if failure := _resend_failure():
+    return failure
+  message = await request.json()
+  if not message.get("to"):
+    return JSONResponse(status_code=422, content={"name": "validation_error", "message": "Missing `to` field."})
+  return _accept_email(message)
+
+
+@resend_stub.post("/emails/batch")
+async def send_email_batch(request: Request):
+  if failure := _resend_failure():
+    return failure
+  messages = await request.json()
+  if len(messages) > 100 or any(not message.get("to") for message in messages):
+    # like Resend, a batch is accepted or rejected as a whole
+    return JSONResponse(status_code=422, content={"name": "validation_error", "message": "Invalid batch."})
+  return {"data": [_accept_email(message) for message in messages]}
+
+
+@resend_stub.get("/emails")
+async def list_sent_emails():
+  return {"data": resend_stub.state.sent}
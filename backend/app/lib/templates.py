@@ -0,0 +1,152 @@
+"""
+Email templates (app/templates/email), compiled once per process.
+
+Every template renders twice from the same source: as HTML with
+autoescaping, and as the plain-text alternative. The text version is not a
+second file to keep in step; its source is derived from the HTML source
+when the template is first loaded (tags dropped, source line breaks
+dropped, links written out as "text (url)", rows and block elements turned
+into line breaks) and compiled like any other template, so a send only
+pays for two compiled renders. The regexes work on the template source, so
+keep `<` and `>` out of template expressions.
+
+The layout (email/base.html) is rendered once per template too: a send
+only runs the template's own blocks and pastes them into that static
+shell, so anything outside blocks has to be static and the blocks must
+not rely on variables set outside them.
+
+load_email_templates() compiles everything up front at startup;
+auto_reload is off, so templates never hit the disk again after that.
+"""
+import html
+import re
+from datetime import datetime
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemLoader, FunctionLoader, StrictUndefined, select_autoescape
+from jinja2.utils import concat
+
+TEMPLATE_DIR = Path(__file__).resolve().parent.parent / "templates"
+
+_HEAD = re.compile(r"<(head|style)\b.*?</\1>|<!--.*?-->", re.S | re.I)
+_LINK = re.compile(r"<a\b[^>]*?href=\"([^\"]*)\"[^>]*>\s*(.*?)\s*</a>", re.S | re.I)
+# line breaks in the HTML source are layout: gone next to markup, a space between words
+_SOURCE_BREAK_AT_MARKUP = re.compile(r"(?:(?<=>)|(?<=%}))[ \t]*\n\s*|[ \t]*\n\s*(?=<|{%)")
+_SOURCE_BREAK = re.compile(r"[ \t]*\n\s*")
+_LINE_BREAK = re.compile(r"<br\s*/?>|</(tr|li)>", re.I)
+_BLOCK_END = re.compile(r"</(p|div|h[1-6]|table)>|<hr\b[^>]*>", re.I)
+# cells of a row end up on one line
+_CELL_END = re.compile(r"</t[dh]>\s*(?=<t[dh]\b)", re.I)
+_TAG = re.compile(r"<[^>]+>")
+_INDENT = re.compile(r"^[ \t]+|[ \t]+$", re.M)
+_BLANK_LINES = re.compile(r"\n{3,}")
+_SLOT = re.compile(r"\x00(\w+)\x00")
+
+
+def format_price(amount) -> str:
+  return f"₹ {float(amount or 0):,.2f}"
+
+
+def _link_text(match) -> str:
+  url, label = match.group(1), match.group(2)
+  if url == label or url.startswith(("mailto:", "tel:")):
+    return label
+  return f"{label} ({url})"
+
+
+def _text_source(source: str) -> str:
+  """Plain-text template source for an HTML template source."""
+  source = _HEAD.sub("", source)
+  source = _LINK.sub(_link_text, source)
+  source = _SOURCE_BREAK_AT_MARKUP.sub("", source)
+  source = _SOURCE_BREAK.sub(" ", source)
+  source = _LINE_BREAK.sub("\n", source)
+  source = _BLOCK_END.sub("\n\n", source)
+  source = _CELL_END.sub("  ", source)
+  source = _TAG.sub("", source)
+  source = _INDENT.sub("", source)
+  source = _BLANK_LINES.sub("\n\n", source)
+  return html.unescape(source)
+
+
+def _environment(loader, autoescape) -> Environment:
+  env = Environment(
+    loader=loader,
+    autoescape=autoescape,
+    auto_reload=False,
+    trim_blocks=True,
+    lstrip_blocks=True,
+    undefined=StrictUndefined,
+  )
+  env.filters["price"] = format_price
+  return env
+
+
+_html_env = _environment(FileSystemLoader(TEMPLATE_DIR), select_autoescape(["html"]))
+
+
+def _load_text(name: str):
+  source, filename, _ = _html_env.loader.get_source(_html_env, name)
+  return _text_source(source), filename, lambda: True
+
+
+_text_env = _environment(FunctionLoader(_load_text), False)
+# the text body escapes nothing; `|e` in a template is for the HTML one
+_text_env.filters["e"] = _text_env.filters["escape"] = str
+_compiled = {_html_env: {}, _text_env: {}}
+
+
+def _compile(env: Environment, name: str):
+  """
+  The template and its output as a list of static strings and the block
+  functions that go between them: the layout is rendered here, once, with
+  a marker where each of the template's own blocks goes.
+  """
+  template = env.get_template(name)
+  context = template.new_context({})
+  for block in template.blocks:
+    context.blocks[block] = [lambda context, block=block: iter((f"\x00{block}\x00",))]
+  pieces = _SLOT.split(concat(template.root_render_func(context)))
+  # split() alternates static text and block names
+  parts = [piece if n % 2 == 0 else template.blocks[piece] for n, piece in enumerate(pieces) if piece]
+  _compiled[env][name] = (template, parts)
+  return template, parts
+
+
+def _render(env: Environment, name: str, context: dict) -> str:
+  template, parts = _compiled[env].get(name) or _compile(env, name)
+  context = template.new_context(context)
+  return concat([part if type(part) is str else concat(part(context)) for part in parts])
+
+
+def order_lines(products) -> tuple:
+  """
+  (rows, total) for the order confirmation table. Rows are (name, quantity,
+  unit price, line total) with the prices formatted once for both bodies;
+  a missing line total is quantity * unit price.
+  """
+  rows = []
+  order_total = 0.0
+  for p in products:
+    quantity = int(p.get("quantity", 1))
+    unit_price = float(p.get("unit_price", 0.0))
+    total_price = p.get("total_price")
+    total_price = float(total_price) if total_price is not None else quantity * unit_price
+    order_total += total_price
+    rows.append((p.get("name", "Unknown product"), quantity, format_price(unit_price), format_price(total_price)))
+  return rows, format_price(order_total)
+
+
+def render_email(name: str, **context) -> tuple:
+  """(html, text) for the template `name`, e.g. "email/order_confirmation.html"."""
+  context.setdefault("year", datetime.now().year)
+  html_body = _render(_html_env, name, context)
+  text_body = _render(_text_env, name, context).strip() + "\n"
+  return html_body, text_body
+
+
+def load_email_templates():
+  for name in _html_env.list_templates(filter_func=lambda name: name.startswith("email/")):
+    if name != "email/base.html":
+      _compile(_html_env, name)
+      _compile(_text_env, name)
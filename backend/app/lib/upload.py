@@ -1,16 +1,131 @@
 import os
-from fastapi import UploadFile
+import uuid
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import UploadFile, HTTPException
+from PIL import Image, UnidentifiedImageError
 from app.core.config import settings
 from urllib.parse import urlparse
 
+CHUNK_SIZE = 1024 * 1024
+# copying and hashing release the GIL, so threads are enough
+_ingest_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="upload")
+# what Pillow finds in the file decides the type, not what the client claims
+IMAGE_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "GIF": ".gif"}
 
-def upload_file(file:UploadFile,folder:str,filename:str):
+
+def check_upload_sizes(files):
+  """413 before anything is copied when a file or the batch is over the limit."""
+  total = 0
+  for file in files:
+    size = file.size or 0
+    if size > settings.MAX_UPLOAD_FILE_BYTES:
+      raise HTTPException(status_code=413, detail=f"{file.filename} is larger than {settings.MAX_UPLOAD_FILE_BYTES} bytes")
+    total += size
+  if total > settings.MAX_UPLOAD_TOTAL_BYTES:
+    raise HTTPException(status_code=413, detail=f"Uploads are larger than {settings.MAX_UPLOAD_TOTAL_BYTES} bytes in total")
+
+
+def _image_extension(path: str, filename: str) -> str:
+  """File extension for the image format in path; 415 for anything that isn't an allowed image."""
+  try:
+    with Image.open(path) as image:
+      image_format = image.format
+  except (UnidentifiedImageError, OSError):
+    image_format = None
+  if image_format not in IMAGE_EXTENSIONS:
+    raise HTTPException(status_code=415, detail=f"{filename} is not a JPEG, PNG, WebP or GIF image")
+  return IMAGE_EXTENSIONS[image_format]
+
+
+def receive_file(file:UploadFile,folder:str):
+  """
+  Stream the upload to a temporary file in CHUNK_SIZE pieces while hashing
+  it and return (tmp_path, path, sha256); store_file() moves it to path.
+  Files are stored under their hash, so identical content is kept once
+  however many times it is uploaded.
+  """
   save_dir = f"{settings.MEDIA_FOLDER}/{folder}"
   os.makedirs(save_dir,exist_ok=True)
-  file_path = f"{save_dir}/{filename}.png"
-  with open(file_path,"wb") as f:
-    f.write(file.file.read())
-  return file_path
+  tmp_path = f"{save_dir}/.{uuid.uuid4().hex}.part"
+  digest = hashlib.sha256()
+  written = 0
+  try:
+    file.file.seek(0)
+    with open(tmp_path,"wb") as f:
+      while chunk := file.file.read(CHUNK_SIZE):
+        written += len(chunk)
+        if written > settings.MAX_UPLOAD_FILE_BYTES:
+          raise HTTPException(status_code=413, detail=f"{file.filename} is larger than {settings.MAX_UPLOAD_FILE_BYTES} bytes")
+        digest.update(chunk)
+        f.write(chunk)
+    content_hash = digest.hexdigest()
+    # keep the real format; resized copies are made by app/lib/images.py
+    extension = _image_extension(tmp_path, file.filename)
+  except BaseException:
+    if os.path.exists(tmp_path):
+      os.remove(tmp_path)
+    raise
+  return tmp_path, f"{save_dir}/{content_hash}{extension}", content_hash
+
+
+def store_file(tmp_path: str, file_path: str):
+  """Move a received file into place, or drop it when the content is already stored."""
+  if os.path.exists(file_path):
+    os.remove(tmp_path)
+  else:
+    os.replace(tmp_path,file_path)
+
+
+def upload_file(file:UploadFile,folder:str):
+  """Receive and store one upload; returns (path, sha256)."""
+  tmp_path, file_path, content_hash = receive_file(file,folder)
+  store_file(tmp_path,file_path)
+  return file_path, content_hash
+
+
+def upload_files(files,folder:str,lock=None):
+  """
+  upload_file for several uploads at once, results in input order.
+
+  lock(paths), when given, is called before anything is moved into place.
+  A stored file can be shared by several rows and is removed with the last
+  of them, so the caller takes the same lock the removal takes (see
+  app_product/crud.py lock_stored_files) and holds it until its rows are
+  committed.
+  """
+  check_upload_sizes(files)
+  futures = [_ingest_pool.submit(receive_file, file, folder) for file in files]
+  received, error = [], None
+  # wait for every file, so none is still being written when we clean up
+  for future in futures:
+    try:
+      received.append(future.result())
+    except BaseException as e:
+      error = error or e
+  created = []
+  try:
+    if error is not None:
+      raise error
+    if lock is not None:
+      lock(sorted({file_path for _, file_path, _ in received}))
+    for tmp_path, file_path, _ in received:
+      existed = os.path.exists(file_path)
+      store_file(tmp_path,file_path)
+      if not existed:
+        created.append(file_path)
+  except BaseException:
+    # a failed batch leaves nothing of its own behind
+    for file_path in created:
+      if os.path.exists(file_path):
+        os.remove(file_path)
+    raise
+  finally:
+    for tmp_path, _, _ in received:
+      if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+  return [(file_path, content_hash) for _, file_path, content_hash in received]
+
 
 def delete_file(url: str):
   parsed = urlparse(url)
@@ -18,4 +133,4 @@ def delete_file(url: str):
   if os.path.exists(file_path):
       os.remove(file_path)
       return True
-  return False
\ No newline at end of file
+  return False
@@ -1,5 +1,5 @@
 
-import os, time
+import os, re, time
 os.environ["TZ"] = "Asia/Kolkata"
 time.tzset()
 
@@ -13,8 +13,17 @@ from fastapi.responses import JSONResponse
 
 from fastapi.staticfiles import StaticFiles
 
-from app.core.database import Base, engine
+from app.core.database import Base, engine, SessionLocal
 from app.api.v1 import routes_users,routes_cart,routes_order,routes_product
+from app.app_product.crud import build_search_index, patch_search_index
+from app.lib.cache import product_cache
+from app.app_order.crud import release_expired_reservations
+from app.lib.payment_gateway import close_gateway
+from app.app_order.webhooks import drain_webhook_events
+from app.lib.email_outbox import drain_outbox, connect as connect_email_outbox
+from app.lib.templates import load_email_templates
+import asyncio
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from fastapi.middleware.cors import CORSMiddleware
@@ -43,6 +52,62 @@ async def startup():
     redis_url = settings.REDIS_URL if settings.PRODUCTION == 'true' else "redis://localhost:6379/0"
     redis = redis_from_url(redis_url, encoding="utf-8", decode_responses=True)
     await FastAPILimiter.init(redis)
+    # L2 + cross-worker invalidation for the product read cache
+    await run_in_threadpool(product_cache.connect, redis_url)
+    # one send rate for all workers, it is Resend's limit per team
+    await run_in_threadpool(connect_email_outbox, redis_url)
+
+    # in-memory catalog search (no-op unless SEARCH_BACKEND=memory); other
+    # workers' product writes reach the index the way they reach the cache
+    product_cache.subscribe(patch_search_index)
+    def load_search_index():
+        with SessionLocal() as db:
+            build_search_index(db)
+    await run_in_threadpool(load_search_index)
+
+    load_email_templates()
+
+    asyncio.create_task(sweep_expired_reservations())
+    asyncio.create_task(drain_webhook_queue())
+    asyncio.create_task(drain_email_outbox())
+
+
+async def drain_webhook_queue():
+    # picks up retries and anything the post-webhook drain missed
+    while True:
+        await asyncio.sleep(settings.WEBHOOK_POLL_SECONDS)
+        try:
+            await run_in_threadpool(drain_webhook_events)
+        except Exception:
+            traceback.print_exc()
+
+
+async def drain_email_outbox():
+    # retries, and mail queued by code paths that don't drain right away (webhooks)
+    while True:
+        await asyncio.sleep(settings.EMAIL_POLL_SECONDS)
+        await run_in_threadpool(drain_outbox)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_gateway()
+
+
+def _release_expired_reservations():
+    with SessionLocal() as db:
+        while release_expired_reservations(db):
+            pass
+
+
+async def sweep_expired_reservations():
+    # every worker sweeps; SKIP LOCKED keeps them off each other's rows
+    while True:
+        await asyncio.sleep(settings.RESERVATION_SWEEP_SECONDS)
+        try:
+            await run_in_threadpool(_release_expired_reservations)
+        except Exception:
+            traceback.print_exc()
 
 
 rate_limiter = RateLimiter(times=200, seconds=60)
@@ -72,6 +137,21 @@ async def global_rate_limit(request: Request, call_next):
     return response
 
 
+# the product create/update forms that carry images; a catalog import is streamed and may be larger
+IMAGE_UPLOAD_ROUTES = re.compile(r"^(POST /api/v1/product/?|PUT /api/v1/product/[^/]+)$")
+
+
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    # refuse oversized image uploads before the multipart body gets spooled
+    if not IMAGE_UPLOAD_ROUTES.match(f"{request.method} {request.url.path}"):
+        return await call_next(request)
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > settings.MAX_UPLOAD_TOTAL_BYTES:
+        return JSONResponse(status_code=413, content={"detail": "Request body too large"})
+    return await call_next(request)
+
+
 @app.get("/health", tags=["health"])
 def health():
     return {"status": "ok"}
@@ -91,6 +171,11 @@ app.include_router(
   prefix="/api/v1/product",
   tags=["product"],
 )
+app.include_router(
+  routes_product.category_router,
+  prefix="/api/v1/category",
+  tags=["category"],
+)
 app.include_router(
   routes_cart.router_cart,
   prefix="/api/v1/cart",
@@ -0,0 +1,124 @@
+"""Setup shared by the benchmarks: a synthetic catalog, shoppers with a filled cart, and timing summaries."""
+import random
+import statistics
+import uuid
+from datetime import datetime
+
+from sqlalchemy import func, insert, select, text
+
+from app.core.database import SessionLocal
+from app.core.security import create_access_token
+# User.orders names Order, so its models have to be loaded for the mappers to resolve
+import app.app_order.models
+from app.app_cart.models import Cart, CartItem
+from app.app_product.models import Product
+from app.app_users.models import Address, User
+
+
+# words the catalog is made of, so searches hit realistic shares of it
+MATERIALS = ["kundan", "polki", "meenakari", "temple", "oxidised", "pearl", "antique", "gold", "silver", "rose"]
+PIECES = ["necklace", "choker", "jhumka", "earrings", "bangle", "ring", "maang tikka", "nath", "anklet", "haath phool"]
+DETAILS = ["bridal", "festive", "everyday", "handcrafted", "plated", "studded", "layered", "statement", "minimal", "royal"]
+CATEGORIES = ["Necklace", "Earrings", "Bangles", "Rings", "Sets", "Anklets"]
+
+
+def catalog_rows(count: int, seed: int = 7):
+  """`count` product dicts (title, code, description, category, price), the same for the same seed."""
+  rng = random.Random(seed)
+  for n in range(count):
+    material, piece = rng.choice(MATERIALS), rng.choice(PIECES)
+    details = rng.sample(DETAILS, 3)
+    yield {
+      "title": f"{details[0].title()} {material} {piece} no. {n}",
+      "code": f"LR{n:07d}",
+      "description": f"{details[1].title()} {material} {piece}, {details[2]} finish. Comes in a gift box.",
+      "category": rng.choice(CATEGORIES),
+      "price": rng.randrange(499, 49999),
+    }
+
+
+def seed_catalog(count: int, chunk: int = 5000) -> int:
+  """
+  Top the products table up to `count` active products from catalog_rows();
+  returns how many were added. Codes are tagged "bench" like seed_shoppers'
+  rows, but use a scratch database all the same.
+  """
+  run = uuid.uuid4().hex[:8]
+  now = datetime.utcnow()
+  with SessionLocal() as db:
+    missing = count - db.scalar(select(func.count()).select_from(Product))
+    if missing <= 0:
+      return 0
+    rows = []
+    for n, row in enumerate(catalog_rows(missing, seed=count)):
+      rows.append({
+        **row, "id": uuid.uuid4(), "code": f"bench-{run}-{n}", "actual_price": row["price"],
+        "stock": 10, "active": True, "created_at": now, "updated_at": now,
+      })
+      if len(rows) == chunk:
+        db.execute(insert(Product), rows)
+        rows = []
+    if rows:
+      db.execute(insert(Product), rows)
+    db.commit()
+    # fresh statistics, or the planner guesses from an empty table
+    db.execute(text("ANALYZE products"))
+    db.commit()
+  return missing
+
+
+def seed_shoppers(count: int, lines: int = 5, stock: int = 1_000_000) -> list:
+  """
+  `count` users with an address and a cart of `lines` products (stock to
+  spare); returns a bearer token per user. Rows are tagged "bench" so a
+  scratch database can be told apart, but use one.
+  """
+  run = uuid.uuid4().hex[:8]
+  with SessionLocal() as db:
+    products = [
+      Product(
+        id=uuid.uuid4(), title=f"Bench piece {run}-{n}", code=f"bench-{run}-{n}",
+        price=1000, actual_price=1200, stock=stock, category="bench", active=True,
+      )
+      for n in range(lines)
+    ]
+    db.add_all(products)
+    db.flush()
+    tokens = []
+    for n in range(count):
+      user = User(id=uuid.uuid4(), email=f"bench-{run}-{n}@example.com", full_name="Bench Shopper")
+      cart = Cart(id=uuid.uuid4(), user_id=user.id)
+      db.add_all([user, cart])
+      db.add(Address(
+        user_id=user.id, full_name="Bench Shopper", phone="9999999999", street="1 MG Road",
+        city="Jaipur", state="Rajasthan", country="India", postcode="302001",
+      ))
+      db.add_all(CartItem(cart_id=cart.id, product_id=product.id, qty=1, price=product.price) for product in products)
+      tokens.append(create_access_token({"sub": user.email}))
+    db.commit()
+  return tokens
+
+
+def client_headers(n: int) -> dict:
+  # fastapi-limiter keys on X-Forwarded-For, so every client gets a budget
+  # of its own and the limiter stays out of the numbers
+  return {"X-Forwarded-For": f"10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}"}
+
+
+def shopper_headers(token: str, n: int) -> dict:
+  return {"Authorization": f"Bearer {token}", **client_headers(n)}
+
+
+def summarize(label: str, latencies: list, elapsed: float, statuses=None):
+  if not latencies:
+    print(f"{label}: no requests completed")
+    return
+  ordered = sorted(latencies)
+  pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+  print(
+    f"{label}: {len(ordered)} requests in {elapsed:.1f}s ({len(ordered) / elapsed:.1f}/s)  "
+    f"p50 {pick(0.50):.1f} ms  p95 {pick(0.95):.1f} ms  p99 {pick(0.99):.1f} ms  "
+    f"mean {statistics.fmean(ordered) * 1000:.1f} ms"
+  )
+  if statuses:
+    print("  status codes: " + ", ".join(f"{code} x{count}" for code, count in sorted(statuses.items())))
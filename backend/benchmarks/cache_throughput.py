@@ -0,0 +1,103 @@
+"""
+Throughput of /api/v1/product/list and /product/show with and without the read cache.
+
+Point the backend at a scratch database and Redis, start it:
+
+    uvicorn app.main:app --port 8000 --workers 4
+
+then, from backend/:
+
+    python -m benchmarks.cache_throughput --products 100000 --clients 32 --seconds 15
+
+Tops the catalog up to --products synthetic products. For each endpoint
+the clients first request keys nobody has asked for yet (list pages by
+cursors built from random rows, details of random products), so every
+request is built from Postgres; then they keep requesting a small set of
+already cached keys, which is what a shop's popular pages look like.
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from collections import Counter
+
+import httpx
+from sqlalchemy import func, select
+
+from app.app_product.models import Product
+from app.common.crud import encode_cursor
+from app.core.database import SessionLocal
+from benchmarks._common import client_headers, seed_catalog, summarize
+
+LIST_PATH = "/api/v1/product/list"
+SHOW_PATH = "/api/v1/product/show/{}"
+PAGE_SIZE = 12
+HOT_KEYS = 20
+
+
+def sample_products(count: int) -> list:
+  """(id, updated_at) of `count` random active products."""
+  with SessionLocal() as db:
+    return db.execute(
+      select(Product.id, Product.updated_at).where(Product.active == True).order_by(func.random()).limit(count)
+    ).all()
+
+
+def list_requests(rows) -> list:
+  # a keyset cursor after each sampled row: every one a page of its own
+  return [(LIST_PATH, {"size": PAGE_SIZE, "cursor": encode_cursor({"k": [updated_at, id]})}) for id, updated_at in rows]
+
+
+def show_requests(rows) -> list:
+  return [(SHOW_PATH.format(id), None) for id, _ in rows]
+
+
+async def hammer(client, requests, clients: int, seconds: float, repeat: bool) -> tuple:
+  """Spread requests over the clients until they run out (or, with repeat, until the time is up)."""
+  latencies, statuses = [], Counter()
+  source = itertools.cycle(requests) if repeat else iter(requests)
+  deadline = time.perf_counter() + seconds
+
+  async def worker(n):
+    headers = client_headers(n)
+    for path, params in source:
+      if time.perf_counter() >= deadline:
+        return
+      started = time.perf_counter()
+      response = await client.get(path, params=params, headers=headers)
+      statuses[response.status_code] += 1
+      if response.status_code == 200:
+        latencies.append(time.perf_counter() - started)
+
+  started = time.perf_counter()
+  await asyncio.gather(*(worker(n) for n in range(clients)))
+  return latencies, time.perf_counter() - started, statuses
+
+
+async def run(args):
+  print(f"{seed_catalog(args.products)} products added")
+  rows = sample_products(args.cold_keys)
+  limits = httpx.Limits(max_connections=args.clients)
+  async with httpx.AsyncClient(base_url=args.base_url, timeout=30, limits=limits) as client:
+    for label, build in (("list", list_requests), ("show", show_requests)):
+      cold, hot = build(rows[HOT_KEYS:]), build(rows[:HOT_KEYS])
+      latencies, elapsed, statuses = await hammer(client, cold, args.clients, args.seconds, repeat=False)
+      summarize(f"{label}, uncached keys", latencies, elapsed, statuses)
+      # a few rounds put the hot keys in L2 and in most workers' L1
+      await hammer(client, hot * 4, args.clients, args.seconds, repeat=False)
+      latencies, elapsed, statuses = await hammer(client, hot, args.clients, args.seconds, repeat=True)
+      summarize(f"{label}, cached keys", latencies, elapsed, statuses)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+  parser.add_argument("--base-url", default="http://localhost:8000")
+  parser.add_argument("--products", type=int, default=100_000)
+  parser.add_argument("--clients", type=int, default=32)
+  parser.add_argument("--seconds", type=float, default=15, help="length of each measured phase")
+  parser.add_argument("--cold-keys", type=int, default=20_000, help="keys sampled for the uncached phase")
+  asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+  main()
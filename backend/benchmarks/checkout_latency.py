@@ -0,0 +1,61 @@
+"""
+Latency of POST /api/v1/order/place-order/payment-request.
+
+Run the gateway stub and the backend against a scratch database:
+
+    uvicorn app.lib.stubs:gateway_stub --port 9100
+    RAZORPAY_API_URL=http://localhost:9100/v1 uvicorn app.main:app --port 8000
+
+then, from backend/:
+
+    python -m benchmarks.checkout_latency --requests 200 --concurrency 8 --lines 5
+
+Every request is a different shopper with a --lines line cart, so each one
+writes a full checkout (order, items, holds, transaction). The stub answers
+at once, which leaves the database round trips and commits as the cost
+being measured. Run it on the previous release and on this one to
+compare.
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks._common import seed_shoppers, shopper_headers, summarize
+
+PATH = "/api/v1/order/place-order/payment-request"
+
+
+async def run(args):
+  tokens = seed_shoppers(args.requests, args.lines)
+  latencies, statuses = [], Counter()
+  limit = asyncio.Semaphore(args.concurrency)
+
+  async with httpx.AsyncClient(base_url=args.base_url, timeout=30) as client:
+    async def checkout(n, token):
+      async with limit:
+        started = time.perf_counter()
+        response = await client.post(PATH, headers=shopper_headers(token, n))
+        statuses[response.status_code] += 1
+        if response.status_code == 200:
+          latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(checkout(n, token) for n, token in enumerate(tokens)))
+    elapsed = time.perf_counter() - started
+  summarize(f"checkout ({args.lines} lines, concurrency {args.concurrency})", latencies, elapsed, statuses)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+  parser.add_argument("--base-url", default="http://localhost:8000")
+  parser.add_argument("--requests", type=int, default=200)
+  parser.add_argument("--concurrency", type=int, default=8)
+  parser.add_argument("--lines", type=int, default=5, help="cart lines per checkout")
+  asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,80 @@
+"""
+Site throughput while the payment gateway takes 2 seconds.
+
+Run the gateway stub with a delay and the backend against a scratch database:
+
+    STUB_GATEWAY_DELAY_SECONDS=2 uvicorn app.lib.stubs:gateway_stub --port 9100
+    RAZORPAY_API_URL=http://localhost:9100/v1 uvicorn app.main:app --port 8000
+
+then, from backend/:
+
+    python -m benchmarks.gateway_throughput --checkouts 60 --readers 20 --seconds 20
+
+--checkouts shoppers check out at the same time, each waiting on the slow
+gateway, while --readers clients keep reading the product list. With a
+DB connection (and a threadpool slot) held across the gateway call the
+list stalls once the checkouts exhaust the pool; with it released the
+list keeps its usual latency and the checkouts finish in about the
+gateway's delay. Run it on the previous release and on this one to
+compare.
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks._common import client_headers, seed_shoppers, shopper_headers, summarize
+
+CHECKOUT_PATH = "/api/v1/order/place-order/payment-request"
+READ_PATH = "/api/v1/product/list"
+
+
+async def run(args):
+  tokens = seed_shoppers(args.checkouts, lines=2)
+  checkout_latencies, checkout_statuses = [], Counter()
+  read_latencies, read_statuses = [], Counter()
+  deadline = time.perf_counter() + args.seconds
+  limits = httpx.Limits(max_connections=args.checkouts + args.readers)
+
+  async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+    async def checkout(n, token):
+      started = time.perf_counter()
+      response = await client.post(CHECKOUT_PATH, headers=shopper_headers(token, n))
+      checkout_statuses[response.status_code] += 1
+      if response.status_code == 200:
+        checkout_latencies.append(time.perf_counter() - started)
+
+    async def reader(n):
+      page = n
+      headers = client_headers(args.checkouts + n)
+      while time.perf_counter() < deadline:
+        page += 1
+        started = time.perf_counter()
+        response = await client.get(READ_PATH, params={"page": page % 20 + 1, "size": 12}, headers=headers)
+        read_statuses[response.status_code] += 1
+        if response.status_code == 200:
+          read_latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+      *(checkout(n, token) for n, token in enumerate(tokens)),
+      *(reader(n) for n in range(args.readers)),
+    )
+    elapsed = time.perf_counter() - started
+  summarize(f"checkouts ({args.checkouts} at once)", checkout_latencies, elapsed, checkout_statuses)
+  summarize(f"product list ({args.readers} readers)", read_latencies, elapsed, read_statuses)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+  parser.add_argument("--base-url", default="http://localhost:8000")
+  parser.add_argument("--checkouts", type=int, default=60)
+  parser.add_argument("--readers", type=int, default=20)
+  parser.add_argument("--seconds", type=float, default=20, help="how long the readers keep going")
+  asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+  main()
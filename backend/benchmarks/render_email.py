@@ -0,0 +1,55 @@
+"""
+Render time of an order confirmation with 50 line items.
+
+    python -m benchmarks.render_email --lines 50 --rounds 2000
+
+Times order_lines and render_email (the HTML and the plain-text body) with the templates
+already compiled, as they are after startup, and the first render of a
+fresh process for comparison. Needs only Jinja2, no database.
+"""
+import argparse
+import time
+import timeit
+
+from app.lib import templates
+
+TEMPLATE = "email/order_confirmation.html"
+
+
+def order_context(lines: int) -> dict:
+  products = [
+    {"name": f"Kundan choker set no. {n}", "quantity": n % 3 + 1, "unit_price": 1499.0 + n, "total_price": (n % 3 + 1) * (1499.0 + n)}
+    for n in range(lines)
+  ]
+  return {
+    "order_id": "1250",
+    "order_url": "https://lerah.in/orders/1250",
+    "products": products,
+  }
+
+
+def render(context: dict) -> tuple:
+  """What send_order_confirmation_email does: the rows, then both bodies."""
+  rows, order_total = templates.order_lines(context["products"])
+  return templates.render_email(TEMPLATE, order_id=context["order_id"], order_url=context["order_url"], products=rows, order_total=order_total)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+  parser.add_argument("--lines", type=int, default=50)
+  parser.add_argument("--rounds", type=int, default=2000)
+  args = parser.parse_args()
+  context = order_context(args.lines)
+
+  started = time.perf_counter()
+  templates.load_email_templates()
+  html_body, text_body = render(context)
+  cold = time.perf_counter() - started
+
+  best = min(timeit.repeat(lambda: render(context), number=args.rounds, repeat=5)) / args.rounds
+  print(f"order confirmation, {args.lines} lines: {best * 1e6:.0f} µs per render (html {len(html_body)} B + text {len(text_body)} B)")
+  print(f"first render including template compilation: {cold * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+  main()
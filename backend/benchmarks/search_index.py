@@ -0,0 +1,63 @@
+"""
+Memory and query latency of the in-memory search index (SEARCH_BACKEND=memory).
+
+    python -m benchmarks.search_index --sizes 10000,100000,1000000
+
+For each catalog size, builds a ProductSearchIndex from a synthetic catalog
+and reports the memory the index holds (tracemalloc) and the time of
+search() for queries of different reach, from a code that matches one
+product to a two letter prefix that matches most of the catalog. Needs no
+database: the index is filled through upsert(), the way writes patch it.
+"""
+import argparse
+import gc
+import time
+import timeit
+import tracemalloc
+import uuid
+
+from app.app_product.search_index import ProductSearchIndex
+from benchmarks._common import catalog_rows
+
+QUERIES = ["LR0000042", "kundan jhumka", "kundan", "bridal polki choker", "ku"]
+
+
+def build(size: int) -> tuple:
+  """(index, bytes it holds, seconds to build)."""
+  gc.collect()
+  tracemalloc.start()
+  started = time.perf_counter()
+  index = ProductSearchIndex()
+  for row in catalog_rows(size):
+    index.upsert(uuid.uuid4(), row["title"], row["code"], row["description"])
+  index.ready = True
+  elapsed = time.perf_counter() - started
+  held, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return index, held, elapsed
+
+
+def report(size: int):
+  index, held, elapsed = build(size)
+  print(f"{size} products: index holds {held / 2**20:.1f} MiB, built in {elapsed:.1f}s")
+  for query in QUERIES:
+    matches = len(index.search(query))
+    # tracemalloc is off again, so this is the plain search cost
+    timer = timeit.Timer(lambda: index.search(query))
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=3, number=number)) / number
+    print(f"  {query!r:24} {matches:8} matches  {best * 1000:8.3f} ms")
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+  parser.add_argument("--sizes", default="10000,100000,1000000", help="comma separated catalog sizes")
+  args = parser.parse_args()
+
+  for size in (int(size) for size in args.sizes.split(",")):
+    # the index is freed when report returns, before the next one is built
+    report(size)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,77 @@
+"""
+Ranked full-text search against the ILIKE scan it replaced, on a 100k catalog.
+
+Point the app at a scratch database, then from backend/:
+
+    python -m benchmarks.search_ranking --products 100000 --rounds 50
+
+Tops the catalog up to --products synthetic products, then times the first
+page (20 rows plus the total) of get_list_of_product with a search term,
+which goes through the weighted tsvector and its GIN index, against the
+old query: three OR'd ILIKE '%term%' clauses, newest first. Both run
+in-process on one session, so only the database work and the ORM load
+differ. Compare with SEARCH_BACKEND=postgres (the default).
+"""
+import argparse
+import time
+
+from sqlalchemy import or_
+
+import app.app_product.crud as crud_product
+from app.app_product.models import Product
+from app.core.database import SessionLocal
+from benchmarks._common import seed_catalog, summarize
+
+TERMS = ["kundan", "kundan jhumka", "bridal polki choker", "temple", "ku"]
+PAGE_SIZE = 20
+
+
+def ranked_page(db, term):
+  page = crud_product.get_list_of_product(db, 1, PAGE_SIZE, "", term, None)
+  return page.total
+
+
+def ilike_page(db, term):
+  """The listing's search before the tsvector column: a sequential scan per request."""
+  query = db.query(Product).filter(
+    Product.active == True,
+    or_(
+      Product.title.ilike(f"%{term}%"),
+      Product.description.ilike(f"%{term}%"),
+      Product.code.ilike(f"%{term}%"),
+    ),
+  )
+  total = query.count()
+  query.order_by(Product.updated_at.desc()).limit(PAGE_SIZE).all()
+  return total
+
+
+def measure(db, label, page, term, rounds):
+  matches = page(db, term)
+  db.rollback()
+  latencies = []
+  started = time.perf_counter()
+  for _ in range(rounds):
+    began = time.perf_counter()
+    page(db, term)
+    latencies.append(time.perf_counter() - began)
+    db.rollback()
+  summarize(f"  {label:6} {matches:7} matches", latencies, time.perf_counter() - started)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+  parser.add_argument("--products", type=int, default=100_000)
+  parser.add_argument("--rounds", type=int, default=50)
+  args = parser.parse_args()
+  print(f"{seed_catalog(args.products)} products added")
+
+  with SessionLocal() as db:
+    for term in TERMS:
+      print(f"{term!r}")
+      measure(db, "ranked", ranked_page, term, args.rounds)
+      measure(db, "ilike", ilike_page, term, args.rounds)
+
+
+if __name__ == "__main__":
+  main()
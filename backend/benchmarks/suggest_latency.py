@@ -0,0 +1,76 @@
+"""
+Latency of GET /api/v1/product/suggest while shoppers type, on a 100k catalog.
+
+Point the backend at a scratch database and start it:
+
+    uvicorn app.main:app --port 8000
+
+then, from backend/:
+
+    python -m benchmarks.suggest_latency --products 100000 --typists 8
+
+Tops the catalog up to --products synthetic products, then replays every
+keystroke (prefixes of two or more letters) of a list of searches, typos
+included, twice: the first pass reaches Postgres and the trigram indexes,
+the second is what popular prefixes cost once cached. Restart the backend
+before a run, or the first pass is partly cached too. The target is p99
+under 20 ms on the first pass.
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks._common import client_headers, seed_catalog, summarize
+
+PATH = "/api/v1/product/suggest"
+SEARCHES = [
+  "kundan jhumka", "kundun", "jhumki", "polki choker", "meenakri bangle", "temple necklace",
+  "oxidized anklet", "pearl maang tikka", "haath phool", "antique nath", "rose gold ring", "bridal set",
+]
+
+
+def keystrokes(searches) -> list:
+  """What the box holds after each key, from the second letter on."""
+  return [search[:end] for search in searches for end in range(2, len(search) + 1) if not search[:end].endswith(" ")]
+
+
+async def replay(client, typists: int) -> tuple:
+  latencies, statuses = [], Counter()
+  # each typist owns a share of the searches and types them in order
+  shares = [keystrokes(SEARCHES[n::typists]) for n in range(typists)]
+
+  async def typist(n, strokes):
+    headers = client_headers(n)
+    for q in strokes:
+      started = time.perf_counter()
+      response = await client.get(PATH, params={"q": q, "limit": 8}, headers=headers)
+      statuses[response.status_code] += 1
+      if response.status_code == 200:
+        latencies.append(time.perf_counter() - started)
+
+  started = time.perf_counter()
+  await asyncio.gather(*(typist(n, strokes) for n, strokes in enumerate(shares)))
+  return latencies, time.perf_counter() - started, statuses
+
+
+async def run(args):
+  print(f"{seed_catalog(args.products)} products added")
+  async with httpx.AsyncClient(base_url=args.base_url, timeout=30) as client:
+    for label in ("first pass", "cached pass"):
+      latencies, elapsed, statuses = await replay(client, args.typists)
+      summarize(f"suggest, {label} ({args.typists} typists)", latencies, elapsed, statuses)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+  parser.add_argument("--base-url", default="http://localhost:8000")
+  parser.add_argument("--products", type=int, default=100_000)
+  parser.add_argument("--typists", type=int, default=8, help="clients typing at the same time")
+  asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,22 @@
+"""A value read before an invalidation of its tags is not cached."""
+from app.lib.cache import MISSING, TaggedCache
+
+
+def test_set_after_invalidation_of_its_tag_is_dropped():
+  cache = TaggedCache("test")
+  assert cache.get("show:1") is MISSING
+  # a write to product 1 commits while the response is being built
+  cache.invalidate({"product:1"})
+  cache.set("show:1", {"stock": 5}, {"product:1"})
+  assert cache.get("show:1") is MISSING
+
+  cache.set("show:1", {"stock": 4}, {"product:1"})
+  assert cache.get("show:1") == {"stock": 4}
+
+
+def test_invalidation_of_other_tags_keeps_the_value():
+  cache = TaggedCache("test")
+  assert cache.get("show:1") is MISSING
+  cache.invalidate({"product:2"})
+  cache.set("show:1", {"stock": 5}, {"product:1"})
+  assert cache.get("show:1") == {"stock": 5}
@@ -0,0 +1,33 @@
+"""Parallel ratings of one order item keep the product's totals right."""
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import select
+
+import app.app_order.crud as crud_order
+from app.app_order.models import OrderItem
+from app.app_product.models import ProductRatingStats
+from app.core.database import SessionLocal
+
+RATINGS = [1, 2, 3, 4, 5] * 6
+THREADS = 10
+
+
+def _rate(order_item_id, rating):
+  with SessionLocal() as session:
+    crud_order.rate_order_item(session, session.get(OrderItem, order_item_id), rating)
+
+
+def test_parallel_ratings_move_one_rating(db, make_product, make_customer, checkout):
+  product = make_product()
+  order_id, _ = checkout(make_customer([(product, 1)]).id)
+  order_item_id = db.scalar(select(OrderItem.id).where(OrderItem.order_id == order_id))
+
+  with ThreadPoolExecutor(max_workers=THREADS) as pool:
+    list(pool.map(lambda rating: _rate(order_item_id, rating), RATINGS))
+
+  db.expire_all()
+  final = db.get(OrderItem, order_item_id).rating
+  stats = db.get(ProductRatingStats, product.id)
+  assert stats.rating_count == 1
+  assert stats.rating_sum == final
+  assert [getattr(stats, f"star_{star}") for star in range(1, 6)] == [int(star == final) for star in range(1, 6)]
@@ -0,0 +1,52 @@
+"""Order numbers under concurrent allocation and checkout."""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import func, select
+
+import app.app_order.crud as crud_order
+from app.app_order.models import Order
+from app.core.config import settings
+from app.core.database import SessionLocal
+
+THREADS = 12
+
+
+@pytest.fixture(params=[1, 25], ids=["per-order", "block"])
+def block_size(request, monkeypatch):
+  monkeypatch.setattr(settings, "ORDER_NUMBER_BLOCK_SIZE", request.param)
+  # a block left over from another test would hide the sequence round trips
+  crud_order._order_numbers.clear()
+  yield request.param
+  crud_order._order_numbers.clear()
+
+
+def _allocate(count: int) -> list:
+  with SessionLocal() as db:
+    numbers = [crud_order.generate_order_number(db) for _ in range(count)]
+    db.rollback()
+  return numbers
+
+
+def test_generate_order_number_never_repeats(engine, block_size):
+  with ThreadPoolExecutor(max_workers=THREADS) as pool:
+    batches = list(pool.map(_allocate, [40] * THREADS * 2))
+  numbers = [number for batch in batches for number in batch]
+  assert len(numbers) == THREADS * 2 * 40
+  assert len(set(numbers)) == len(numbers)
+
+
+def test_parallel_checkouts_get_distinct_numbers(db, block_size, make_product, make_customer, checkout):
+  checkouts = 80
+  product = make_product(stock=checkouts)
+  users = [make_customer([(product, 1)]).id for _ in range(checkouts)]
+
+  # an IntegrityError on orders.order_number would surface here
+  with ThreadPoolExecutor(max_workers=THREADS) as pool:
+    placed = list(pool.map(checkout, users))
+
+  numbers = [order_number for _, order_number in placed]
+  assert len(set(numbers)) == checkouts
+  stored = db.execute(select(Order.order_number)).scalars().all()
+  assert sorted(stored) == sorted(numbers)
+  assert db.scalar(select(func.count(func.distinct(Order.order_number)))) == checkouts
@@ -0,0 +1,31 @@
+"""Price sorted cursor pages with products that have no price."""
+import pytest
+
+import app.app_product.crud as crud_product
+
+
+def _walk(db, filter, size):
+  """Ids of every page of the storefront listing, following next_cursor."""
+  seen, cursor = [], ""
+  while cursor is not None:
+    page = crud_product.get_list_of_product(db, 1, size, filter, None, None, cursor=cursor)
+    seen += [item.id for item in page.items]
+    cursor = page.next_cursor
+  return seen
+
+
+@pytest.mark.parametrize("filter, priced_order", [
+  ("lowest_first", [100, 200, 200, 300]),
+  ("highest_first", [300, 200, 200, 100]),
+])
+@pytest.mark.parametrize("size", [1, 2, 3, 10])
+def test_unpriced_products_come_last_on_every_page(db, make_product, filter, priced_order, size):
+  priced = [make_product(price=price) for price in (200, 100, 300, 200)]
+  unpriced = [make_product(price=None) for _ in range(3)]
+
+  seen = _walk(db, filter, size)
+
+  assert len(seen) == len(set(seen)) == len(priced) + len(unpriced)
+  by_id = {product.id: product for product in priced + unpriced}
+  assert [by_id[id].price for id in seen[:len(priced)]] == priced_order
+  assert sorted(seen[len(priced):]) == sorted(product.id for product in unpriced)
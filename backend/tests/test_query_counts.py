@@ -0,0 +1,95 @@
+"""Statements per catalog read, which must not grow with the number of rows shown."""
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+
+import app.app_cart.crud as crud_cart
+import app.app_product.crud as crud_product
+from app.app_cart.schemas import CartOut
+from app.app_product.models import ProductImage, ProductRelated
+from app.app_product.schemas import ProductResponse
+from app.common import crud as common_crud
+
+
+@contextmanager
+def count_statements(engine):
+  statements = []
+
+  def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+  event.listen(engine, "after_cursor_execute", after_cursor_execute)
+  try:
+    yield statements
+  finally:
+    event.remove(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def _measure(engine, db, read) -> int:
+  """Statements `read` sends from a cold session, the way a request starts."""
+  db.expire_all()
+  with common_crud._count_lock:
+    common_crud._count_cache.clear()
+  with count_statements(engine) as statements:
+    read()
+  db.rollback()
+  return len(statements)
+
+
+@pytest.fixture
+def catalog(db, make_product):
+  products = []
+  for n in range(30):
+    product = make_product(title=f"Polki ring {n}", category="ring")
+    images = [ProductImage(id=uuid.uuid4(), product_id=product.id, path=f"media/products/{uuid.uuid4().hex}.jpg") for _ in range(3)]
+    db.add_all(images)
+    crud_product.set_primary_image(product, images[0])
+    products.append(product)
+  db.commit()
+  return products
+
+
+def _list_page(db, size):
+  # the /product/list route: crud call, then the response is encoded
+  return lambda: jsonable_encoder(crud_product.get_list_of_product(db, 1, size, "", None, None, cursor=""))
+
+
+def _product_page(db, product_id):
+  # the /product/show route
+  def read():
+    product = crud_product.get_product_by_id(db, product_id, is_admin=True)
+    data = ProductResponse.from_orm(product)
+    data.related_products = crud_product.get_related_products(db, product_id, 4)
+    return jsonable_encoder(data)
+  return read
+
+
+def test_listing_query_count_does_not_grow_with_page_size(engine, db, catalog):
+  small = _measure(engine, db, _list_page(db, 4))
+  large = _measure(engine, db, _list_page(db, 24))
+  assert small == large
+
+
+def test_product_page_query_count_does_not_grow_with_related_products(engine, db, catalog):
+  one, four = catalog[0], catalog[1]
+  db.add(ProductRelated(product_id=one.id, rank=1, related_id=catalog[10].id, score=1.0))
+  db.add_all(
+    ProductRelated(product_id=four.id, rank=rank, related_id=catalog[10 + rank].id, score=1.0)
+    for rank in range(1, 5)
+  )
+  db.commit()
+
+  assert _measure(engine, db, _product_page(db, one.id)) == _measure(engine, db, _product_page(db, four.id))
+
+
+def test_cart_query_count_does_not_grow_with_lines(engine, db, catalog, make_customer):
+  short = make_customer([(product, 1) for product in catalog[:2]])
+  long = make_customer([(product, 1) for product in catalog[:12]])
+
+  def cart(user_id):
+    return lambda: jsonable_encoder(CartOut.from_orm(crud_cart.get_cart_by_user_id(db, user_id)))
+
+  assert _measure(engine, db, cart(short.id)) == _measure(engine, db, cart(long.id))
@@ -0,0 +1,100 @@
+"""EXPLAIN checks for the hot read paths on a catalog big enough for the planner to care."""
+import pytest
+from sqlalchemy import text
+
+import app.app_cart.crud as crud_cart
+import app.app_order.crud as crud_order
+import app.app_product.crud as crud_product
+from app.common.query_plans import LARGE_TABLE_ROWS, capture_statements, hot_read_statements, indexes_used, sequential_scans
+
+ROWS = LARGE_TABLE_ROWS + 2000
+USERS = 200
+
+SEED = [
+  f"""
+  INSERT INTO users (id, email, auth_provider, is_admin, created_at, updated_at)
+  SELECT gen_random_uuid(), 'user' || n || '@example.com', 'local', false, now(), now()
+  FROM generate_series(1, {USERS}) n
+  """,
+  f"""
+  INSERT INTO products (id, title, stock, code, price, actual_price, description, collection,
+                        active, product_metadata, featured, category, created_at, updated_at)
+  SELECT gen_random_uuid(), 'Product ' || n, 5, 'CODE-' || n, 100 + n % 5000, 200 + n % 5000,
+         'Handcrafted piece ' || n,
+         (ARRAY['Everyday Elegance', 'Occasion Charm', 'The Bridal Edit', 'Designer Choice'])[n % 4 + 1],
+         n % 10 <> 0, '[]'::jsonb, n % 20 = 0,
+         (ARRAY['ring', 'necklace', 'earrings', 'bangles', 'saree'])[n % 5 + 1],
+         now() - n * interval '1 minute', now() - n * interval '1 minute'
+  FROM generate_series(1, {ROWS}) n
+  """,
+  f"""
+  INSERT INTO orders (id, user_id, order_number, status, subtotal, tax, discount, total,
+                      shipping_charge, shipping_address, created_at, updated_at)
+  SELECT gen_random_uuid(), users.ids[n % {USERS} + 1], 'T' || n, 'payment_paid', 1000, 0, 0, 1000,
+         0, '{{}}'::json, now() - n * interval '1 minute', now() - n * interval '1 minute'
+  FROM generate_series(1, {ROWS}) n, (SELECT array_agg(id) AS ids FROM users) users
+  """,
+  f"""
+  INSERT INTO coupons (id, code, discount_type, discount_value, min_order, used_count, created_at, updated_at)
+  SELECT gen_random_uuid(), 'CODE' || n, 'percent', 10, 0, 0, now() - n * interval '1 minute', now()
+  FROM generate_series(1, {ROWS}) n
+  """,
+  "INSERT INTO carts (id, user_id, created_at, updated_at) SELECT gen_random_uuid(), id, now(), now() FROM users",
+  f"""
+  INSERT INTO cart_items (id, cart_id, product_id, qty, price, created_at, updated_at)
+  SELECT gen_random_uuid(), carts.ids[n % {USERS} + 1], products.ids[n], 1, 100, now(), now()
+  FROM generate_series(1, {ROWS}) n,
+       (SELECT array_agg(id) AS ids FROM carts) carts,
+       (SELECT array_agg(id) AS ids FROM products) products
+  """,
+  "ANALYZE",
+]
+
+
+@pytest.fixture
+def large_catalog(db):
+  for statement in SEED:
+    db.execute(text(statement))
+  db.commit()
+  return db
+
+
+def _plans(db, engine, call):
+  statements = []
+  with capture_statements(engine, statements):
+    call(db)
+  assert statements
+  return statements
+
+
+def test_hot_read_paths_avoid_sequential_scans(large_catalog, engine):
+  db = large_catalog
+  statements = hot_read_statements(db, engine)
+  assert len(statements) > 10
+  assert sequential_scans(db, statements) == []
+
+
+@pytest.mark.parametrize("call, index", [
+  (lambda db: crud_product.get_list_of_product(db, 1, 20, "", None, None, cursor=""), "ix_products_active_updated"),
+  (lambda db: crud_product.get_list_of_product(db, 1, 20, "lowest_first", None, None, cursor=""), "ix_products_active_price"),
+  (lambda db: crud_product.get_list_of_product(db, 1, 20, "highest_first", None, None, cursor=""), "ix_products_active_price_desc"),
+  (lambda db: crud_product.get_list_of_product(db, 1, 20, "", None, "Ring", cursor=""), "ix_products_category_lower"),
+  (lambda db: crud_product.get_list_of_product(db, 1, 20, "the_bridal_edit", None, None, cursor=""), "ix_products_collection_listing"),
+  (lambda db: crud_order.get_list_of_orders(db, None, 1, 20, "desc", None, cursor=""), "ix_orders_created"),
+  (lambda db: crud_cart.get_list_of_coupons(db, 1, 20, None, cursor=""), "ix_coupons_created"),
+], ids=["listing", "price_asc", "price_desc", "category", "collection", "admin_orders", "coupons"])
+def test_listing_reads_its_index(large_catalog, engine, call, index):
+  db = large_catalog
+  assert index in indexes_used(db, _plans(db, engine, call))
+
+
+def test_my_orders_and_cart_read_by_user(large_catalog, engine):
+  db = large_catalog
+  user_id = db.execute(text("SELECT user_id FROM orders LIMIT 1")).scalar_one()
+  used = indexes_used(db, _plans(db, engine, lambda db: (
+    crud_order.get_list_of_orders(db, user_id, 1, 20, "desc", None, cursor=""),
+    crud_cart.get_cart_by_user_id(db, user_id),
+  )))
+  assert "ix_orders_user_created" in used
+  # the cart's lines are batch loaded by cart_id
+  assert used & {"ix_cart_items_cart_id", "ix_cart_items_cart_product"}
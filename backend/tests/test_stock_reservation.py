@@ -0,0 +1,85 @@
+"""Parallel checkouts against scarce stock."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from app.app_order.models import Order, StockReservation
+from app.app_product.models import Product
+from app.core.database import SessionLocal
+
+STOCK = 7
+CHECKOUTS = 60
+# each thread holds a connection; stay inside the engine's pool (5 + 10 overflow)
+THREADS = 12
+
+
+def _attempt(checkout, user_id) -> bool:
+  try:
+    checkout(user_id)
+  except HTTPException as e:
+    # out of stock is the only acceptable failure
+    assert e.status_code == 400
+    return False
+  return True
+
+
+def _run_checkouts(checkout, users, product_ids):
+  """Checkouts for all users at once; returns (placed flags, lowest stock seen while they ran)."""
+  lowest = {}
+  done = threading.Event()
+
+  def watch():
+    with SessionLocal() as session:
+      while not done.is_set():
+        for product_id, stock in session.execute(select(Product.id, Product.stock).where(Product.id.in_(product_ids))):
+          lowest[product_id] = min(lowest.get(product_id, stock), stock)
+        session.rollback()
+
+  watcher = threading.Thread(target=watch)
+  watcher.start()
+  try:
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+      placed = list(pool.map(lambda user_id: _attempt(checkout, user_id), users))
+  finally:
+    done.set()
+    watcher.join()
+  return placed, lowest
+
+
+def test_parallel_checkouts_never_oversell(db, make_product, make_customer, checkout):
+  product = make_product(stock=STOCK)
+  users = [make_customer([(product, 1)]).id for _ in range(CHECKOUTS)]
+
+  placed, lowest = _run_checkouts(checkout, users, [product.id])
+
+  assert placed.count(True) == STOCK
+  assert lowest[product.id] >= 0
+  db.expire_all()
+  assert db.get(Product, product.id).stock == 0
+  assert db.scalar(select(func.count()).select_from(Order)) == STOCK
+  assert db.scalar(select(func.sum(StockReservation.qty)).where(StockReservation.product_id == product.id)) == STOCK
+
+
+def test_multi_line_checkouts_reserve_all_lines_or_none(db, make_product, make_customer, checkout):
+  first, second = make_product(stock=STOCK), make_product(stock=STOCK)
+  # half the carts list the products the other way round; the row locks are
+  # taken in id order, so they must not deadlock
+  users = [
+    make_customer([(first, 1), (second, 1)] if n % 2 else [(second, 1), (first, 1)]).id
+    for n in range(CHECKOUTS)
+  ]
+
+  placed, lowest = _run_checkouts(checkout, users, [first.id, second.id])
+
+  assert placed.count(True) == STOCK
+  assert min(lowest.values()) >= 0
+  db.expire_all()
+  assert db.get(Product, first.id).stock == db.get(Product, second.id).stock == 0
+  # every order holds both lines, no order holds one
+  held = db.execute(
+    select(StockReservation.order_id, func.count()).group_by(StockReservation.order_id)
+  ).all()
+  assert len(held) == STOCK
+  assert all(lines == 2 for _, lines in held)